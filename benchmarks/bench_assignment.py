@@ -0,0 +1,94 @@
+"""
+Speed and pair quality of the active/inactive assignment strategies.
+
+Builds top-k neighbour lists once for a synthetic set of clustered actives
+against a larger inactive pool, then pairs them with the global heap
+greedy and the sparse linear-assignment solver (if scipy is installed).
+The ordered greedy matcher, which searches the pool again for every
+active, is timed for reference. Reports wall time, the number of paired
+actives and their mean Tanimoto similarity.
+
+Usage:
+    python benchmarks/bench_assignment.py [--actives 20000] [--inactives 50000] [--k 10] [--search lsh]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from bench_lsh import N_BITS, make_fingerprints, make_prototypes
+
+from toxichempy.chemoinformatics.similarity import (
+    SEARCH_METHODS,
+    assign_pairs,
+    match_nearest_packed,
+    top_k_neighbours,
+)
+
+
+def summarize(name, seconds, similarities):
+    paired = similarities[similarities > 0]
+    return {
+        "stage": name,
+        "seconds": seconds,
+        "paired": len(paired),
+        "mean_similarity": paired.mean() if len(paired) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--actives", type=int, default=20000)
+    parser.add_argument("--inactives", type=int, default=50000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--search", choices=SEARCH_METHODS, default="lsh")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    prototypes = make_prototypes(max(1, args.inactives // 50), rng)
+    targets = make_fingerprints(args.inactives, prototypes, rng)
+    queries = make_fingerprints(args.actives, prototypes, rng)
+
+    rows = []
+    start = time.perf_counter()
+    _, ordered = match_nearest_packed(queries, targets, N_BITS, search=args.search)
+    rows.append(
+        summarize(
+            "ordered (search per active)",
+            time.perf_counter() - start,
+            np.array([s or 0.0 for s in ordered]),
+        )
+    )
+
+    start = time.perf_counter()
+    neighbours, sims = top_k_neighbours(
+        queries, targets, N_BITS, k=args.k, search=args.search
+    )
+    list_seconds = time.perf_counter() - start
+    rows.append({"stage": f"top-{args.k} lists", "seconds": list_seconds})
+
+    for assignment in ("greedy", "optimal"):
+        start = time.perf_counter()
+        try:
+            assigned = assign_pairs(neighbours, sims, len(targets), assignment)
+        except ImportError as e:
+            print(f"Skipping {assignment}: {e}")
+            continue
+        seconds = time.perf_counter() - start
+        paired = np.zeros(len(queries))
+        for i, target in enumerate(assigned):
+            if target >= 0:
+                paired[i] = sims[i][neighbours[i] == target][0]
+        rows.append(summarize(f"{assignment} assignment", seconds, paired))
+
+    print(
+        f"{args.actives} actives, {args.inactives} inactives, k={args.k}, "
+        f"{args.search} search"
+    )
+    report = pd.DataFrame(rows).astype({"paired": "Int64"})
+    print(report.to_string(index=False, na_rep="", float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Disk/IO trade-off of the pipeline's output compression codecs.
+
+Writes and reads back a synthetic descriptor-like table (CID, SMILES,
+outcome and float descriptor columns) with each codec supported by
+``bioassay_data_for_ml --compression`` and reports file size, compression
+ratio and write/read wall time.
+
+Usage:
+    python benchmarks/bench_compression.py [--rows 50000] [--cols 210]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from toxichempy.utils.data_io_utils import (
+    COMPRESSION_SUFFIXES,
+    compressed_path,
+    read_file,
+    write_file,
+)
+
+
+def make_table(rows: int, cols: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        rng.normal(size=(rows, cols)).round(6),
+        columns=[f"Descriptor_{i}" for i in range(cols)],
+    )
+    df.insert(0, "PUBCHEM_CID", rng.integers(1, 10**8, size=rows))
+    df.insert(1, "STANDARDIZED_SMILES", "CC(=O)OC1=CC=CC=C1C(=O)O")
+    df.insert(2, "PUBCHEM_ACTIVITY_OUTCOME", rng.choice(["Active", "Inactive"], rows))
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--cols", type=int, default=210)
+    args = parser.parse_args()
+
+    df = make_table(args.rows, args.cols)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in COMPRESSION_SUFFIXES:
+            if codec == "zstd":
+                try:
+                    import zstandard  # noqa: F401
+                except ImportError:
+                    print("zstd skipped: 'zstandard' is not installed")
+                    continue
+            file_path = compressed_path(Path(tmp_dir) / "table.csv", codec)
+            start = time.perf_counter()
+            write_file(df, file_path)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            read_file(file_path)
+            read_time = time.perf_counter() - start
+            results.append(
+                {
+                    "codec": codec,
+                    "size_mb": file_path.stat().st_size / 1e6,
+                    "write_s": write_time,
+                    "read_s": read_time,
+                }
+            )
+
+    report = pd.DataFrame(results)
+    report["ratio"] = report["size_mb"].iloc[0] / report["size_mb"]
+    print(f"{args.rows} rows x {args.cols} descriptor columns")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Size and speed of the descriptor table formats.
+
+Builds a descriptor table the way ``bioassay_data_for_ml`` does (ID
+columns followed by one column per RDKit descriptor, with a share of failed
+rows) and writes/reads it as full-precision CSV and, when pyarrow is
+installed, as float32 Parquet and Feather (``--descriptor-format``).
+Reports file size, size relative to CSV and write/read wall time.
+
+Usage:
+    python benchmarks/bench_descriptor_formats.py [--rows 50000] [--failed 0.02]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from toxichempy.chemoinformatics.molecular_descriptors import (
+    descriptor_block,
+    descriptor_names,
+)
+from toxichempy.utils.data_io_utils import read_file, write_file
+
+
+def make_values(rows: int, cols: int, failed: float):
+    """Per-molecule descriptor lists as returned by ``calculate_descriptors``."""
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(sigma=2.0, size=(rows, cols)).tolist()
+    for i in np.flatnonzero(rng.random(rows) < failed):
+        values[i] = None
+    return values
+
+
+def make_ids(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(1)
+    return pd.DataFrame(
+        {
+            "PUBCHEM_CID": rng.integers(1, 10**8, size=rows),
+            "STANDARDIZED_SMILES": "CC(=O)OC1=CC=CC=C1C(=O)O",
+            "PUBCHEM_ACTIVITY_OUTCOME": rng.choice(["Active", "Inactive"], rows),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--failed", type=float, default=0.02)
+    args = parser.parse_args()
+
+    names = descriptor_names()
+    values = make_values(args.rows, len(names), args.failed)
+    ids = make_ids(args.rows)
+    formats = ["csv"]
+    try:
+        import pyarrow  # noqa: F401
+
+        formats += ["parquet", "feather"]
+    except ImportError:
+        print("parquet/feather skipped: 'pyarrow' is not installed")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for fmt in formats:
+            file_path = Path(tmp_dir) / f"raw_descriptors.{fmt}"
+            start = time.perf_counter()
+            if fmt == "csv":
+                empty = [None] * len(names)
+                descriptors = pd.DataFrame(
+                    [row if row is not None else empty for row in values],
+                    columns=names,
+                )
+            else:
+                descriptors = pd.DataFrame(
+                    descriptor_block(values, len(names)), columns=names
+                )
+            write_file(pd.concat([ids, descriptors], axis=1), file_path)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            read_file(file_path)
+            read_time = time.perf_counter() - start
+            results.append(
+                {
+                    "format": fmt,
+                    "size_mb": file_path.stat().st_size / 1e6,
+                    "write_s": write_time,
+                    "read_s": read_time,
+                }
+            )
+
+    report = pd.DataFrame(results)
+    report["ratio"] = report["size_mb"].iloc[0] / report["size_mb"]
+    print(f"{args.rows} rows x {len(names)} descriptors, {args.failed:.0%} failed")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
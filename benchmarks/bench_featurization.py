@@ -0,0 +1,132 @@
+"""
+Parse-time savings of single-pass featurization.
+
+Builds a synthetic cleaned assay and featurizes it three ways: the separate
+similarity, descriptor and fingerprint stages (each parses every unique
+molecule), ``featurize_assay`` (one parse per molecule) and
+``featurize_assay`` with a warm ``Mol.ToBinary()`` cache. Reports wall
+time, the number of ``Chem.MolFromSmiles`` calls and the time spent in
+them.
+
+Usage:
+    python benchmarks/bench_featurization.py [--rows 3000] [--duplication 1.5]
+"""
+
+import argparse
+import itertools
+import logging
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from rdkit import Chem
+
+from toxichempy.pipeline_framework import bioassay_data_for_ml as bioassay
+
+CORES = ["c1ccccc1", "c1ccncc1", "C1CCCCC1", "c1ccc2ccccc2c1", "C1CCNCC1"]
+LINKERS = ["", "C", "CC", "OC", "NC(=O)", "C(=O)O", "S(=O)(=O)N"]
+TAILS = ["C", "CC", "CCO", "C(F)(F)F", "Cl", "N(C)C", "C(=O)O", "Br"]
+
+
+class ParseCounter:
+    """Wraps ``Chem.MolFromSmiles`` to count calls and accumulate their time."""
+
+    def __init__(self):
+        self.original = Chem.MolFromSmiles
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.original(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.calls += 1
+
+
+def make_assay(rows: int, duplication: float, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    unique = max(1, int(rows / duplication))
+    combos = itertools.product(range(1, 40), CORES, LINKERS, TAILS)
+    smiles = [
+        f"{'C' * k}{linker}{core}{tail}"
+        for k, core, linker, tail in itertools.islice(combos, unique)
+    ]
+    records = [
+        (
+            i,
+            rng.choice(smiles),
+            "Active" if rng.random() < 0.1 else "Inactive",
+        )
+        for i in range(rows)
+    ]
+    return pd.DataFrame(
+        records,
+        columns=["PUBCHEM_CID", "STANDARDIZED_SMILES", "PUBCHEM_ACTIVITY_OUTCOME"],
+    )
+
+
+def separate_stages(aid, root_dir):
+    bioassay.process_assay(aid, root_dir)
+    bioassay.process_aid_descriptors(aid, root_dir)
+    bioassay.process_aid_fingerprints(aid, root_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=3000)
+    parser.add_argument("--duplication", type=float, default=1.5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    df = make_assay(args.rows, args.duplication)
+    runs = [
+        ("separate stages", separate_stages),
+        ("single pass", bioassay.featurize_assay),
+        (
+            "single pass, cold mol cache",
+            lambda aid, root: bioassay.featurize_assay(aid, root, cache_mols=True),
+        ),
+        (
+            "single pass, warm mol cache",
+            lambda aid, root: bioassay.featurize_assay(aid, root, cache_mols=True),
+        ),
+    ]
+
+    root_dir = Path(tempfile.mkdtemp())
+    (root_dir / "AID_1").mkdir()
+    df.to_csv(root_dir / "AID_1" / "cleaned_data_1.csv", index=False)
+    rows = []
+    try:
+        for name, func in runs:
+            counter = ParseCounter()
+            Chem.MolFromSmiles = counter
+            try:
+                start = time.perf_counter()
+                func("1", str(root_dir))
+                elapsed = time.perf_counter() - start
+            finally:
+                Chem.MolFromSmiles = counter.original
+            rows.append(
+                {
+                    "mode": name,
+                    "seconds": elapsed,
+                    "parses": counter.calls,
+                    "parse_seconds": counter.seconds,
+                }
+            )
+    finally:
+        shutil.rmtree(root_dir, ignore_errors=True)
+
+    report = pd.DataFrame(rows)
+    report["speedup"] = report["seconds"].iloc[0] / report["seconds"]
+    print(f"{len(df)} rows, {df['STANDARDIZED_SMILES'].nunique()} unique structures")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Recall and speed of the approximate LSH similarity search.
+
+Generates a synthetic library of clustered 2048-bit fingerprints (each
+compound is a noisy copy of one of many scaffold prototypes) and a set of
+actives drawn from the same clusters, then compares the exact pruned
+matcher with the MinHash/LSH matcher at several recall targets. Reports
+index build plus matching time, speedup over the exact matcher, recall@1
+(share of actives whose LSH shortlist contains an exact nearest
+neighbour) and the share of greedy pairs whose similarity equals the
+exact one.
+
+Usage:
+    python benchmarks/bench_lsh.py [--inactives 1000000] [--actives 1000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from toxichempy.chemoinformatics.similarity import (
+    MinHashLSHIndex,
+    bulk_tanimoto,
+    match_nearest_packed,
+    popcounts,
+)
+
+N_BITS = 2048
+CLUSTER_SIZE = 50
+PROTOTYPE_BITS = (35, 60)
+KEEP_PROBABILITY = 0.85
+NOISE_BITS = 6
+CHUNK = 8192
+
+
+def make_fingerprints(n: int, prototypes: np.ndarray, rng) -> np.ndarray:
+    packed = np.empty((n, N_BITS // 64), dtype=np.uint64)
+    for start in range(0, n, CHUNK):
+        size = min(CHUNK, n - start)
+        bits = prototypes[rng.integers(0, len(prototypes), size)]
+        bits &= rng.random((size, N_BITS), dtype=np.float32) < KEEP_PROBABILITY
+        noise = rng.integers(0, N_BITS, (size, NOISE_BITS))
+        bits[np.arange(size)[:, None], noise] = True
+        packed[start : start + size] = np.packbits(bits, axis=1).view(np.uint64)
+    return packed
+
+
+def make_prototypes(n: int, rng) -> np.ndarray:
+    prototypes = np.zeros((n, N_BITS), dtype=bool)
+    for row, k in enumerate(rng.integers(*PROTOTYPE_BITS, n)):
+        prototypes[row, rng.choice(N_BITS, k, replace=False)] = True
+    return prototypes
+
+
+def nearest_similarity(queries: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    query_counts, target_counts = popcounts(queries), popcounts(targets)
+    block = max(1, (1 << 22) // len(queries))
+    best = np.zeros(len(queries))
+    for start in range(0, len(targets), block):
+        sims = bulk_tanimoto(
+            queries,
+            query_counts,
+            targets[start : start + block],
+            target_counts[start : start + block],
+        )
+        best = np.maximum(best, sims.max(axis=1))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--inactives", type=int, default=1_000_000)
+    parser.add_argument("--actives", type=int, default=1000)
+    parser.add_argument(
+        "--recalls", type=float, nargs="+", default=[0.5, 0.8, 0.9, 0.95, 0.99]
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    prototypes = make_prototypes(max(1, args.inactives // CLUSTER_SIZE), rng)
+    targets = make_fingerprints(args.inactives, prototypes, rng)
+    queries = make_fingerprints(args.actives, prototypes, rng)
+    exact_nearest = nearest_similarity(queries, targets)
+
+    start = time.perf_counter()
+    _, exact_similarities = match_nearest_packed(
+        queries, targets, N_BITS, search="pruned"
+    )
+    exact_seconds = time.perf_counter() - start
+    rows = [
+        {
+            "search": "pruned",
+            "recall_target": None,
+            "seconds": exact_seconds,
+            "speedup": 1.0,
+            "recall@1": 1.0,
+            "pairs_equal": 1.0,
+            "fallbacks": 0,
+        }
+    ]
+
+    query_counts, target_counts = popcounts(queries), popcounts(targets)
+    for recall in args.recalls:
+        stats = {}
+        start = time.perf_counter()
+        _, similarities = match_nearest_packed(
+            queries, targets, N_BITS, search="lsh", recall=recall, stats=stats
+        )
+        seconds = time.perf_counter() - start
+
+        index = MinHashLSHIndex(targets, N_BITS, recall=recall)
+        hits = 0
+        for i, keys in enumerate(index.band_keys(queries)):
+            shortlist = index.candidates(keys)
+            if len(shortlist):
+                sims = bulk_tanimoto(
+                    queries[i : i + 1],
+                    query_counts[i : i + 1],
+                    targets[shortlist],
+                    target_counts[shortlist],
+                )
+                hits += sims.max() == exact_nearest[i]
+        rows.append(
+            {
+                "search": f"lsh {index.bands}x{index.rows}",
+                "recall_target": recall,
+                "seconds": seconds,
+                "speedup": exact_seconds / seconds,
+                "recall@1": hits / len(queries),
+                "pairs_equal": np.mean(
+                    [a == b for a, b in zip(similarities, exact_similarities)]
+                ),
+                "fallbacks": stats["fallbacks"],
+            }
+        )
+
+    print(
+        f"{args.inactives} inactives, {args.actives} actives, "
+        f"{len(prototypes)} clusters of {N_BITS}-bit fingerprints"
+    )
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Scaling of the multi-process nearest-inactive search across worker counts.
+
+Pairs synthetic clustered actives with an inactive pool using the exact
+pruned search and the ordered assignment for 1, 2, 4, ... up to the
+number of CPU cores, checks that every worker count returns the same
+pairs, and reports wall time, actives per second and speedup over a
+single process.
+
+Usage:
+    python benchmarks/bench_match_workers.py [--actives 5000] [--inactives 200000]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from bench_lsh import N_BITS, make_fingerprints, make_prototypes
+
+from toxichempy.chemoinformatics.similarity import match_nearest_packed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--actives", type=int, default=5000)
+    parser.add_argument("--inactives", type=int, default=200000)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    prototypes = make_prototypes(max(1, args.inactives // 50), rng)
+    targets = make_fingerprints(args.inactives, prototypes, rng)
+    queries = make_fingerprints(args.actives, prototypes, rng)
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted(
+        {1, cpu_count} | {2**i for i in range(1, 8) if 2**i < cpu_count}
+    )
+    rows = []
+    reference = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        matches, _ = match_nearest_packed(
+            queries, targets, N_BITS, k=args.k, workers=workers
+        )
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = matches
+        rows.append(
+            {
+                "workers": workers,
+                "seconds": elapsed,
+                "actives_per_s": len(queries) / elapsed,
+                "same_pairs": bool((matches == reference).all()),
+            }
+        )
+
+    report = pd.DataFrame(rows)
+    report["speedup"] = report["seconds"].iloc[0] / report["seconds"]
+    print(f"{args.actives} actives, {args.inactives} inactives, {cpu_count} CPU cores")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Scaling of parallel SMILES standardization across worker counts.
+
+Standardizes a synthetic set of unique drug-like SMILES with
+``standardize_smiles_parallel`` for 1, 2, 4, ... up to the number of CPU
+cores and reports wall time, molecules per second and speedup over a
+single worker.
+
+Usage:
+    python benchmarks/bench_standardization.py [--molecules 20000] [--chunk-size 1000]
+"""
+
+import argparse
+import itertools
+import os
+import time
+
+import pandas as pd
+
+from toxichempy.chemoinformatics.standardization import standardize_smiles_parallel
+
+CORES = ["c1ccccc1", "c1ccncc1", "C1CCCCC1", "c1ccc2ccccc2c1", "C1CCNCC1"]
+LINKERS = ["", "C", "CC", "OC", "NC(=O)", "C(=O)O", "S(=O)(=O)N"]
+TAILS = ["C", "CC", "CCO", "C(F)(F)F", "[O-].[Na+]", "Cl", "N(C)C", "C(=O)[O-]"]
+HEADS = ["", "O", "N", "F"]
+
+
+def make_smiles(n: int) -> list:
+    combos = itertools.product(range(1, 60), HEADS, CORES, LINKERS, TAILS)
+    return [
+        f"{head}{'C' * k}{linker}{core}{tail}"
+        for k, head, core, linker, tail in itertools.islice(combos, n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--molecules", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    smiles = make_smiles(args.molecules)
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted(
+        {1, cpu_count} | {2**i for i in range(1, 8) if 2**i < cpu_count}
+    )
+
+    rows = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        standardize_smiles_parallel(smiles, workers=workers, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+        rows.append(
+            {"workers": workers, "seconds": elapsed, "mol_per_s": len(smiles) / elapsed}
+        )
+
+    report = pd.DataFrame(rows)
+    report["speedup"] = report["seconds"].iloc[0] / report["seconds"]
+    print(f"{len(smiles)} unique SMILES, {cpu_count} CPU cores")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+
+if __name__ == "__main__":
+    main()
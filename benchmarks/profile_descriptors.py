@@ -0,0 +1,85 @@
+"""
+Per-descriptor cost profile shipped with the descriptor registry.
+
+Times every RDKit descriptor on a sample of synthetic drug-like
+molecules (the generator of ``bench_featurization``) plus a few larger
+reference drugs. Each call gets a fresh copy of the molecule so cached
+atom properties (partial charges, Crippen contributions) do not make one
+descriptor look cheaper at another's expense; the numbers are therefore
+per-descriptor upper bounds. Writes name, group, mean microseconds per
+molecule and cost tier.
+
+Usage:
+    python benchmarks/profile_descriptors.py [--molecules 300] [--output src/toxichempy/data/descriptor_costs.csv]
+"""
+
+import argparse
+import time
+
+import pandas as pd
+from bench_featurization import make_assay
+from rdkit import Chem
+from rdkit.Chem import Descriptors
+
+from toxichempy.chemoinformatics.molecular_descriptors import (
+    COST_TIER_LIMITS,
+    descriptor_group,
+)
+
+REFERENCE_DRUGS = [
+    "CC(=O)Oc1ccccc1C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1CCC[C@H]1c1cccnc1",
+    "COc1ccc2[nH]cc(CCNC(C)=O)c2c1",
+    "CC1(C)S[C@@H]2[C@H](NC(=O)Cc3ccccc3)C(=O)N2[C@H]1C(=O)O",
+    "CCN(CC)CCNC(=O)c1ccc(N)cc1",
+    "O=C(O)c1ccccc1O",
+    "CC(C)NCC(O)COc1cccc2ccccc12",
+    "Clc1ccc2c(c1)C(=NCC(=O)N2)c1ccccc1",
+    "CC[C@H](C)[C@@H]1NC(=O)[C@@H](Cc2ccc(O)cc2)NC(=O)[C@@H](N)CSSC[C@@H](C(=O)N2CCC[C@H]2C(=O)N[C@@H](CC(C)C)C(=O)NCC(N)=O)NC(=O)[C@H](CC(N)=O)NC(=O)[C@H](CCC(N)=O)NC1=O",
+]
+
+
+def tier(microseconds: float) -> str:
+    for name, limit in COST_TIER_LIMITS.items():
+        if microseconds < limit:
+            return name
+    return list(COST_TIER_LIMITS)[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--molecules", type=int, default=300)
+    parser.add_argument("--output", default="src/toxichempy/data/descriptor_costs.csv")
+    args = parser.parse_args()
+
+    smiles = make_assay(args.molecules, 1.0)["STANDARDIZED_SMILES"].unique().tolist()
+    mols = [Chem.MolFromSmiles(s) for s in smiles + REFERENCE_DRUGS]
+    rows = []
+    for name, function in Descriptors._descList:
+        elapsed = 0.0
+        for mol in mols:
+            copy = Chem.Mol(mol)
+            start = time.perf_counter()
+            function(copy)
+            elapsed += time.perf_counter() - start
+        microseconds = elapsed / len(mols) * 1e6
+        rows.append(
+            {
+                "name": name,
+                "group": descriptor_group(name),
+                "microseconds": round(microseconds, 1),
+                "tier": tier(microseconds),
+            }
+        )
+
+    profile = pd.DataFrame(rows)
+    profile.to_csv(args.output, index=False)
+    print(f"{len(mols)} molecules, {len(rows)} descriptors -> {args.output}")
+    print(profile.groupby("group")["microseconds"].agg(["count", "sum"]).to_string())
+    print(profile.groupby("tier")["microseconds"].agg(["count", "sum"]).to_string())
+
+
+if __name__ == "__main__":
+    main()
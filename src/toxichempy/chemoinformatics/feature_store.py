@@ -0,0 +1,195 @@
+import hashlib
+import json
+import pickle
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from rdkit import Chem, rdBase
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 900
+# Compound identifiers the store can be keyed by
+STORE_KEYS = ("smiles", "inchikey")
+
+
+def feature_config_hash(kind: str, **params) -> str:
+    """
+    Hashes a feature configuration together with the RDKit version.
+
+    Features stored under one hash are only reused by runs asking for the
+    same kind of feature with the same parameters on the same RDKit.
+    """
+    config = json.dumps(
+        {"kind": kind, "rdkit": rdBase.rdkitVersion, **params},
+        sort_keys=True,
+        default=list,
+    )
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()[:16]
+
+
+def compound_keys(
+    smiles: Sequence[str], key: str = "smiles", mols: Optional[Sequence] = None
+) -> List[Optional[str]]:
+    """
+    Returns the store key of each standardized SMILES.
+
+    With ``key="smiles"`` the (already canonical) SMILES is used as is. With
+    ``key="inchikey"`` each structure is keyed by its InChIKey, which also
+    merges structures written differently; note that tautomers share an
+    InChIKey, so features of one tautomer are served for the other. The
+    SMILES are parsed unless their ``mols`` are given. Unparsable SMILES get
+    None and are never stored.
+    """
+    if key == "smiles":
+        return list(smiles)
+    if key != "inchikey":
+        raise ValueError(
+            f"Unsupported store key: {key}. Choose from {list(STORE_KEYS)}."
+        )
+    if mols is None:
+        mols = [Chem.MolFromSmiles(s) for s in smiles]
+    return [
+        (Chem.MolToInchiKey(mol) or None) if mol is not None else None for mol in mols
+    ]
+
+
+class FeatureStore:
+    """
+    Persistent SQLite store of per-compound features shared across assays.
+
+    Entries are keyed by feature kind (e.g. ``"descriptors"``), a
+    configuration hash from ``feature_config_hash`` and a compound key from
+    ``compound_keys``; values are pickled. Lookups and inserts are batched,
+    hits and misses are counted for reporting, and the least recently used
+    entries are evicted once the stored values exceed ``max_bytes``.
+    ``compact`` drops entries of other configurations and reclaims the
+    freed pages.
+
+    Parameters:
+    -----------
+    path : str or Path
+        SQLite database file (created if missing).
+    max_bytes : int, optional
+        Cap on the total size of stored values (default: 2 GiB).
+    """
+
+    def __init__(self, path, max_bytes: int = 2 << 30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            "kind TEXT NOT NULL, config TEXT NOT NULL, key TEXT NOT NULL, "
+            "value BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (kind, config, key))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_features_last_used ON features (last_used)"
+        )
+        self._conn.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_many(
+        self, kind: str, config: str, keys: Iterable[str]
+    ) -> Dict[str, object]:
+        """Returns the stored features of the given compound keys."""
+        keys = list(dict.fromkeys(key for key in keys if key is not None))
+        found = {}
+        now = time.time()
+        for i in range(0, len(keys), _SQL_BATCH):
+            batch = keys[i : i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, value FROM features "
+                f"WHERE kind = ? AND config = ? AND key IN ({placeholders})",
+                [kind, config, *batch],
+            ).fetchall()
+            found.update((key, pickle.loads(value)) for key, value in rows)
+            self._conn.execute(
+                f"UPDATE features SET last_used = ? "
+                f"WHERE kind = ? AND config = ? AND key IN ({placeholders})",
+                [now, kind, config, *batch],
+            )
+        self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, kind: str, config: str, features: Dict[str, object]):
+        """Stores new features in one transaction and enforces the size cap."""
+        now = time.time()
+        rows = []
+        for key, value in features.items():
+            if key is None:
+                continue
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((kind, config, key, blob, len(blob), now))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+        self._conn.commit()
+        self.evict()
+
+    def size(self) -> int:
+        """Total size in bytes of the stored values."""
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM features"
+        ).fetchone()
+        return total
+
+    def evict(self) -> int:
+        """Deletes least recently used entries until the values fit ``max_bytes``."""
+        excess = self.size() - self.max_bytes
+        if excess <= 0:
+            return 0
+        rowids, freed = [], 0
+        for rowid, size in self._conn.execute(
+            "SELECT rowid, size FROM features ORDER BY last_used"
+        ):
+            rowids.append(rowid)
+            freed += size
+            if freed >= excess:
+                break
+        for i in range(0, len(rowids), _SQL_BATCH):
+            batch = rowids[i : i + _SQL_BATCH]
+            self._conn.execute(
+                f"DELETE FROM features WHERE rowid IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+        self._conn.commit()
+        return len(rowids)
+
+    def compact(self, keep_configs: Optional[Iterable[str]] = None) -> int:
+        """
+        Drops entries whose configuration is not in ``keep_configs`` (if
+        given and not empty) and rewrites the database file to release freed
+        space. Returns the number of entries dropped.
+        """
+        dropped = 0
+        keep = list(keep_configs or ())
+        if keep:
+            placeholders = ",".join("?" * len(keep))
+            dropped = self._conn.execute(
+                f"DELETE FROM features WHERE config NOT IN ({placeholders})", keep
+            ).rowcount
+            self._conn.commit()
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.execute("VACUUM")
+        return dropped
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM features").fetchone()
+        return count
+
+    def close(self):
+        self._conn.close()
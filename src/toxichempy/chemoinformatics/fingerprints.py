@@ -0,0 +1,523 @@
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+from rdkit import Chem, DataStructs
+from rdkit.Chem import MACCSkeys, rdFingerprintGenerator
+
+# Suffix of the sidecar holding the PUBCHEM_CID of each packed fingerprint row
+CID_SIDECAR_SUFFIX = "_cids.npy"
+# Fingerprints converted to bits at a time while packing, so the temporary
+# bit buffer does not grow with the number of fingerprints
+PACK_CHUNK = 4096
+# Folded length of the hashed fingerprint types (Morgan, RDKit path, atom pair)
+FINGERPRINT_SIZE = 2048
+# Fingerprint types understood by FingerprintSet; "morgan<r>" and
+# "morgan<r>_count" accept any radius
+FINGERPRINT_TYPES = (
+    "morgan2",
+    "morgan3",
+    "morgan2_count",
+    "rdkit",
+    "maccs",
+    "atompair",
+)
+# Name of the CID array stored with the fingerprint matrices of a bundle
+CID_KEY = "PUBCHEM_CID"
+# Molecules fingerprinted before their sparse counts are flushed to arrays
+SPARSE_CHUNK = 10000
+# Suffix of the sidecar holding the environment ID of each sparse column
+VOCABULARY_SUFFIX = "_vocabulary.npy"
+
+
+def packed_sidecar_path(file_path: str) -> Path:
+    """Returns the CID index written next to a packed fingerprint matrix."""
+    file_path = Path(file_path)
+    return file_path.with_name(f"{file_path.stem}{CID_SIDECAR_SUFFIX}")
+
+
+def packbits_fingerprints(
+    fps: Sequence, row_bytes: int = None, chunk_size: int = PACK_CHUNK
+) -> np.ndarray:
+    """
+    Packs RDKit bit vectors into a ``uint8`` matrix, eight bits per byte.
+
+    Bit ``i`` of a fingerprint is bit ``7 - i % 8`` of byte ``i // 8``
+    (``np.packbits`` order), so ``np.unpackbits(packed, axis=1)`` gives
+    the same 0/1 sequence as ``ToBitString()``. Fingerprints are unpacked
+    ``chunk_size`` at a time, so only the packed matrix grows with their
+    number.
+
+    Parameters:
+    -----------
+    fps : Sequence[ExplicitBitVect]
+        Fingerprints of equal length, a multiple of 8 bits unless
+        ``row_bytes`` is given.
+    row_bytes : int, optional
+        Bytes per row, padding each fingerprint with zero bits (default:
+        the fingerprint length in bytes).
+    chunk_size : int, optional
+        Fingerprints unpacked at a time (default: 4096).
+
+    Returns:
+    --------
+    np.ndarray
+        Array of shape ``(len(fps), row_bytes)``.
+    """
+    if not len(fps):
+        return np.zeros((0, row_bytes or 0), dtype=np.uint8)
+    n_bits = fps[0].GetNumBits()
+    if row_bytes is None:
+        if n_bits % 8:
+            raise ValueError(
+                f"Fingerprint length must be a multiple of 8, got {n_bits}"
+            )
+        row_bytes = n_bits // 8
+    elif row_bytes * 8 < n_bits:
+        raise ValueError(f"{row_bytes} bytes per row cannot hold {n_bits} bits")
+    packed = np.zeros((len(fps), row_bytes), dtype=np.uint8)
+    for start in range(0, len(fps), chunk_size):
+        chunk = fps[start : start + chunk_size]
+        bits = np.frombuffer(
+            "".join(fp.ToBitString() for fp in chunk).encode("ascii"), dtype=np.uint8
+        ).reshape(len(chunk), n_bits) - ord("0")
+        packed[start : start + len(chunk), : -(-n_bits // 8)] = np.packbits(
+            bits, axis=1
+        )
+    return packed
+
+
+def _save_npy(file_path: Path, array: np.ndarray):
+    fd, tmp_name = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_name, file_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+def save_packed_fingerprints(
+    file_path: str, packed: np.ndarray, cids: Sequence[int]
+) -> Tuple[Path, Path]:
+    """
+    Writes a packed fingerprint matrix and its CID index as ``.npy`` files.
+
+    Both files are plain (uncompressed) ``.npy`` so they can be memory
+    mapped. Each file is written to a temporary name and renamed into
+    place, the matrix last, so a reader never sees a matrix without its
+    index.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path of the matrix (e.g. ``raw_morgan_fingerprints_1.npy``); the
+        index goes to ``raw_morgan_fingerprints_1_cids.npy``.
+    packed : np.ndarray
+        ``uint8`` matrix from ``packbits_fingerprints``.
+    cids : Sequence[int]
+        PUBCHEM_CID of each row of ``packed``.
+
+    Returns:
+    --------
+    Tuple[Path, Path]
+        Paths of the matrix and of the CID index.
+    """
+    file_path = Path(file_path)
+    cids = np.asarray(cids, dtype=np.int64)
+    if packed.dtype != np.uint8 or packed.ndim != 2 or len(packed) != len(cids):
+        raise ValueError(
+            f"Expected a 2-D uint8 matrix with one row per CID, got "
+            f"{packed.dtype} {packed.shape} for {len(cids)} CIDs"
+        )
+    sidecar = packed_sidecar_path(file_path)
+    _save_npy(sidecar, cids)
+    _save_npy(file_path, packed)
+    return file_path, sidecar
+
+
+def unpack_to_bitvects(packed: np.ndarray) -> List:
+    """
+    Converts a packed ``uint8`` matrix back to RDKit ``ExplicitBitVect``s.
+
+    The matrix is re-packed in little-endian bit order with one vectorized
+    call and each row is handed to RDKit as FPS hex text, so no Python loop
+    runs over individual bits.
+    """
+    if not len(packed):
+        return []
+    little = np.packbits(np.unpackbits(packed, axis=1), axis=1, bitorder="little")
+    return [DataStructs.CreateFromFPSText(row.tobytes().hex()) for row in little]
+
+
+def load_packed_fingerprints(
+    file_path: str, mmap: bool = True, as_bitvects: bool = False
+) -> Tuple[np.ndarray, Union[np.ndarray, List]]:
+    """
+    Loads fingerprints written by ``save_packed_fingerprints``.
+
+    Parameters:
+    -----------
+    file_path : str
+        Path of the packed matrix.
+    mmap : bool
+        Memory-map the matrix read-only instead of reading it into memory.
+    as_bitvects : bool
+        Return RDKit ``ExplicitBitVect``s instead of the packed matrix.
+
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray or List[ExplicitBitVect]]
+        The CID of each row and the fingerprints; ``np.unpackbits(fps,
+        axis=1)`` expands the packed matrix to one 0/1 column per bit.
+    """
+    mmap_mode = "r" if mmap else None
+    packed = np.load(file_path, mmap_mode=mmap_mode)
+    cids = np.load(packed_sidecar_path(file_path))
+    if len(cids) != len(packed):
+        raise ValueError(
+            f"{file_path} has {len(packed)} fingerprints but its index has "
+            f"{len(cids)} CIDs"
+        )
+    if as_bitvects:
+        return cids, unpack_to_bitvects(packed)
+    return cids, packed
+
+
+def _maccs_bits(mol) -> np.ndarray:
+    bits = MACCSkeys.GenMACCSKeys(mol).ToBitString().encode("ascii")
+    return np.frombuffer(bits, dtype=np.uint8) - ord("0")
+
+
+def _fingerprint_function(name: str) -> Tuple[Callable, int, bool]:
+    """Returns the per-molecule function, bit length and count flag of a type."""
+    morgan = re.fullmatch(r"morgan(\d+)(_count)?", name)
+    if morgan:
+        generator = rdFingerprintGenerator.GetMorganGenerator(
+            radius=int(morgan.group(1)), fpSize=FINGERPRINT_SIZE
+        )
+        if morgan.group(2):
+            return generator.GetCountFingerprintAsNumPy, FINGERPRINT_SIZE, True
+        return generator.GetFingerprintAsNumPy, FINGERPRINT_SIZE, False
+    if name == "rdkit":
+        generator = rdFingerprintGenerator.GetRDKitFPGenerator(fpSize=FINGERPRINT_SIZE)
+        return generator.GetFingerprintAsNumPy, FINGERPRINT_SIZE, False
+    if name == "atompair":
+        generator = rdFingerprintGenerator.GetAtomPairGenerator(fpSize=FINGERPRINT_SIZE)
+        return generator.GetFingerprintAsNumPy, FINGERPRINT_SIZE, False
+    if name == "maccs":
+        return _maccs_bits, 167, False
+    raise ValueError(
+        f"Unsupported fingerprint type: {name}. "
+        f"Choose from {list(FINGERPRINT_TYPES)} or morgan<radius>[_count]."
+    )
+
+
+class FingerprintSet:
+    """
+    Computes several fingerprint types from each parsed molecule in one pass.
+
+    The ``rdFingerprintGenerator`` objects are created once and reused for
+    every molecule. Bit fingerprints are returned ``np.packbits``-packed
+    (MACCS keys padded with zero bits to 168), count fingerprints as
+    ``uint16`` counts saturated at 65535. ``seconds`` accumulates the time
+    spent per type across calls.
+
+    Parameters:
+    -----------
+    types : Sequence[str]
+        Fingerprint types, e.g. ``["morgan2", "morgan3", "maccs"]``.
+    """
+
+    def __init__(self, types: Sequence[str]):
+        self.types = tuple(dict.fromkeys(types))
+        self._functions = {name: _fingerprint_function(name) for name in self.types}
+        self.seconds = dict.fromkeys(self.types, 0.0)
+
+    def compute(
+        self, mols: Sequence, chunk_size: int = PACK_CHUNK
+    ) -> Dict[str, np.ndarray]:
+        """
+        Fingerprints every molecule with every type.
+
+        The molecules are walked once: each is fingerprinted with every type
+        before moving to the next. Rows are filled ``chunk_size`` molecules
+        at a time and each chunk is packed (or saturated to ``uint16``) into
+        the result before the next, so only the final matrices grow with the
+        number of molecules.
+
+        Parameters:
+        -----------
+        mols : Sequence[Mol]
+            Parsed molecules; ``None`` entries get all-zero rows.
+        chunk_size : int, optional
+            Molecules fingerprinted per chunk (default: 4096).
+
+        Returns:
+        --------
+        Dict[str, np.ndarray]
+            One matrix per type with a row per molecule.
+        """
+        matrices, buffers = {}, {}
+        for name, (_, n_bits, counts) in self._functions.items():
+            if counts:
+                matrices[name] = np.zeros((len(mols), n_bits), dtype=np.uint16)
+            else:
+                matrices[name] = np.zeros((len(mols), -(-n_bits // 8)), dtype=np.uint8)
+            buffers[name] = np.zeros(
+                (min(chunk_size, len(mols)), n_bits),
+                dtype=np.uint32 if counts else np.uint8,
+            )
+        functions = [
+            (name, function, buffers[name])
+            for name, (function, _, _) in self._functions.items()
+        ]
+        seconds = dict.fromkeys(self.types, 0.0)
+        for offset in range(0, len(mols), chunk_size):
+            chunk = mols[offset : offset + chunk_size]
+            for rows in buffers.values():
+                rows[: len(chunk)] = 0
+            for i, mol in enumerate(chunk):
+                if mol is None:
+                    continue
+                for name, function, rows in functions:
+                    start = time.perf_counter()
+                    rows[i] = function(mol)
+                    seconds[name] += time.perf_counter() - start
+            for name, (_, _, counts) in self._functions.items():
+                start = time.perf_counter()
+                block = buffers[name][: len(chunk)]
+                target = matrices[name][offset : offset + len(chunk)]
+                if counts:
+                    np.minimum(
+                        block, np.iinfo(np.uint16).max, out=target, casting="unsafe"
+                    )
+                else:
+                    target[:] = np.packbits(block, axis=1)
+                seconds[name] += time.perf_counter() - start
+        for name, spent in seconds.items():
+            self.seconds[name] += spent
+        return matrices
+
+
+def save_fingerprint_bundle(
+    file_path: str, matrices: Dict[str, np.ndarray], cids: Sequence[int]
+) -> Path:
+    """
+    Writes the matrices of a ``FingerprintSet`` and their CIDs to one ``.npz``.
+
+    The archive holds one array per fingerprint type plus ``PUBCHEM_CID``;
+    it is written to a temporary name and renamed into place.
+    """
+    file_path = Path(file_path)
+    cids = np.asarray(cids, dtype=np.int64)
+    for name, matrix in matrices.items():
+        if len(matrix) != len(cids):
+            raise ValueError(
+                f"{name} has {len(matrix)} rows but {len(cids)} CIDs were given"
+            )
+    fd, tmp_name = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **{CID_KEY: cids}, **matrices)
+        os.replace(tmp_name, file_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+    return file_path
+
+
+def load_fingerprint_bundle(file_path: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Loads a bundle written by ``save_fingerprint_bundle`` as CIDs and matrices."""
+    with np.load(file_path) as bundle:
+        matrices = {name: bundle[name] for name in bundle.files if name != CID_KEY}
+        return bundle[CID_KEY], matrices
+
+
+def sparse_morgan_counts(
+    smiles: Sequence[str], radius: int = 2, chunk_size: int = SPARSE_CHUNK
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Unfolded Morgan count fingerprints as CSR rows keyed by environment ID.
+
+    SMILES are parsed and fingerprinted ``chunk_size`` at a time and each
+    chunk is flushed to NumPy arrays before the next is parsed, so the
+    molecules and Python objects alive at once stay bounded by the chunk
+    rather than the assay.
+
+    Parameters:
+    -----------
+    smiles : Sequence[str]
+        SMILES to fingerprint; unparsable ones get empty rows.
+    radius : int
+        Morgan radius.
+    chunk_size : int
+        SMILES per chunk.
+
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+        ``indptr`` (one more entry than SMILES), the 32-bit environment ID
+        of each non-zero (sorted within a row), its ``uint16`` count
+        (saturated at 65535) and whether each SMILES could be parsed.
+    """
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=radius)
+    lengths, id_chunks, count_chunks = [], [], []
+    valid = np.zeros(len(smiles), dtype=bool)
+    for start in range(0, len(smiles), chunk_size):
+        ids, counts = [], []
+        for i, text in enumerate(smiles[start : start + chunk_size], start):
+            mol = Chem.MolFromSmiles(text)
+            if mol is None:
+                lengths.append(0)
+                continue
+            valid[i] = True
+            elements = generator.GetSparseCountFingerprint(mol).GetNonzeroElements()
+            lengths.append(len(elements))
+            for env_id in sorted(elements):
+                ids.append(env_id)
+                counts.append(elements[env_id])
+        id_chunks.append(np.array(ids, dtype=np.uint32))
+        count_chunks.append(
+            np.minimum(np.array(counts, dtype=np.int64), np.iinfo(np.uint16).max)
+        )
+    indptr = np.zeros(len(smiles) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    if not id_chunks:
+        return (
+            indptr,
+            np.zeros(0, dtype=np.uint32),
+            np.zeros(0, dtype=np.uint16),
+            valid,
+        )
+    return (
+        indptr,
+        np.concatenate(id_chunks),
+        np.concatenate(count_chunks).astype(np.uint16),
+        valid,
+    )
+
+
+def take_sparse_rows(
+    indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Selects (and repeats) CSR rows without materializing a dense matrix."""
+    lengths = np.diff(indptr)[rows]
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    positions = np.repeat(indptr[rows] - new_indptr[:-1], lengths) + np.arange(
+        new_indptr[-1]
+    )
+    return new_indptr, indices[positions], data[positions]
+
+
+def environment_frequencies(
+    indices: np.ndarray, vocabulary: np.ndarray = None, frequencies: np.ndarray = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Adds the rows containing each environment ID to running frequencies.
+
+    ``indices`` must list each ID at most once per row, as produced by
+    ``sparse_morgan_counts``. Returns the sorted IDs seen so far and the
+    number of rows containing each.
+    """
+    ids, counts = np.unique(indices, return_counts=True)
+    if vocabulary is None:
+        return ids, counts.astype(np.int64)
+    merged, inverse = np.unique(np.concatenate([vocabulary, ids]), return_inverse=True)
+    totals = np.bincount(
+        inverse, weights=np.concatenate([frequencies, counts]), minlength=len(merged)
+    )
+    return merged, totals.astype(np.int64)
+
+
+def remap_sparse_columns(
+    indptr: np.ndarray, env_ids: np.ndarray, data: np.ndarray, vocabulary: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Replaces environment IDs by their column in ``vocabulary``.
+
+    IDs missing from the sorted ``vocabulary`` (pruned as rare) are dropped.
+    """
+    columns = np.searchsorted(vocabulary, env_ids)
+    kept = columns < len(vocabulary)
+    kept[kept] = vocabulary[columns[kept]] == env_ids[kept]
+    row_of = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    new_indptr = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(np.bincount(row_of[kept], minlength=len(indptr) - 1), out=new_indptr[1:])
+    return new_indptr, columns[kept].astype(np.int32), data[kept]
+
+
+def save_sparse_fingerprints(
+    file_path: str,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    data: np.ndarray,
+    vocabulary: np.ndarray,
+    cids: Sequence[int],
+) -> Path:
+    """
+    Writes a CSR count matrix readable by ``scipy.sparse.load_npz``.
+
+    The column vocabulary (environment ID of each column) and the CID of
+    each row are written next to it as ``<name>_vocabulary.npy`` and
+    ``<name>_cids.npy``. SciPy is not needed to write the matrix.
+    """
+    file_path = Path(file_path)
+    cids = np.asarray(cids, dtype=np.int64)
+    if len(indptr) != len(cids) + 1:
+        raise ValueError(
+            f"Expected {len(cids) + 1} row pointers for {len(cids)} CIDs, "
+            f"got {len(indptr)}"
+        )
+    _save_npy(file_path.with_name(f"{file_path.stem}{VOCABULARY_SUFFIX}"), vocabulary)
+    _save_npy(packed_sidecar_path(file_path), cids)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f,
+                indices=indices,
+                indptr=indptr,
+                format=b"csr",
+                shape=np.array([len(cids), len(vocabulary)]),
+                data=data,
+            )
+        os.replace(tmp_name, file_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+    return file_path
+
+
+def load_sparse_fingerprints(file_path: str):
+    """
+    Loads a matrix written by ``save_sparse_fingerprints``.
+
+    Returns:
+    --------
+    Tuple[np.ndarray, scipy.sparse.csr_matrix, np.ndarray]
+        The CID of each row, the count matrix (ready for scikit-learn
+        estimators) and the environment ID of each column.
+    """
+    try:
+        from scipy import sparse
+    except ImportError:
+        raise ImportError(
+            "Loading sparse fingerprints requires scipy: pip install scipy"
+        )
+    file_path = Path(file_path)
+    matrix = sparse.load_npz(file_path)
+    vocabulary = np.load(file_path.with_name(f"{file_path.stem}{VOCABULARY_SUFFIX}"))
+    return np.load(packed_sidecar_path(file_path)), matrix, vocabulary
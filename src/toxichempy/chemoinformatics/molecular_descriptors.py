@@ -1,3 +1,43 @@
+import logging
+import multiprocessing
+import re
+import time
+from collections import deque
+from functools import lru_cache
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from rdkit import Chem
+from rdkit.Chem import Descriptors
+
+# Molecules sent to a descriptor worker per task
+DESCRIPTOR_CHUNK = 64
+# Seconds between watchdog checks of the running molecules
+WATCHDOG_INTERVAL = 0.1
+# Descriptor groups, matched in order against descriptor names; names that
+# match none fall in "other"
+DESCRIPTOR_GROUPS = {
+    "estate": r"EStateIndex$|^EState_VSA|^VSA_EState",
+    "charge": r"PartialCharge$",
+    "bcut": r"^BCUT2D_",
+    "surface": r"^(PEOE|SMR|SlogP)_VSA|^LabuteASA$|^TPSA$",
+    "topological": r"^(Chi|Kappa)|^(BalabanJ|BertzCT|Ipc|AvgIpc|HallKierAlpha|Phi)$",
+    "fingerprint_density": r"^FpDensityMorgan",
+    "fragments": r"^fr_",
+    "counts": r"^Num|Count$|^FractionCSP3$",
+    "physchem": r"MolWt$|^(MolLogP|MolMR|qed|SPS)$",
+}
+# Upper bound (microseconds per molecule, exclusive) of each cost tier
+COST_TIER_LIMITS = {"cheap": 20.0, "moderate": 200.0, "expensive": float("inf")}
+# Measured per-descriptor cost, regenerated by benchmarks/profile_descriptors.py
+COST_PROFILE = Path(__file__).resolve().parent.parent / "data" / "descriptor_costs.csv"
+
+logger = logging.getLogger(__name__)
+
+
 def add_numbers(a, b):
     """
     Returns the sum of two numbers.
@@ -7,3 +47,374 @@ def add_numbers(a, b):
     :return: Sum of a and b
     """
     return a + b
+
+
+def descriptor_names() -> List[str]:
+    """Names of the RDKit descriptors, in output column order."""
+    return [name for name, _ in Descriptors._descList]
+
+
+def descriptor_group(name: str) -> str:
+    """Returns the ``DESCRIPTOR_GROUPS`` group of a descriptor name."""
+    for group, pattern in DESCRIPTOR_GROUPS.items():
+        if re.search(pattern, name):
+            return group
+    return "other"
+
+
+@lru_cache(maxsize=None)
+def _cost_profile() -> pd.DataFrame:
+    return pd.read_csv(COST_PROFILE).set_index("name")
+
+
+def descriptor_costs() -> pd.DataFrame:
+    """
+    Registry of the available descriptors with their group and measured cost.
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per descriptor in output column order with ``name``,
+        ``group``, ``microseconds`` (mean per molecule from the shipped
+        profile) and ``tier``. Descriptors missing from the profile (added
+        by a newer RDKit) have no cost and are treated as ``expensive``.
+    """
+    names = descriptor_names()
+    profile = _cost_profile().reindex(names)
+    return pd.DataFrame(
+        {
+            "name": names,
+            "group": [descriptor_group(name) for name in names],
+            "microseconds": profile["microseconds"].to_numpy(),
+            "tier": profile["tier"].fillna("expensive").to_numpy(),
+        }
+    )
+
+
+def select_descriptors(
+    names: Optional[Sequence[str]] = None,
+    groups: Optional[Sequence[str]] = None,
+    max_tier: Optional[str] = None,
+) -> List[str]:
+    """
+    Selects descriptors from the registry by name, group and cost tier.
+
+    Parameters:
+    -----------
+    names : Sequence[str], optional
+        Descriptor names to include.
+    groups : Sequence[str], optional
+        ``DESCRIPTOR_GROUPS`` (or ``"other"``) whose descriptors to include.
+        Without ``names`` and ``groups`` every descriptor is a candidate.
+    max_tier : str, optional
+        Most expensive ``COST_TIER_LIMITS`` tier to keep, e.g. ``"moderate"``
+        drops the expensive descriptors from the selection.
+
+    Returns:
+    --------
+    List[str]
+        Selected names in ``descriptor_names()`` order, whatever the order
+        they were requested in, so output columns stay stable.
+    """
+    registry = descriptor_costs()
+    unknown = set(names or ()) - set(registry["name"])
+    if unknown:
+        raise ValueError(f"Unknown descriptors: {sorted(unknown)}")
+    known_groups = [*DESCRIPTOR_GROUPS, "other"]
+    unknown = set(groups or ()) - set(known_groups)
+    if unknown:
+        raise ValueError(
+            f"Unknown descriptor groups: {sorted(unknown)}. Choose from {known_groups}."
+        )
+    if max_tier is not None and max_tier not in COST_TIER_LIMITS:
+        raise ValueError(
+            f"Unsupported cost tier: {max_tier}. Choose from {list(COST_TIER_LIMITS)}."
+        )
+
+    selected = pd.Series(names is None and groups is None, index=registry.index)
+    if names:
+        selected |= registry["name"].isin(names)
+    if groups:
+        selected |= registry["group"].isin(groups)
+    if max_tier is not None:
+        tiers = list(COST_TIER_LIMITS)
+        selected &= registry["tier"].isin(tiers[: tiers.index(max_tier) + 1])
+    return registry.loc[selected, "name"].tolist()
+
+
+def _descriptor_functions(names: Optional[Sequence[str]]) -> List[Callable]:
+    if names is None:
+        return [function for _, function in Descriptors._descList]
+    functions = dict(Descriptors._descList)
+    return [functions[name] for name in names]
+
+
+def _values(mol, smiles: str, functions: List[Callable]):
+    if mol is None:
+        logger.warning(f"Invalid SMILES: {smiles}")
+        return None, "invalid SMILES"
+    try:
+        return [function(mol) for function in functions], None
+    except Exception as e:
+        logger.error(f"Error calculating descriptors for SMILES: {smiles}, Error: {e}")
+        return None, f"descriptor error: {e}"
+
+
+def descriptor_values(
+    mol, smiles: str = "", names: Optional[Sequence[str]] = None
+) -> Tuple[Optional[List], Optional[str]]:
+    """
+    Calculates the requested RDKit descriptors of a parsed molecule.
+
+    Returns:
+    --------
+    Tuple[Optional[List], Optional[str]]
+        The values in the order of ``names`` (default: every descriptor in
+        ``descriptor_names()`` order) and None, or None and the reason no
+        values could be calculated.
+    """
+    return _values(mol, smiles, _descriptor_functions(names))
+
+
+def descriptor_block(
+    values: Sequence[Optional[Sequence[float]]], n_descriptors: int
+) -> np.ndarray:
+    """
+    Packs per-molecule descriptor values into a float32 matrix.
+
+    Parameters:
+    -----------
+    values : Sequence[Optional[Sequence[float]]]
+        Per molecule, its descriptor values or None on failure, as returned
+        by ``calculate_descriptors``.
+    n_descriptors : int
+        Number of descriptor columns.
+
+    Returns:
+    --------
+    np.ndarray
+        Preallocated ``(len(values), n_descriptors)`` float32 block with one
+        row per molecule; failed molecules are all NaN and values beyond the
+        float32 range become +/-inf.
+    """
+    block = np.full((len(values), n_descriptors), np.nan, dtype=np.float32)
+    with np.errstate(over="ignore"):
+        for i, row in enumerate(values):
+            if row is not None:
+                block[i] = row
+    return block
+
+
+def _descriptor_worker(conn, state, names):
+    """
+    Worker loop: receives chunks of ``(index, smiles)`` and sends one result
+    per molecule followed by None. ``state`` holds the index of the molecule
+    being calculated (-1 when idle) and its start time, read by the watchdog.
+    """
+    functions = _descriptor_functions(names)
+    for chunk in iter(conn.recv, None):
+        for index, smiles in chunk:
+            state[1] = time.monotonic()
+            state[0] = index
+            values, reason = _values(Chem.MolFromSmiles(smiles), smiles, functions)
+            conn.send((index, values, reason))
+        state[0] = -1
+        conn.send(None)
+
+
+class _DescriptorWorker:
+    """A worker process with its own pipe, so killing it cannot corrupt others."""
+
+    def __init__(self, ctx, names: Optional[Sequence[str]] = None):
+        self.state = ctx.Array("d", [-1.0, 0.0], lock=False)
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_descriptor_worker,
+            args=(child_conn, self.state, names),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.chunk = None
+
+    def assign(self, chunk: List[Tuple[int, str]]) -> bool:
+        """Hands ``chunk`` to the worker; False if it has died while idle."""
+        if not self.process.is_alive():
+            return False
+        try:
+            self.conn.send(chunk)
+        except (BrokenPipeError, EOFError, OSError):
+            return False
+        self.chunk = dict(chunk)
+        return True
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def calculate_descriptors(
+    smiles: Sequence[str],
+    mols: Optional[Sequence] = None,
+    names: Optional[Sequence[str]] = None,
+    workers: int = 1,
+    timeout: Optional[float] = None,
+    chunk_size: int = DESCRIPTOR_CHUNK,
+    stats: Optional[dict] = None,
+) -> Tuple[List[Optional[List]], List[Optional[str]]]:
+    """
+    Calculates the RDKit descriptors of many molecules, optionally in parallel.
+
+    With ``workers <= 1`` and no ``timeout`` the descriptors are calculated
+    in the current process (reusing ``mols`` when given). Otherwise chunks
+    of ``chunk_size`` SMILES are handed to ``workers`` processes that parse
+    and featurize them. A watchdog in the parent kills any worker that
+    spends more than ``timeout`` seconds on one molecule or dies, records
+    that molecule as failed, requeues the rest of its chunk and starts a
+    replacement worker.
+
+    Parameters:
+    -----------
+    smiles : Sequence[str]
+        SMILES to featurize.
+    mols : Sequence[Mol], optional
+        Already parsed molecules for the in-process path.
+    names : Sequence[str], optional
+        Descriptors to calculate, e.g. from ``select_descriptors``
+        (default: all); only these are evaluated.
+    workers : int, optional
+        Number of worker processes (default: 1).
+    timeout : float, optional
+        Wall-clock budget per molecule in seconds (default: no limit).
+    chunk_size : int, optional
+        Molecules per task (default: 64).
+    stats : dict, optional
+        Filled with ``molecules``, ``seconds``, ``timeouts`` and ``restarts``.
+
+    Returns:
+    --------
+    Tuple[List[Optional[List]], List[Optional[str]]]
+        Per molecule, its values in the order of ``names`` (None on
+        failure) and the failure reason (None on success).
+    """
+    start = time.perf_counter()
+    values = [None] * len(smiles)
+    reasons = [None] * len(smiles)
+    timeouts = restarts = 0
+    if (workers <= 1 and timeout is None) or not len(smiles):
+        if mols is None:
+            mols = [Chem.MolFromSmiles(s) for s in smiles]
+        functions = _descriptor_functions(names)
+        for i, (mol, s) in enumerate(zip(mols, smiles)):
+            values[i], reasons[i] = _values(mol, s, functions)
+    else:
+        items = list(enumerate(smiles))
+        queue = deque(
+            items[i : i + chunk_size] for i in range(0, len(items), chunk_size)
+        )
+        remaining = len(items)
+        ctx = multiprocessing.get_context()
+        pool = [
+            _DescriptorWorker(ctx, names)
+            for _ in range(min(max(workers, 1), len(queue)))
+        ]
+        try:
+            while remaining:
+                for k, worker in enumerate(pool):
+                    if worker.chunk is None and queue:
+                        chunk = queue.popleft()
+                        if worker.assign(chunk):
+                            continue
+                        # Died while idle (e.g. OOM-killed): none of the chunk
+                        # ran, so it goes back to the queue for a replacement
+                        logger.warning(
+                            f"Descriptor worker exited with code "
+                            f"{worker.process.exitcode} while idle; restarting it"
+                        )
+                        worker.kill()
+                        queue.appendleft(chunk)
+                        pool[k] = _DescriptorWorker(ctx, names)
+                        restarts += 1
+                by_conn = {worker.conn: worker for worker in pool}
+                for conn in wait(list(by_conn), timeout=WATCHDOG_INTERVAL):
+                    worker = by_conn[conn]
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError):
+                        continue
+                    if message is None:
+                        worker.chunk = None
+                        continue
+                    index, values[index], reasons[index] = message
+                    worker.chunk.pop(index, None)
+                    remaining -= 1
+
+                now = time.monotonic()
+                for k, worker in enumerate(pool):
+                    if worker.chunk is None:
+                        continue
+                    index = int(worker.state[0])
+                    alive = worker.process.is_alive()
+                    hung = (
+                        alive
+                        and timeout is not None
+                        and index in worker.chunk
+                        and now - worker.state[1] > timeout
+                    )
+                    if alive and not hung:
+                        continue
+                    # Keep results the worker finished before it hung or died
+                    while worker.conn.poll():
+                        try:
+                            message = worker.conn.recv()
+                        except (EOFError, OSError):
+                            break
+                        if message is not None:
+                            done, values[done], reasons[done] = message
+                            worker.chunk.pop(done, None)
+                            remaining -= 1
+                    worker.kill()
+                    if index in worker.chunk:
+                        worker.chunk.pop(index)
+                        remaining -= 1
+                        if hung:
+                            timeouts += 1
+                            reasons[index] = f"timed out after {timeout:g}s"
+                        else:
+                            reasons[index] = (
+                                f"worker exited with code {worker.process.exitcode}"
+                            )
+                        logger.warning(
+                            f"Descriptors of {smiles[index]}: {reasons[index]}"
+                        )
+                    if worker.chunk:
+                        queue.appendleft(list(worker.chunk.items()))
+                    pool[k] = _DescriptorWorker(ctx, names)
+                    restarts += 1
+        finally:
+            for worker in pool:
+                if worker.chunk is None:
+                    worker.stop()
+                else:
+                    worker.kill()
+
+    if stats is not None:
+        stats.update(
+            molecules=len(smiles),
+            seconds=time.perf_counter() - start,
+            timeouts=timeouts,
+            restarts=restarts,
+        )
+    return values, reasons
@@ -0,0 +1,868 @@
+import heapq
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from toxichempy.chemoinformatics.fingerprints import packbits_fingerprints
+
+# Upper bound on the number of similarity values held in memory per block
+BLOCK_ELEMENTS = 1 << 22
+# Fingerprints unpacked at a time while computing MinHash signatures
+SIGNATURE_CHUNK = 4096
+SEARCH_METHODS = ("exhaustive", "pruned", "lsh")
+LSH_NUM_PERM = 64
+LSH_RECALL = 0.9
+LSH_THRESHOLD = 0.5
+ASSIGNMENT_STRATEGIES = ("ordered", "greedy", "optimal")
+# Neighbours kept per query for the global assignment strategies
+TOP_K = 10
+# Query chunks per worker process, so slow chunks do not stall the pool
+WORKER_CHUNKS = 4
+
+logger = logging.getLogger(__name__)
+
+
+def pack_fingerprints(fps: Sequence) -> np.ndarray:
+    """
+    Packs RDKit bit vectors into a ``uint64`` matrix.
+
+    Parameters:
+    -----------
+    fps : Sequence[ExplicitBitVect]
+        Fingerprints of equal length.
+
+    Returns:
+    --------
+    np.ndarray
+        Array of shape ``(len(fps), words)`` with one row per fingerprint,
+        padded with zero bits to a multiple of 64.
+    """
+    if not len(fps):
+        return np.zeros((0, 0), dtype=np.uint64)
+    words = -(-fps[0].GetNumBits() // 64)
+    return packbits_fingerprints(fps, row_bytes=words * 8).view(np.uint64)
+
+
+def popcounts(packed: np.ndarray) -> np.ndarray:
+    """Returns the number of set bits of each packed fingerprint."""
+    return np.bitwise_count(packed).sum(axis=1, dtype=np.int64)
+
+
+def bulk_tanimoto(
+    query: np.ndarray,
+    query_counts: np.ndarray,
+    targets: np.ndarray,
+    target_counts: np.ndarray,
+) -> np.ndarray:
+    """
+    Tanimoto similarity of every query against every target.
+
+    Matches ``DataStructs.TanimotoSimilarity`` exactly, including a
+    similarity of 0.0 between two empty fingerprints.
+
+    Parameters:
+    -----------
+    query, targets : np.ndarray
+        Packed fingerprints from ``pack_fingerprints``.
+    query_counts, target_counts : np.ndarray
+        Their ``popcounts``.
+
+    Returns:
+    --------
+    np.ndarray
+        ``float64`` array of shape ``(len(query), len(targets))``.
+    """
+    common = np.zeros((len(query), len(targets)), dtype=np.int64)
+    for word in range(query.shape[1]):
+        common += np.bitwise_count(query[:, word, None] & targets[None, :, word])
+    union = query_counts[:, None] + target_counts[None, :] - common
+    with np.errstate(divide="ignore", invalid="ignore"):
+        similarity = common / union
+    similarity[union == 0] = 0.0
+    return similarity
+
+
+def _match_blocked(queries, query_counts, targets, target_counts, block_elements):
+    """Scores blocks of queries against every target."""
+    matches = np.full(len(queries), -1, dtype=np.int64)
+    similarities: List[Optional[float]] = [None] * len(queries)
+    used = np.zeros(len(targets), dtype=bool)
+    block = max(1, block_elements // len(targets))
+    for start in range(0, len(queries), block):
+        stop = min(start + block, len(queries))
+        sims = bulk_tanimoto(
+            queries[start:stop], query_counts[start:stop], targets, target_counts
+        )
+        for offset, row in enumerate(sims):
+            row[used] = -1.0
+            best = int(np.argmax(row))
+            if row[best] > 0:
+                used[best] = True
+                matches[start + offset] = best
+                similarities[start + offset] = row[best]
+    return matches, similarities, len(queries) * len(targets)
+
+
+class _PopcountIndex:
+    """
+    Targets sorted into popcount buckets for exact, bound-pruned search.
+
+    A target with ``c`` bits cannot be more similar than
+    ``min(a, c) / max(a, c)`` to a query with ``a`` bits (Swamidass and
+    Baldi), so buckets are visited from the highest bound down and the
+    search stops once the bound falls below the best similarity found or
+    an identical fingerprint (similarity 1.0) has been seen.
+    """
+
+    def __init__(self, targets, target_counts, used=None):
+        order = np.argsort(target_counts, kind="stable")
+        self._set_buckets(targets[order], order, target_counts[order])
+        self.position = np.empty_like(self.order)
+        self.position[self.order] = np.arange(len(self.order))
+        self.used = np.zeros(len(self.order), dtype=bool)
+        if used is not None:
+            self.used[self.position[np.flatnonzero(used)]] = True
+
+    @classmethod
+    def from_sorted(cls, targets, order, sorted_counts):
+        """Wraps targets already sorted by popcount, without copying them."""
+        index = cls.__new__(cls)
+        index._set_buckets(targets, order, sorted_counts)
+        return index
+
+    def _set_buckets(self, sorted_targets, order, sorted_counts):
+        self.order = order
+        self.targets = sorted_targets
+        self.bucket_bits, self.starts = np.unique(sorted_counts, return_index=True)
+        self.ends = np.append(self.starts[1:], len(order))
+
+    def mark_used(self, idx: int):
+        self.used[self.position[idx]] = True
+
+    def search(self, query, a) -> Tuple[float, int, int]:
+        """Returns the best similarity, its unused target (-1 if none) and pairs compared."""
+        bounds = np.minimum(a, self.bucket_bits) / np.maximum(
+            np.maximum(a, self.bucket_bits), 1
+        )
+        best, best_idx, compared = 0.0, -1, 0
+        for bucket in np.argsort(-bounds, kind="stable"):
+            if bounds[bucket] <= 0 or bounds[bucket] < best:
+                break
+            lo, hi = self.starts[bucket], self.ends[bucket]
+            common = np.bitwise_count(self.targets[lo:hi] & query).sum(
+                axis=1, dtype=np.int64
+            )
+            sims = common / (a + self.bucket_bits[bucket] - common)
+            sims[self.used[lo:hi]] = -1.0
+            compared += hi - lo
+            j = int(np.argmax(sims))
+            # Ties go to the earliest target, as in the exhaustive search
+            if sims[j] > best or (
+                sims[j] == best > 0 and self.order[lo + j] < best_idx
+            ):
+                best, best_idx = sims[j], int(self.order[lo + j])
+            if best == 1.0:
+                break
+        return best, best_idx, compared
+
+    def top_k(self, query, a, k: int, prune: bool = True):
+        """
+        Returns the ``k`` most similar targets, ignoring the used mask.
+
+        Targets are ranked by decreasing similarity, then by index; only
+        positive similarities are kept. With ``prune`` buckets whose bound is
+        below the ``k``-th best similarity are skipped.
+        """
+        bounds = np.minimum(a, self.bucket_bits) / np.maximum(
+            np.maximum(a, self.bucket_bits), 1
+        )
+        found_idx = np.empty(0, dtype=np.int64)
+        found_sims = np.empty(0)
+        compared = 0
+        for bucket in np.argsort(-bounds, kind="stable"):
+            if bounds[bucket] <= 0:
+                break
+            if prune and len(found_sims) == k and bounds[bucket] < found_sims[-1]:
+                break
+            lo, hi = self.starts[bucket], self.ends[bucket]
+            common = np.bitwise_count(self.targets[lo:hi] & query).sum(
+                axis=1, dtype=np.int64
+            )
+            sims = common / (a + self.bucket_bits[bucket] - common)
+            compared += hi - lo
+            found_idx, found_sims = _top_ranked(
+                np.concatenate([found_idx, self.order[lo:hi]]),
+                np.concatenate([found_sims, sims]),
+                k,
+            )
+        return found_idx, found_sims, compared
+
+
+def _top_ranked(idx: np.ndarray, sims: np.ndarray, k: int):
+    """Keeps the ``k`` best positive similarities, ordered by (-similarity, index)."""
+    positive = sims > 0
+    idx, sims = idx[positive], sims[positive]
+    if len(sims) > k:
+        kth = np.partition(sims, len(sims) - k)[len(sims) - k]
+        keep = sims >= kth
+        idx, sims = idx[keep], sims[keep]
+    order = np.lexsort((idx, -sims))[:k]
+    return idx[order], sims[order]
+
+
+def _match_pruned(queries, query_counts, targets, target_counts):
+    """Exact greedy matching over popcount buckets."""
+    index = _PopcountIndex(targets, target_counts)
+    matches = np.full(len(queries), -1, dtype=np.int64)
+    similarities: List[Optional[float]] = [None] * len(queries)
+    compared = 0
+    for i, (query, a) in enumerate(zip(queries, query_counts)):
+        best, best_idx, n_compared = index.search(query, a)
+        compared += n_compared
+        if best_idx >= 0:
+            index.mark_used(best_idx)
+            matches[i] = best_idx
+            similarities[i] = best
+    return matches, similarities, compared
+
+
+def lsh_parameters(num_perm: int, recall: float, threshold: float) -> Tuple[int, int]:
+    """
+    Chooses the LSH banding for a recall target.
+
+    Returns the ``(bands, rows)`` split of ``num_perm`` MinHashes with the
+    widest bands (fewest false candidates) for which a pair with Tanimoto
+    similarity ``threshold`` collides in at least one band with probability
+    ``recall``, i.e. ``1 - (1 - threshold**rows)**bands >= recall``.
+    """
+    for rows in range(num_perm, 0, -1):
+        bands = num_perm // rows
+        if 1 - (1 - threshold**rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+
+class MinHashLSHIndex:
+    """
+    MinHash/LSH index over packed fingerprints for approximate search.
+
+    The MinHash of a fingerprint under a random permutation of bit positions
+    is its lowest permuted set bit, and two fingerprints share it with
+    probability equal to their Tanimoto similarity. Signatures are split
+    into bands that are hashed into sorted key columns; fingerprints that
+    agree on a whole band are candidates of each other.
+
+    Parameters:
+    -----------
+    targets : np.ndarray
+        Packed fingerprints from ``pack_fingerprints``.
+    n_bits : int
+        Fingerprint length in bits.
+    num_perm : int, optional
+        Number of MinHash permutations (default: 64).
+    recall : float, optional
+        Probability of retrieving a neighbour at ``threshold`` (default: 0.9).
+    threshold : float, optional
+        Similarity at which ``recall`` is guaranteed (default: 0.5).
+    seed : int, optional
+        Seed of the permutations (default: 0).
+    """
+
+    def __init__(
+        self,
+        targets: np.ndarray,
+        n_bits: int,
+        num_perm: int = LSH_NUM_PERM,
+        recall: float = LSH_RECALL,
+        threshold: float = LSH_THRESHOLD,
+        seed: int = 0,
+    ):
+        rng = np.random.default_rng(seed)
+        self.n_bits = n_bits
+        self.bands, self.rows = lsh_parameters(num_perm, recall, threshold)
+        # Rank of every bit position under each permutation, one row per bit;
+        # the extra last row is a sentinel that never wins the minimum
+        rank_dtype = np.uint16 if n_bits < np.iinfo(np.uint16).max else np.uint32
+        ranks = np.argsort(rng.random((self.bands * self.rows, n_bits)), axis=1)
+        self.ranks = np.vstack(
+            [ranks.T, np.full((1, len(ranks)), np.iinfo(rank_dtype).max)]
+        ).astype(rank_dtype)
+        self.multipliers = rng.integers(1, 2**63, size=self.rows, dtype=np.uint64) | 1
+        keys = self.band_keys(targets).T
+        self.order = np.argsort(keys, axis=1, kind="stable")
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=1)
+
+    def signatures(self, packed: np.ndarray) -> np.ndarray:
+        """MinHash signatures, one row per packed fingerprint."""
+        sig = np.empty((len(packed), self.ranks.shape[1]), dtype=self.ranks.dtype)
+        for start in range(0, len(packed), SIGNATURE_CHUNK):
+            chunk = packed[start : start + SIGNATURE_CHUNK]
+            bits = np.unpackbits(chunk.view(np.uint8), axis=1)[:, : self.n_bits]
+            rows, cols = np.divmod(np.flatnonzero(bits), self.n_bits)
+            # Set bit positions of each fingerprint, padded with the sentinel
+            counts = np.bincount(rows, minlength=len(chunk))
+            offsets = np.arange(len(rows)) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            positions = np.full((len(chunk), max(counts.max(), 1)), self.n_bits)
+            positions[rows, offsets] = cols
+            sig[start : start + len(chunk)] = self.ranks[positions].min(axis=1)
+        return sig
+
+    def band_keys(self, packed: np.ndarray) -> np.ndarray:
+        """Hashes each band of the signatures into one ``uint64`` key."""
+        sig = self.signatures(packed).astype(np.uint64)
+        sig = sig.reshape(len(packed), self.bands, self.rows)
+        return (sig * self.multipliers).sum(axis=2, dtype=np.uint64)
+
+    def candidates(self, keys: np.ndarray) -> np.ndarray:
+        """Sorted indices of the targets sharing at least one band key."""
+        found = []
+        for band, key in enumerate(keys):
+            column = self.sorted_keys[band]
+            lo = np.searchsorted(column, key, side="left")
+            hi = np.searchsorted(column, key, side="right")
+            if hi > lo:
+                found.append(self.order[band, lo:hi])
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+
+def _shortlist_similarities(query, a, targets, target_counts, shortlist):
+    """Exact similarities between one query and a subset of the targets."""
+    common = np.bitwise_count(targets[shortlist] & query).sum(axis=1, dtype=np.int64)
+    union = a + target_counts[shortlist] - common
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, common / union, 0.0)
+
+
+def _match_lsh(queries, query_counts, targets, target_counts, n_bits, recall):
+    """
+    Greedy matching over LSH shortlists, verified with exact similarities.
+
+    Queries whose shortlist holds no unused target with a positive
+    similarity fall back to the exact popcount-pruned search.
+    """
+    index = MinHashLSHIndex(targets, n_bits, recall=recall)
+    query_keys = index.band_keys(queries)
+    used = np.zeros(len(targets), dtype=bool)
+    exact = None
+
+    matches = np.full(len(queries), -1, dtype=np.int64)
+    similarities: List[Optional[float]] = [None] * len(queries)
+    compared = fallbacks = 0
+    for i, (query, a) in enumerate(zip(queries, query_counts)):
+        shortlist = index.candidates(query_keys[i])
+        shortlist = shortlist[~used[shortlist]]
+        best, best_idx = 0.0, -1
+        if len(shortlist):
+            sims = _shortlist_similarities(query, a, targets, target_counts, shortlist)
+            compared += len(shortlist)
+            j = int(np.argmax(sims))
+            if sims[j] > 0:
+                best, best_idx = sims[j], int(shortlist[j])
+        if best_idx < 0:
+            if exact is None:
+                exact = _PopcountIndex(targets, target_counts, used=used)
+            best, best_idx, n_compared = exact.search(query, a)
+            compared += n_compared
+            fallbacks += 1
+        if best_idx >= 0:
+            used[best_idx] = True
+            if exact is not None:
+                exact.mark_used(best_idx)
+            matches[i] = best_idx
+            similarities[i] = best
+    return matches, similarities, compared, fallbacks
+
+
+_worker_index = None
+
+
+def _attach_index(paths: dict):
+    """Worker initializer: memory-maps the popcount-sorted targets once."""
+    global _worker_index
+    arrays = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+    _worker_index = _PopcountIndex.from_sorted(**arrays)
+
+
+def _top_k_chunk(args):
+    queries, query_counts, k, prune = args
+    neighbours = np.full((len(queries), k), -1, dtype=np.int64)
+    similarities = np.zeros((len(queries), k))
+    compared = 0
+    for i, (query, a) in enumerate(zip(queries, query_counts)):
+        idx, sims, n_compared = _worker_index.top_k(query, a, k, prune=prune)
+        neighbours[i, : len(idx)] = idx
+        similarities[i, : len(idx)] = sims
+        compared += n_compared
+    return neighbours, similarities, compared
+
+
+def _parallel_top_k(queries, query_counts, targets, target_counts, k, prune, workers):
+    """
+    Exact top-k lists computed by a pool of worker processes.
+
+    The targets are sorted by popcount once and saved as ``.npy`` files that
+    every worker memory-maps read-only, so the matrix is shared through the
+    page cache instead of being copied into each process. Queries are split
+    into contiguous chunks and the results are concatenated in query order.
+    """
+    order = np.argsort(target_counts, kind="stable")
+    chunks = np.array_split(
+        np.arange(len(queries)), min(len(queries), workers * WORKER_CHUNKS)
+    )
+    with tempfile.TemporaryDirectory(prefix="toxichempy-match-") as tmp_dir:
+        paths = {}
+        for name, array in (
+            ("targets", targets[order]),
+            ("order", order),
+            ("sorted_counts", target_counts[order]),
+        ):
+            paths[name] = str(Path(tmp_dir) / f"{name}.npy")
+            np.save(paths[name], array)
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_attach_index, initargs=(paths,)
+        ) as executor:
+            results = list(
+                executor.map(
+                    _top_k_chunk,
+                    [(queries[c], query_counts[c], k, prune) for c in chunks],
+                )
+            )
+    return (
+        np.concatenate([r[0] for r in results]),
+        np.concatenate([r[1] for r in results]),
+        sum(r[2] for r in results),
+    )
+
+
+def top_k_neighbours(
+    queries: np.ndarray,
+    targets: np.ndarray,
+    n_bits: int,
+    k: int = TOP_K,
+    search: str = "pruned",
+    recall: float = LSH_RECALL,
+    workers: int = 1,
+    stats: Optional[dict] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sparse top-k neighbour lists of packed queries among packed targets.
+
+    Parameters:
+    -----------
+    queries, targets : np.ndarray
+        Packed fingerprints from ``pack_fingerprints``.
+    n_bits : int
+        Fingerprint length in bits.
+    k : int, optional
+        Neighbours kept per query (default: 10).
+    search : str, optional
+        ``"exhaustive"``, ``"pruned"`` (default) or ``"lsh"``; the exact
+        searches return the same lists, ``"lsh"`` ranks the LSH shortlist
+        and falls back to the exact search when it is empty.
+    recall : float, optional
+        LSH recall target (default: 0.9).
+    workers : int, optional
+        Processes sharing the exact searches (default: 1); the lsh search
+        always runs in the calling process.
+    stats : dict, optional
+        Filled with the pairs ``compared`` and LSH ``fallbacks``.
+
+    Returns:
+    --------
+    Tuple[np.ndarray, np.ndarray]
+        ``(len(queries), k)`` arrays of target positions (-1 padded) and
+        similarities (0 padded), best first; only positive similarities are
+        listed and ties are ordered by target position.
+    """
+    neighbours = np.full((len(queries), k), -1, dtype=np.int64)
+    similarities = np.zeros((len(queries), k))
+    compared = fallbacks = 0
+    if len(queries) and len(targets):
+        query_counts = popcounts(queries)
+        target_counts = popcounts(targets)
+        if search != "lsh" and workers > 1 and len(queries) > 1:
+            neighbours, similarities, compared = _parallel_top_k(
+                queries,
+                query_counts,
+                targets,
+                target_counts,
+                k,
+                search == "pruned",
+                workers,
+            )
+        else:
+            exact = None
+            lsh = None
+            if search == "lsh":
+                lsh = MinHashLSHIndex(targets, n_bits, recall=recall)
+                query_keys = lsh.band_keys(queries)
+            for i, (query, a) in enumerate(zip(queries, query_counts)):
+                idx = np.empty(0, dtype=np.int64)
+                if lsh is not None:
+                    shortlist = lsh.candidates(query_keys[i])
+                    sims = _shortlist_similarities(
+                        query, a, targets, target_counts, shortlist
+                    )
+                    compared += len(shortlist)
+                    idx, sims = _top_ranked(shortlist, sims, k)
+                if not len(idx):
+                    if exact is None:
+                        exact = _PopcountIndex(targets, target_counts)
+                    idx, sims, n_compared = exact.top_k(
+                        query, a, k, prune=search != "exhaustive"
+                    )
+                    compared += n_compared
+                    fallbacks += lsh is not None
+                neighbours[i, : len(idx)] = idx
+                similarities[i, : len(idx)] = sims
+    if stats is not None:
+        stats.update(compared=int(compared), fallbacks=fallbacks)
+    return neighbours, similarities
+
+
+def _assign_greedy(neighbours: np.ndarray, similarities: np.ndarray) -> np.ndarray:
+    """
+    Pairs the globally most similar (query, target) edges first.
+
+    Edges of the neighbour lists are popped from a priority queue by
+    decreasing similarity (ties by query, then target position); an edge
+    is taken when neither end has been paired yet.
+    """
+    queries, slots = np.nonzero(neighbours >= 0)
+    heap = list(
+        zip(
+            (-similarities[queries, slots]).tolist(),
+            queries.tolist(),
+            neighbours[queries, slots].tolist(),
+        )
+    )
+    heapq.heapify(heap)
+    assigned = [-1] * len(neighbours)
+    taken = set()
+    remaining = len(np.unique(queries))
+    while heap and remaining:
+        _, query, target = heapq.heappop(heap)
+        if assigned[query] < 0 and target not in taken:
+            assigned[query] = target
+            taken.add(target)
+            remaining -= 1
+    return np.array(assigned, dtype=np.int64)
+
+
+def _assign_optimal(
+    neighbours: np.ndarray, similarities: np.ndarray, n_targets: int
+) -> np.ndarray:
+    """
+    Maximum-similarity one-to-one pairing on the sparse neighbour graph.
+
+    Solved as a minimum-weight full bipartite matching with edge weights
+    ``2 - similarity``; every query also gets a private dummy target of
+    weight 3, so a matching always exists and a real edge is always
+    preferred to leaving a query unpaired.
+    """
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+    except ImportError as e:
+        raise ImportError(
+            "The 'optimal' assignment requires scipy: pip install scipy"
+        ) from e
+
+    n_queries = len(neighbours)
+    valid = neighbours >= 0
+    rows = np.concatenate([np.nonzero(valid)[0], np.arange(n_queries)])
+    cols = np.concatenate([neighbours[valid], n_targets + np.arange(n_queries)])
+    weights = np.concatenate([2.0 - similarities[valid], np.full(n_queries, 3.0)])
+    graph = csr_matrix(
+        (weights, (rows, cols)), shape=(n_queries, n_targets + n_queries)
+    )
+    row_ind, col_ind = min_weight_full_bipartite_matching(graph)
+    assigned = np.full(n_queries, -1, dtype=np.int64)
+    real = col_ind < n_targets
+    assigned[row_ind[real]] = col_ind[real]
+    return assigned
+
+
+def assign_pairs(
+    neighbours: np.ndarray,
+    similarities: np.ndarray,
+    n_targets: int,
+    assignment: str = "greedy",
+) -> np.ndarray:
+    """
+    One-to-one pairing of queries and targets from top-k neighbour lists.
+
+    Parameters:
+    -----------
+    neighbours, similarities : np.ndarray
+        Neighbour lists from ``top_k_neighbours``.
+    n_targets : int
+        Number of targets the lists refer to.
+    assignment : str, optional
+        ``"greedy"`` (default) pops the globally most similar pairs from a
+        priority queue; ``"optimal"`` maximizes the total similarity with a
+        sparse linear-assignment solver (requires scipy).
+
+    Returns:
+    --------
+    np.ndarray
+        Target position assigned to every query, -1 if none.
+    """
+    if assignment == "greedy":
+        return _assign_greedy(neighbours, similarities)
+    if assignment == "optimal":
+        return _assign_optimal(neighbours, similarities, n_targets)
+    raise ValueError(
+        f"Unknown assignment '{assignment}'; expected 'greedy' or 'optimal'"
+    )
+
+
+def _replay_ordered(queries, query_counts, targets, target_counts, neighbours, sims):
+    """
+    Row-order greedy pairing replayed from exact top-k lists.
+
+    Each query takes the first unused target of its list, which is its best
+    unused target whenever one is listed; once a full list is exhausted the
+    exact pruned search over the remaining targets takes over. This yields
+    the same pairs as the sequential ordered search.
+    """
+    used = np.zeros(len(targets), dtype=bool)
+    exact = None
+    matches = np.full(len(queries), -1, dtype=np.int64)
+    similarities: List[Optional[float]] = [None] * len(queries)
+    compared = 0
+    for i, row in enumerate(neighbours):
+        free = np.flatnonzero((row >= 0) & ~used[row])
+        if len(free):
+            best, best_idx = sims[i, free[0]], int(row[free[0]])
+        elif row[-1] >= 0:
+            if exact is None:
+                exact = _PopcountIndex(targets, target_counts, used=used)
+            best, best_idx, n_compared = exact.search(queries[i], query_counts[i])
+            compared += n_compared
+            if best_idx < 0:
+                continue
+        else:
+            continue
+        used[best_idx] = True
+        if exact is not None:
+            exact.mark_used(best_idx)
+        matches[i] = best_idx
+        similarities[i] = best
+    return matches, similarities, compared
+
+
+def _match_assigned(
+    queries,
+    query_counts,
+    targets,
+    target_counts,
+    n_bits,
+    search,
+    recall,
+    assignment,
+    k,
+    workers,
+):
+    """
+    Pairs queries from their top-k lists.
+
+    The ``"ordered"`` assignment replays the row-order greedy from the lists.
+    With the global strategies, queries left unpaired although their list
+    was full (or came from an approximate LSH shortlist) are given the best
+    remaining target with the exact pruned search, in query order.
+    """
+    list_stats = {}
+    neighbours, sims = top_k_neighbours(
+        queries,
+        targets,
+        n_bits,
+        k=k,
+        search=search,
+        recall=recall,
+        workers=workers,
+        stats=list_stats,
+    )
+    if assignment == "ordered":
+        matches, similarities, compared = _replay_ordered(
+            queries, query_counts, targets, target_counts, neighbours, sims
+        )
+        return (
+            matches,
+            similarities,
+            list_stats["compared"] + compared,
+            list_stats["fallbacks"],
+        )
+    assigned = assign_pairs(neighbours, sims, len(targets), assignment)
+
+    matches = assigned.copy()
+    similarities: List[Optional[float]] = [None] * len(queries)
+    for i, target in enumerate(assigned):
+        if target >= 0:
+            similarities[i] = sims[i][neighbours[i] == target][0]
+
+    compared = list_stats["compared"]
+    leftovers = np.flatnonzero(
+        (assigned < 0) & ((neighbours[:, -1] >= 0) | (search == "lsh"))
+    )
+    if len(leftovers):
+        used = np.zeros(len(targets), dtype=bool)
+        used[assigned[assigned >= 0]] = True
+        exact = _PopcountIndex(targets, target_counts, used=used)
+        for i in leftovers:
+            best, best_idx, n_compared = exact.search(queries[i], query_counts[i])
+            compared += n_compared
+            if best_idx >= 0:
+                exact.mark_used(best_idx)
+                matches[i] = best_idx
+                similarities[i] = best
+    return matches, similarities, compared, list_stats["fallbacks"]
+
+
+def match_nearest_packed(
+    queries: np.ndarray,
+    targets: np.ndarray,
+    n_bits: int,
+    search: str = "pruned",
+    recall: float = LSH_RECALL,
+    assignment: str = "ordered",
+    k: int = TOP_K,
+    workers: int = 1,
+    block_elements: int = BLOCK_ELEMENTS,
+    stats: Optional[dict] = None,
+) -> Tuple[np.ndarray, List[Optional[float]]]:
+    """
+    ``match_nearest`` for fingerprints already packed with ``pack_fingerprints``.
+
+    See ``match_nearest`` for the parameters; ``n_bits`` is the fingerprint
+    length.
+    """
+    if search not in SEARCH_METHODS:
+        raise ValueError(
+            f"Unknown similarity search '{search}'; expected one of {SEARCH_METHODS}"
+        )
+    if assignment not in ASSIGNMENT_STRATEGIES:
+        raise ValueError(
+            f"Unknown assignment '{assignment}'; expected one of {ASSIGNMENT_STRATEGIES}"
+        )
+    candidates = len(queries) * len(targets)
+    fallbacks = 0
+    if not candidates:
+        matches = np.full(len(queries), -1, dtype=np.int64)
+        similarities: List[Optional[float]] = [None] * len(queries)
+        compared = 0
+    else:
+        query_counts = popcounts(queries)
+        target_counts = popcounts(targets)
+        if assignment != "ordered" or (workers > 1 and search != "lsh"):
+            matches, similarities, compared, fallbacks = _match_assigned(
+                queries,
+                query_counts,
+                targets,
+                target_counts,
+                n_bits,
+                search,
+                recall,
+                assignment,
+                k,
+                workers,
+            )
+        elif search == "lsh":
+            matches, similarities, compared, fallbacks = _match_lsh(
+                queries, query_counts, targets, target_counts, n_bits, recall
+            )
+        elif search == "pruned":
+            matches, similarities, compared = _match_pruned(
+                queries, query_counts, targets, target_counts
+            )
+        else:
+            matches, similarities, compared = _match_blocked(
+                queries, query_counts, targets, target_counts, block_elements
+            )
+    if stats is not None:
+        stats.update(candidates=candidates, compared=int(compared), fallbacks=fallbacks)
+    return matches, similarities
+
+
+def match_nearest(
+    query_fps: Sequence,
+    target_fps: Sequence,
+    search: str = "pruned",
+    recall: float = LSH_RECALL,
+    assignment: str = "ordered",
+    k: int = TOP_K,
+    workers: int = 1,
+    block_elements: int = BLOCK_ELEMENTS,
+    stats: Optional[dict] = None,
+) -> Tuple[np.ndarray, List[Optional[float]]]:
+    """
+    Pairs each query with a distinct, similar target.
+
+    With the default ``"ordered"`` assignment queries are handled in order;
+    each takes the unused target with the highest Tanimoto similarity (the
+    first one on ties) provided it is above zero, and that target is then
+    marked as used. The ``"greedy"`` and ``"optimal"`` assignments compute
+    top-``k`` neighbour lists once and pair the globally most similar edges
+    first, or maximize the total similarity with a sparse linear-assignment
+    solver (requires scipy); their result does not depend on query order.
+    Fingerprints are bit-packed and searched in one of three ways:
+
+    - ``"exhaustive"``: blocks of queries are scored against every target;
+    - ``"pruned"``: targets are bucketed by popcount and buckets that
+      cannot beat the current best are skipped (same pairs, less work);
+    - ``"lsh"``: approximate; only the shortlist returned by a
+      ``MinHashLSHIndex`` is scored exactly, falling back to the pruned
+      search when the shortlist has no usable target.
+
+    Parameters:
+    -----------
+    query_fps, target_fps : Sequence[ExplicitBitVect]
+        Fingerprints to pair.
+    search : str, optional
+        ``"exhaustive"``, ``"pruned"`` (default) or ``"lsh"``.
+    recall : float, optional
+        LSH recall target for a neighbour at similarity 0.5 (default: 0.9).
+    assignment : str, optional
+        ``"ordered"`` (default), ``"greedy"`` or ``"optimal"``.
+    k : int, optional
+        Neighbours per query for the global assignments (default: 10).
+    workers : int, optional
+        Processes computing exact neighbour lists in parallel (default: 1).
+        With more than one worker the inactive matrix is memory-mapped by
+        every process, each worker lists the top ``k`` targets for a chunk
+        of queries and the lists are merged in query order before the
+        assignment, so the pairs do not depend on the number of workers.
+    block_elements : int, optional
+        Maximum size of a block of the similarity matrix for the exhaustive
+        search (default: 4M).
+    stats : dict, optional
+        Filled with the number of ``candidates`` (query x target pairs), of
+        pairs actually ``compared`` and of LSH ``fallbacks``.
+
+    Returns:
+    --------
+    Tuple[np.ndarray, List[Optional[float]]]
+        Position of the matched target for every query (-1 if unmatched)
+        and the corresponding similarity (None if unmatched).
+    """
+    n_bits = query_fps[0].GetNumBits() if len(query_fps) else 0
+    return match_nearest_packed(
+        pack_fingerprints(query_fps),
+        pack_fingerprints(target_fps),
+        n_bits,
+        search=search,
+        recall=recall,
+        assignment=assignment,
+        k=k,
+        workers=workers,
+        block_elements=block_elements,
+        stats=stats,
+    )
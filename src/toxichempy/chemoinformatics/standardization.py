@@ -0,0 +1,207 @@
+import logging
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from rdkit import Chem, rdBase
+from rdkit.Chem.MolStandardize import rdMolStandardize
+
+# Number of unique SMILES sent to a worker process per task
+CHUNK_SIZE = 1000
+# Tags cached results; bump the suffix whenever standardize_smiles changes
+STANDARDIZER_VERSION = f"rdkit-{rdBase.rdkitVersion}/nonisomeric-v1"
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 900
+
+logger = logging.getLogger(__name__)
+
+
+def standardize_smiles(smiles: str) -> Optional[str]:
+    """
+    Standardizes a SMILES string with RDKit.
+
+    The molecule is parsed, written back without stereochemistry and passed
+    through ``rdMolStandardize.StandardizeSmiles``.
+
+    Parameters:
+    -----------
+    smiles : str
+        Input SMILES.
+
+    Returns:
+    --------
+    str or None
+        Standardized SMILES, or None if the SMILES cannot be parsed or
+        standardized.
+    """
+    try:
+        mol = Chem.MolFromSmiles(smiles)
+        if mol:
+            return rdMolStandardize.StandardizeSmiles(
+                Chem.MolToSmiles(mol, isomericSmiles=False)
+            )
+    except Exception as e:
+        logger.error(f"Error standardizing SMILES {smiles}: {e}")
+    return None
+
+
+def _standardize_chunk(chunk: List[str]) -> List[Optional[str]]:
+    return [standardize_smiles(smiles) for smiles in chunk]
+
+
+class StandardizationCache:
+    """
+    Persistent SQLite memo of standardized SMILES.
+
+    Entries are keyed by the raw SMILES and ``version``, so results computed
+    by a different RDKit release or standardization recipe are never reused.
+    Failed standardizations are cached as NULL. Lookups and inserts are
+    batched, hits and misses are counted for reporting, and the least
+    recently used entries are evicted once the cache holds more than
+    ``max_entries`` rows.
+
+    Parameters:
+    -----------
+    path : str or Path
+        SQLite database file (created if missing).
+    max_entries : int, optional
+        Maximum number of cached SMILES (default: 5,000,000).
+    version : str, optional
+        Standardizer version tag (default: ``STANDARDIZER_VERSION``).
+    """
+
+    def __init__(
+        self,
+        path,
+        max_entries: int = 5_000_000,
+        version: str = STANDARDIZER_VERSION,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS standardized ("
+            "raw TEXT NOT NULL, version TEXT NOT NULL, standardized TEXT, "
+            "last_used REAL NOT NULL, PRIMARY KEY (version, raw))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_used ON standardized (last_used)"
+        )
+        self._conn.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get_many(self, smiles: List[str]) -> Dict[str, Optional[str]]:
+        """Returns cached results for the given unique SMILES."""
+        found = {}
+        now = time.time()
+        for i in range(0, len(smiles), _SQL_BATCH):
+            batch = smiles[i : i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT raw, standardized FROM standardized "
+                f"WHERE version = ? AND raw IN ({placeholders})",
+                [self.version, *batch],
+            ).fetchall()
+            found.update(rows)
+            self._conn.execute(
+                f"UPDATE standardized SET last_used = ? "
+                f"WHERE version = ? AND raw IN ({placeholders})",
+                [now, self.version, *batch],
+            )
+        self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(smiles) - len(found)
+        return found
+
+    def put_many(self, results: Dict[str, Optional[str]]):
+        """Stores new results and evicts the oldest entries beyond the cap."""
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO standardized VALUES (?, ?, ?, ?)",
+            [(raw, self.version, std, now) for raw, std in results.items()],
+        )
+        self._conn.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """Deletes least recently used entries beyond ``max_entries``."""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM standardized").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self._conn.execute(
+            "DELETE FROM standardized WHERE rowid IN "
+            "(SELECT rowid FROM standardized ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        return excess
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM standardized").fetchone()
+        return count
+
+    def close(self):
+        self._conn.close()
+
+
+def standardize_smiles_parallel(
+    smiles: Iterable[str],
+    workers: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+    cache: Optional[StandardizationCache] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Standardizes the unique SMILES of a collection across a process pool.
+
+    Duplicates are standardized once. Unique SMILES are split into chunks of
+    ``chunk_size`` and distributed over ``workers`` processes; each worker
+    imports RDKit once and handles many chunks. With ``workers <= 1`` (or a
+    single chunk) everything runs in the current process. If a ``cache`` is
+    given, it is consulted in bulk first and only misses are standardized
+    and written back.
+
+    Parameters:
+    -----------
+    smiles : Iterable[str]
+        SMILES to standardize (may contain duplicates).
+    workers : int, optional
+        Number of worker processes (default: 1).
+    chunk_size : int, optional
+        Unique SMILES per task (default: 1000).
+    cache : StandardizationCache, optional
+        Persistent memo of previous results.
+
+    Returns:
+    --------
+    Dict[str, Optional[str]]
+        Mapping from each input SMILES to its standardized form (None on
+        failure), suitable for ``Series.map``.
+    """
+    unique = list(dict.fromkeys(smiles))
+    cached = cache.get_many(unique) if cache is not None else {}
+    missing = [s for s in unique if s not in cached]
+
+    chunks = [missing[i : i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        computed = dict(zip(missing, _standardize_chunk(missing)))
+    else:
+        computed = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk, out in zip(chunks, executor.map(_standardize_chunk, chunks)):
+                computed.update(zip(chunk, out))
+
+    if cache is not None and computed:
+        cache.put_many(computed)
+    return {**cached, **computed}
@@ -0,0 +1,508 @@
+import hashlib
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from toxichempy.utils.data_io_utils import open_compressed_writer
+
+CHUNK_SIZE = 1024 * 1024
+# Responses worth retrying: throttling and transient server-side failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Files next to an output file that an interrupted download resumes from
+PARTIAL_SUFFIXES = (".part", ".part.validator")
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens are refilled continuously at ``rate`` per second up to ``capacity``;
+    every call to :meth:`acquire` consumes one token, blocking until one is
+    available. PubChem asks clients to stay at or below 5 requests per second.
+
+    Parameters:
+    -----------
+    rate : float
+        Sustained number of requests allowed per second.
+    capacity : int, optional
+        Maximum burst size (default: ``rate`` rounded up, at least 1).
+    """
+
+    def __init__(self, rate: float, capacity: int = None):
+        if rate <= 0:
+            raise ValueError("Rate must be a positive number of requests per second.")
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity if capacity is not None else -(-rate // 1)))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> float:
+        """
+        Blocks until a token is available and consumes it.
+
+        Returns:
+        --------
+        float
+            Seconds spent waiting for the token.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a ``Retry-After`` header given in seconds or as an HTTP date.
+
+    Returns:
+    --------
+    float or None
+        Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(
+    attempt: int, base: float, cap: float, retry_after: Optional[float] = None
+) -> float:
+    """
+    Delay before retry number ``attempt + 1``.
+
+    A server-provided ``Retry-After`` is honoured (up to ``cap``); otherwise
+    the delay grows exponentially from ``base`` with "equal jitter", i.e. a
+    random value between half and all of ``min(cap, base * 2**attempt)``, so
+    concurrent workers do not retry in lock-step.
+
+    Parameters:
+    -----------
+    attempt : int
+        Zero-based number of the attempt that just failed.
+    base : float
+        Delay in seconds after the first failure.
+    cap : float
+        Maximum delay in seconds.
+    retry_after : float, optional
+        Seconds requested by the server's ``Retry-After`` header.
+
+    Returns:
+    --------
+    float
+        Seconds to sleep.
+    """
+    if retry_after is not None:
+        return min(cap, max(0.0, retry_after))
+    delay = min(cap, base * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker shared by all workers of a fetch batch.
+
+    Outcomes of the most recent ``window`` requests are tracked. When at
+    least ``min_requests`` have been seen and the failure fraction reaches
+    ``error_rate`` the breaker opens, and :meth:`wait` pauses every worker
+    for ``cooldown`` seconds. Afterwards a single probe request is let
+    through (half-open): success closes the breaker and the batch resumes,
+    failure opens it again.
+
+    Parameters:
+    -----------
+    error_rate : float
+        Failure fraction that opens the breaker (default: 0.5).
+    window : int
+        Number of recent outcomes considered (default: 20).
+    min_requests : int
+        Outcomes required before the breaker may open (default: 10).
+    cooldown : float
+        Seconds the breaker stays open before probing (default: 60).
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0.5,
+        window: int = 20,
+        min_requests: int = 10,
+        cooldown: float = 60.0,
+    ):
+        self.error_rate = error_rate
+        self.min_requests = min(min_requests, window)
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.trips = 0
+        self.requests = 0
+        self.failures = 0
+        self.paused_seconds = 0.0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self.state = "open"
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logger.warning(
+            f"Circuit breaker opened after {self.failures} failures; "
+            f"pausing requests for {self.cooldown:.0f}s"
+        )
+
+    def record(self, success: bool):
+        """Records the outcome of one request."""
+        with self._lock:
+            self.requests += 1
+            self.failures += not success
+            self._outcomes.append(success)
+            if self.state == "half_open":
+                if success:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    self._probe_in_flight = False
+                    logger.info("Circuit breaker closed; resuming requests")
+                else:
+                    self._open()
+            elif self.state == "closed":
+                failed = self._outcomes.count(False)
+                if (
+                    len(self._outcomes) >= self.min_requests
+                    and failed / len(self._outcomes) >= self.error_rate
+                ):
+                    self._open()
+
+    def wait(self) -> float:
+        """
+        Blocks while the breaker is open.
+
+        Returns:
+        --------
+        float
+            Seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.state == "closed":
+                    break
+                if (
+                    self.state == "open"
+                    and time.monotonic() - self._opened_at >= self.cooldown
+                ):
+                    self.state = "half_open"
+                if self.state == "half_open" and not self._probe_in_flight:
+                    self._probe_in_flight = True
+                    break
+                remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            delay = min(max(remaining, 0.05), 1.0)
+            time.sleep(delay)
+            waited += delay
+        if waited:
+            with self._lock:
+                self.paused_seconds += waited
+        return waited
+
+    def summary(self) -> dict:
+        """State and counters for run reports."""
+        with self._lock:
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "requests": self.requests,
+                "failures": self.failures,
+                "paused_seconds": round(self.paused_seconds, 2),
+            }
+
+
+class IncompleteDownloadError(requests.exceptions.RequestException):
+    """Raised when a response body ends before its advertised length."""
+
+
+@dataclass
+class TransferStats:
+    """Byte count and timing of a single HTTP transfer."""
+
+    url: str
+    status_code: int
+    bytes_written: int = 0
+    elapsed: float = 0.0
+    sha256: str = None
+    headers: dict = field(default_factory=dict)
+    size: int = 0
+    resumed_from: int = 0
+
+    @property
+    def rate(self) -> float:
+        """Transfer rate in bytes per second."""
+        return self.bytes_written / self.elapsed if self.elapsed > 0 else 0.0
+
+    def describe(self) -> str:
+        description = (
+            f"{self.bytes_written / 1e6:.2f} MB in {self.elapsed:.2f}s "
+            f"({self.rate / 1e6:.2f} MB/s)"
+        )
+        if self.resumed_from:
+            description += f", resumed at {self.resumed_from / 1e6:.2f} MB"
+        return description
+
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """
+    Creates a ``requests.Session`` whose connection pool can keep
+    ``pool_size`` keep-alive connections per host, so concurrent downloads
+    reuse TCP/TLS connections instead of opening one per request.
+
+    Parameters:
+    -----------
+    pool_size : int
+        Maximum number of pooled connections per host (default: 10).
+
+    Returns:
+    --------
+    requests.Session
+        Session with pooled HTTP and HTTPS adapters mounted.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _partial_paths(output_file: Path):
+    return tuple(
+        output_file.with_name(f"{output_file.name}{suffix}")
+        for suffix in PARTIAL_SUFFIXES
+    )
+
+
+def _discard_partial(output_file: Path):
+    for path in _partial_paths(output_file):
+        if path.exists():
+            path.unlink()
+
+
+def _content_encoded(response: requests.Response) -> bool:
+    encoding = response.headers.get("Content-Encoding", "identity")
+    return encoding.strip().lower() not in ("", "identity")
+
+
+def _range_start(response: requests.Response) -> Optional[int]:
+    content_range = response.headers.get("Content-Range", "")
+    first = content_range.partition(" ")[2].partition("-")[0]
+    return int(first) if first.isdigit() else None
+
+
+def _expected_size(response: requests.Response):
+    if response.status_code == 206:
+        content_range = response.headers.get("Content-Range", "")
+        total = content_range.rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("Content-Length")
+    if content_length and not response.headers.get("Content-Encoding"):
+        return int(content_length)
+    return None
+
+
+def _finalize_download(part_file: Path, output_file: Path, compression: str):
+    if compression == "none":
+        os.replace(part_file, output_file)
+        return
+    fd, tmp_name = tempfile.mkstemp(
+        dir=output_file.parent, prefix=f".{output_file.name}.", suffix=".tmp"
+    )
+    try:
+        with (
+            open(part_file, "rb") as source,
+            os.fdopen(fd, "wb") as file,
+            open_compressed_writer(file, compression) as writer,
+        ):
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                writer.write(chunk)
+        os.replace(tmp_name, output_file)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    part_file.unlink()
+
+
+def download_to_file(
+    session: requests.Session,
+    url: str,
+    output_file: Path,
+    timeout: float,
+    chunk_size: int = CHUNK_SIZE,
+    headers: dict = None,
+    compression: str = "none",
+    resume: bool = True,
+) -> TransferStats:
+    """
+    Streams a response body to ``output_file`` in fixed-size chunks.
+
+    The body is appended to ``{output_file}.part`` and moved into place only
+    once its size matches the advertised length, so peak memory does not
+    depend on the response size and readers never see a truncated file. If
+    a previous attempt left a ``.part`` file behind, the download resumes
+    from its end with an HTTP ``Range`` request (guarded by ``If-Range``);
+    servers that ignore the range simply restart the transfer, and a ``416
+    Range Not Satisfiable`` discards the ``.part`` file and restarts it. A
+    completed resumed transfer is reported with status 200.
+
+    Resumable downloads ask for ``Accept-Encoding: identity``: the ``.part``
+    file holds decoded bytes, whereas ranges of a content-encoded response
+    address the encoded entity. A server that encodes the body anyway is
+    not resumed; its ``.part`` file is discarded when the transfer fails.
+
+    The SHA-256 of the uncompressed body is computed while streaming and the
+    requested codec is applied when the download is finalized. Nothing is
+    written for other responses (e.g. ``304 Not Modified``).
+
+    Parameters:
+    -----------
+    session : requests.Session
+        Session used to issue the request.
+    url : str
+        URL to download.
+    output_file : Path
+        Destination file path.
+    timeout : float
+        Connect/read timeout in seconds.
+    chunk_size : int, optional
+        Number of bytes read per chunk (default: 1 MiB).
+    headers : dict, optional
+        Extra request headers, e.g. conditional ``If-None-Match``.
+    compression : str, optional
+        Codec of the final file: ``"none"``, ``"gzip"`` or ``"zstd"``.
+    resume : bool, optional
+        Resume from an existing ``.part`` file (default: True).
+
+    Returns:
+    --------
+    TransferStats
+        Status code, response headers, bytes received, total size, SHA-256
+        and elapsed time of the transfer.
+
+    Raises:
+    -------
+    IncompleteDownloadError
+        If the body is shorter than advertised (the ``.part`` file is kept so
+        the next attempt can resume), longer than advertised, or a range
+        response does not continue the ``.part`` file (both discard it).
+    """
+    output_file = Path(output_file)
+    part_file, validator_file = _partial_paths(output_file)
+    request_headers = dict(headers or {})
+    offset = part_file.stat().st_size if resume and part_file.exists() else 0
+    if resume:
+        request_headers.setdefault("Accept-Encoding", "identity")
+    if offset:
+        request_headers["Range"] = f"bytes={offset}-"
+        if validator_file.exists():
+            request_headers["If-Range"] = validator_file.read_text()
+
+    start = time.perf_counter()
+    with session.get(
+        url, stream=True, timeout=timeout, headers=request_headers
+    ) as response:
+        stats = TransferStats(
+            url=url, status_code=response.status_code, headers=dict(response.headers)
+        )
+        if response.status_code == 416 and offset:
+            # The .part file is not a prefix of the current body: start over
+            _discard_partial(output_file)
+            response.close()
+            return download_to_file(
+                session, url, output_file, timeout, chunk_size, headers, compression
+            )
+        if response.status_code not in (200, 206):
+            stats.elapsed = time.perf_counter() - start
+            return stats
+
+        encoded = _content_encoded(response)
+        digest = hashlib.sha256()
+        if response.status_code == 206:
+            if encoded or _range_start(response) != offset:
+                _discard_partial(output_file)
+                raise IncompleteDownloadError(
+                    f"Range response from {url} does not continue byte {offset}; "
+                    "restarting the download"
+                )
+            stats.resumed_from = offset
+            with open(part_file, "rb") as existing:
+                for chunk in iter(lambda: existing.read(chunk_size), b""):
+                    digest.update(chunk)
+        else:
+            offset = 0
+            validator = response.headers.get("ETag") or response.headers.get(
+                "Last-Modified"
+            )
+            if validator and not encoded:
+                validator_file.write_text(validator)
+            elif validator_file.exists():
+                validator_file.unlink()
+
+        expected = _expected_size(response)
+        try:
+            with open(part_file, "ab" if offset else "wb") as file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    file.write(chunk)
+                    digest.update(chunk)
+                    stats.bytes_written += len(chunk)
+            stats.size = offset + stats.bytes_written
+            if expected is not None and stats.size != expected:
+                if stats.size > expected:
+                    _discard_partial(output_file)
+                raise IncompleteDownloadError(
+                    f"Received {stats.size} of {expected} bytes from {url}"
+                )
+        except BaseException:
+            # Decoded bytes of an encoded body cannot be resumed by offset
+            if encoded:
+                _discard_partial(output_file)
+            raise
+
+    _finalize_download(part_file, output_file, compression)
+    if validator_file.exists():
+        validator_file.unlink()
+    stats.status_code = 200
+    stats.sha256 = digest.hexdigest()
+    stats.elapsed = time.perf_counter() - start
+    return stats
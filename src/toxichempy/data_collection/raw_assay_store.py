@@ -0,0 +1,206 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from toxichempy.data_collection.http_client import TransferStats
+from toxichempy.utils.data_io_utils import compressed_path
+
+SECONDS_PER_DAY = 86400
+
+
+@dataclass
+class AssayRecord:
+    """Metadata stored for one cached raw assay table."""
+
+    aid: str
+    sha256: str
+    size: int
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+    validated_at: float = 0.0
+    compression: str = "none"
+
+    def age_days(self, now: float = None) -> float:
+        """Days since the record was last downloaded or revalidated."""
+        now = time.time() if now is None else now
+        return (now - self.validated_at) / SECONDS_PER_DAY
+
+
+def parse_refresh_policy(value: str) -> float:
+    """
+    Converts a ``--refresh`` value into a maximum cache age in days.
+
+    Parameters:
+    -----------
+    value : str
+        ``"never"`` (never revalidate cached assays), ``"always"``
+        (revalidate on every run) or a number of days after which a cached
+        assay is considered stale.
+
+    Returns:
+    --------
+    float
+        Maximum age in days (``math.inf`` for never, ``0`` for always).
+    """
+    value = str(value).strip().lower()
+    if value == "never":
+        return math.inf
+    if value == "always":
+        return 0.0
+    try:
+        days = float(value)
+    except ValueError:
+        raise ValueError(
+            f"Invalid refresh policy: {value!r}. Use 'never', 'always' or a number of days."
+        )
+    if days < 0:
+        raise ValueError("Refresh age in days must not be negative.")
+    return days
+
+
+class RawAssayStore:
+    """
+    Persistent, content-addressed store of raw PubChem assay tables.
+
+    Each downloaded table is stored once under ``objects/`` by its SHA-256,
+    and ``aids/{aid}.json`` records which object belongs to an AID together
+    with the ETag, Last-Modified, size and fetch times used for conditional
+    revalidation. A single store can be shared by every root_dir group of
+    an assay dictionary; tables are materialized into the group directories
+    as hardlinks where possible.
+
+    Parameters:
+    -----------
+    store_dir : str or Path
+        Directory holding the store (created if missing).
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir).resolve()
+        self.objects_dir = self.store_dir / "objects"
+        self.aids_dir = self.store_dir / "aids"
+        self.staging_dir = self.store_dir / "staging"
+        for directory in (self.objects_dir, self.aids_dir, self.staging_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def _record_path(self, aid: str) -> Path:
+        return self.aids_dir / f"{aid}.json"
+
+    def object_path(self, sha256: str, compression: str = "none") -> Path:
+        return compressed_path(
+            self.objects_dir / sha256[:2] / f"{sha256}.csv", compression
+        )
+
+    def staging_path(self, aid: str) -> Path:
+        """Download target for an AID before it is committed to the store."""
+        return self.staging_dir / f"rawdata_{aid}.csv"
+
+    def get(self, aid: str) -> Optional[AssayRecord]:
+        """Returns the record for an AID, or None if it is not cached."""
+        record_path = self._record_path(aid)
+        if not record_path.exists():
+            return None
+        with open(record_path, "r") as f:
+            record = AssayRecord(**json.load(f))
+        if not self.object_path(record.sha256, record.compression).exists():
+            return None
+        return record
+
+    def _save(self, record: AssayRecord):
+        fd, tmp_name = tempfile.mkstemp(dir=self.aids_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(asdict(record), f, indent=2)
+        os.replace(tmp_name, self._record_path(record.aid))
+
+    def is_fresh(self, record: Optional[AssayRecord], max_age_days: float) -> bool:
+        """True if the record can be used without contacting the server."""
+        return record is not None and record.age_days() < max_age_days
+
+    @staticmethod
+    def conditional_headers(record: Optional[AssayRecord]) -> dict:
+        """Builds ``If-None-Match`` / ``If-Modified-Since`` request headers."""
+        headers = {}
+        if record is not None:
+            if record.etag:
+                headers["If-None-Match"] = record.etag
+            if record.last_modified:
+                headers["If-Modified-Since"] = record.last_modified
+        return headers
+
+    def add(
+        self,
+        aid: str,
+        downloaded_file: Path,
+        stats: TransferStats,
+        compression: str = "none",
+    ) -> AssayRecord:
+        """
+        Moves a freshly downloaded table into the store and records it.
+
+        ``compression`` is the codec ``downloaded_file`` was written with.
+        Identical content already present in the store is not duplicated.
+        """
+        object_path = self.object_path(stats.sha256, compression)
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        if object_path.exists():
+            os.unlink(downloaded_file)
+        else:
+            os.replace(downloaded_file, object_path)
+        now = time.time()
+        record = AssayRecord(
+            aid=str(aid),
+            sha256=stats.sha256,
+            size=stats.size,
+            url=stats.url,
+            etag=stats.headers.get("ETag"),
+            last_modified=stats.headers.get("Last-Modified"),
+            fetched_at=now,
+            validated_at=now,
+            compression=compression,
+        )
+        self._save(record)
+        return record
+
+    def mark_validated(self, record: AssayRecord) -> AssayRecord:
+        """Refreshes the validation time after a ``304 Not Modified``."""
+        record.validated_at = time.time()
+        self._save(record)
+        return record
+
+    def materialize(self, record: AssayRecord, dest: Path) -> Path:
+        """
+        Places the cached table at ``dest`` (hardlink, or copy as fallback).
+
+        The codec suffix of the stored object is appended to ``dest``; the
+        path actually written is returned.
+        """
+        dest = compressed_path(dest, record.compression)
+        if dest.exists():
+            dest.unlink()
+        source = self.object_path(record.sha256, record.compression)
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+        return dest
+
+    def prune(self) -> int:
+        """Deletes stored objects no AID refers to; returns the number removed."""
+        referenced = set()
+        for record_path in self.aids_dir.glob("*.json"):
+            with open(record_path, "r") as f:
+                referenced.add(json.load(f)["sha256"])
+        removed = 0
+        for object_path in self.objects_dir.glob("*/*.csv*"):
+            if object_path.name.split(".")[0] not in referenced:
+                object_path.unlink()
+                removed += 1
+        return removed
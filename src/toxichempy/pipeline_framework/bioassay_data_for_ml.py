@@ -1,25 +1,97 @@
 import csv
-import glob
+import fnmatch
 import logging
 import os
+import pickle
 import shutil
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
 import typer
 from dotenv import load_dotenv
-from rdkit import Chem
-from rdkit.Chem import AllChem, Descriptors
-from rdkit.Chem.MolStandardize import rdMolStandardize
-from rdkit.DataStructs import TanimotoSimilarity
+from rdkit import Chem, DataStructs, rdBase
+from rdkit.Chem import rdFingerprintGenerator
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
-from tqdm import tqdm
+
+from toxichempy.chemoinformatics.feature_store import (
+    STORE_KEYS,
+    FeatureStore,
+    compound_keys,
+    feature_config_hash,
+)
+from toxichempy.chemoinformatics.fingerprints import (
+    FingerprintSet,
+    environment_frequencies,
+    packbits_fingerprints,
+    remap_sparse_columns,
+    save_fingerprint_bundle,
+    save_packed_fingerprints,
+    save_sparse_fingerprints,
+    sparse_morgan_counts,
+    take_sparse_rows,
+)
+from toxichempy.chemoinformatics.molecular_descriptors import (
+    calculate_descriptors,
+    descriptor_block,
+    descriptor_names,
+    descriptor_values,
+    select_descriptors,
+)
+from toxichempy.chemoinformatics.similarity import (
+    ASSIGNMENT_STRATEGIES,
+    SEARCH_METHODS,
+    match_nearest,
+)
+from toxichempy.chemoinformatics.standardization import (
+    StandardizationCache,
+    standardize_smiles,
+    standardize_smiles_parallel,
+)
+from toxichempy.data_collection.http_client import (
+    PARTIAL_SUFFIXES,
+    RETRYABLE_STATUS_CODES,
+    CircuitBreaker,
+    TokenBucket,
+    TransferStats,
+    backoff_delay,
+    create_session,
+    download_to_file,
+    parse_retry_after,
+)
+from toxichempy.data_collection.raw_assay_store import (
+    RawAssayStore,
+    parse_refresh_policy,
+)
+from toxichempy.utils.data_io_utils import (
+    COLUMNAR_EXTENSIONS,
+    COMPRESSION_SUFFIXES,
+    PARTITION_FILE,
+    compressed_path,
+    dataset_partitions,
+    find_compressed_file,
+    find_table,
+    merge_tables,
+    partition_path,
+    read_file,
+    require_pyarrow,
+    table_variants,
+    write_file,
+)
+from toxichempy.utils.publish import (
+    COPY_WORKERS,
+    PUBLISH_MODES,
+    Publisher,
+    file_checksum,
+)
 
 # Initialize Typer app with a single command
 app = typer.Typer()
@@ -36,8 +108,101 @@ REQUIRED_COLUMNS = [
     "PUBCHEM_EXT_DATASOURCE_SMILES",
     "PUBCHEM_ACTIVITY_OUTCOME",
 ]
+# Columns carried from each matched compound into the similarity outputs
+MATCH_COLUMNS = [
+    "PUBCHEM_CID",
+    "STANDARDIZED_SMILES",
+    "PUBCHEM_ACTIVITY_OUTCOME",
+]
 RETRIES = 3
 TIMEOUT = 10
+# Exponential backoff between retries: BACKOFF_BASE * 2**attempt, capped
+BACKOFF_BASE = 2
+BACKOFF_MAX = 60
+# The circuit breaker pauses the batch when this fraction of recent requests fail
+BREAKER_ERROR_RATE = 0.5
+BREAKER_WINDOW = 20
+BREAKER_COOLDOWN = 60
+# PubChem usage policy: no more than 5 requests per second
+REQUESTS_PER_SECOND = 5
+FETCH_WORKERS = 1
+RAW_STORE_DIR = "RawAssayStore"
+# Cached raw assays older than this many days are revalidated with PubChem
+REFRESH_POLICY = "7"
+# Worker processes for RDKit-heavy stages (1 = run in the main process)
+STANDARDIZE_WORKERS = 1
+# Persistent memo of standardized SMILES shared by all assays and runs
+STANDARDIZE_CACHE = "standardization_cache.sqlite"
+STANDARDIZE_CACHE_MAX_ENTRIES = 5_000_000
+# Codec for every table written by the pipeline: "none", "gzip" or "zstd"
+OUTPUT_COMPRESSION = "none"
+# Nearest-inactive search: "exhaustive", "pruned" (exact) or "lsh" (approximate)
+SIMILARITY_SEARCH = "pruned"
+# Probability that the LSH index retrieves an inactive with similarity 0.5
+LSH_RECALL = 0.9
+# Pairing of actives and inactives: "ordered" (actives in row order), "greedy"
+# (globally most similar pairs first) or "optimal" (sparse linear assignment)
+ASSIGNMENT = "ordered"
+# Nearest inactives listed per active for the greedy and optimal assignments
+TOP_K = 10
+# Processes computing nearest-inactive lists (1 = search in the main process)
+MATCH_WORKERS = 1
+# Morgan fingerprint output: "csv" (bitstring column), "packed" (np.packbits
+# matrix in .npy with a CID sidecar) or "both"
+FINGERPRINT_FORMAT = "csv"
+FINGERPRINT_FORMATS = ("csv", "packed", "both")
+# Additional fingerprint types written to raw_fingerprints_{aid}.npz in the
+# same pass (e.g. ("morgan3", "maccs")); empty to skip
+FINGERPRINT_SET = ()
+# Unfolded Morgan count export (sparse_morgan_counts_{aid}.npz) for ML
+SPARSE_FINGERPRINTS = False
+SPARSE_RADIUS = 2
+# Environments found in fewer rows of an assay group are dropped from its columns
+SPARSE_MIN_FREQUENCY = 1
+# Processes calculating descriptors (1 = in the main process)
+DESCRIPTOR_WORKERS = 1
+# Wall-clock seconds allowed per molecule before its worker is recycled
+# (None = no limit; any limit runs descriptors in worker processes)
+DESCRIPTOR_TIMEOUT = None
+# Descriptors written to raw_descriptors_{aid}.csv, in registry order (None = all)
+DESCRIPTORS = None
+# Descriptor table format: "csv" (full-precision text) or "parquet"/"feather"
+# (float32 columns, NaN for failed structures; needs pyarrow)
+DESCRIPTOR_FORMAT = "csv"
+DESCRIPTOR_FORMATS = ("csv", "parquet", "feather")
+# Internal codec of columnar descriptor tables for each OUTPUT_COMPRESSION
+COLUMNAR_CODECS = {
+    ".parquet": {"none": "snappy", "gzip": "gzip", "zstd": "zstd"},
+    ".feather": {"none": "uncompressed", "gzip": "zstd", "zstd": "zstd"},
+}
+# Rows read at a time when merging per-assay tables into their group table
+MERGE_CHUNK_ROWS = 100_000
+# Threads reading per-assay tables ahead of the merge writer (1 = no read-ahead)
+MERGE_READ_WORKERS = 1
+# Group merge output: "file" (one table per group) or "dataset" (hive-partitioned
+# Parquet under DATASET_DIR/<table>/group=<group>/aid=<aid>; needs pyarrow)
+MERGE_LAYOUT = "file"
+MERGE_LAYOUTS = ("file", "dataset")
+DATASET_DIR = "AssayDatasets"
+# Sidecar in each partition recording the digest of the table it was written
+# from (hidden, so dataset readers and publishing skip it)
+PARTITION_DIGEST = ".source.sha256"
+# How merged tables are published into MlData: "copy", "reflink", "hardlink",
+# "symlink" or "auto" (reflink, else hardlink, else copy); unchanged tables
+# are skipped whatever the mode
+PUBLISH_MODE = "copy"
+# Threads copying one file when it has to be copied
+PUBLISH_WORKERS = COPY_WORKERS
+# Cross-assay SQLite store of descriptors and Morgan fingerprints ('' to disable)
+FEATURE_STORE = "feature_store.sqlite"
+# Compound key of the feature store: "smiles" (standardized) or "inchikey"
+FEATURE_STORE_KEY = "smiles"
+FEATURE_STORE_MAX_BYTES = 2 << 30
+# Keep Mol.ToBinary() pickles of each assay so re-featurization skips parsing
+MOL_CACHE = False
+# Pickles of SMILES no longer in the assay are dropped and the rest are kept
+# in row order until the cache reaches this size
+MOL_CACHE_MAX_BYTES = 256 << 20
 LOG_FILE = "tox_assay.log"
 DEBUG = False
 
@@ -51,6 +216,330 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+_session = None
+_feature_store = None
+_feature_configs = set()
+
+
+def get_session() -> requests.Session:
+    """Returns the module-wide pooled HTTP session, creating it on first use."""
+    global _session
+    if _session is None:
+        _session = create_session()
+    return _session
+
+
+def open_feature_store(
+    path: Optional[str] = FEATURE_STORE,
+    key: str = FEATURE_STORE_KEY,
+    max_bytes: int = FEATURE_STORE_MAX_BYTES,
+) -> Optional[FeatureStore]:
+    """
+    Opens the cross-assay feature store consulted by the descriptor and
+    fingerprint stages (an empty ``path`` leaves it disabled).
+    """
+    global _feature_store, FEATURE_STORE_KEY
+    close_feature_store()
+    if key not in STORE_KEYS:
+        raise ValueError(
+            f"Unsupported feature store key: {key}. Choose from {list(STORE_KEYS)}."
+        )
+    FEATURE_STORE_KEY = key
+    if path:
+        _feature_store = FeatureStore(path, max_bytes=max_bytes)
+    return _feature_store
+
+
+def close_feature_store(compact: bool = False) -> Optional[dict]:
+    """
+    Closes the feature store, optionally compacting it to the feature
+    configurations used since it was opened, and returns its hit summary.
+    """
+    global _feature_store
+    if _feature_store is None:
+        return None
+    store = _feature_store
+    _feature_store = None
+    if compact:
+        dropped = store.compact(keep_configs=_feature_configs)
+        logger.info(f"Feature store compacted, {dropped} stale entries dropped")
+    summary = {
+        "hits": store.hits,
+        "misses": store.misses,
+        "hit_rate": store.hit_rate,
+        "entries": len(store),
+    }
+    logger.info(
+        f"Feature store: {store.hits} hits, {store.misses} misses "
+        f"({store.hit_rate:.1%} hit rate, {summary['entries']} entries)"
+    )
+    store.close()
+    _feature_configs.clear()
+    return summary
+
+
+def _stored_features(kind: str, config: str, uniques, unique_mols=None):
+    """Looks up unique structures in the feature store in bulk."""
+    if _feature_store is None:
+        return [None] * len(uniques), {}
+    _feature_configs.add(config)
+    keys = compound_keys(uniques, FEATURE_STORE_KEY, unique_mols)
+    return keys, _feature_store.get_many(kind, config, keys)
+
+
+def set_output_compression(compression: str):
+    """Sets the codec used for every table written by the pipeline."""
+    global OUTPUT_COMPRESSION
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(
+            f"Unsupported compression: {compression}. "
+            f"Choose from {list(COMPRESSION_SUFFIXES)}."
+        )
+    OUTPUT_COMPRESSION = compression
+
+
+def set_matching_options(
+    search: Optional[str] = None,
+    lsh_recall: Optional[float] = None,
+    assignment: Optional[str] = None,
+    top_k: Optional[int] = None,
+    workers: Optional[int] = None,
+):
+    """Sets how actives are matched to their most similar inactives."""
+    global SIMILARITY_SEARCH, LSH_RECALL, ASSIGNMENT, TOP_K, MATCH_WORKERS
+    if search is not None:
+        if search not in SEARCH_METHODS:
+            raise ValueError(
+                f"Unsupported similarity search: {search}. "
+                f"Choose from {list(SEARCH_METHODS)}."
+            )
+        SIMILARITY_SEARCH = search
+    if lsh_recall is not None:
+        if not 0 < lsh_recall < 1:
+            raise ValueError(f"LSH recall must be between 0 and 1, got {lsh_recall}")
+        LSH_RECALL = lsh_recall
+    if assignment is not None:
+        if assignment not in ASSIGNMENT_STRATEGIES:
+            raise ValueError(
+                f"Unsupported assignment: {assignment}. "
+                f"Choose from {list(ASSIGNMENT_STRATEGIES)}."
+            )
+        ASSIGNMENT = assignment
+    if top_k is not None:
+        if top_k < 1:
+            raise ValueError(f"top_k must be at least 1, got {top_k}")
+        TOP_K = top_k
+    if workers is not None:
+        if workers < 1:
+            raise ValueError(f"Match workers must be at least 1, got {workers}")
+        MATCH_WORKERS = workers
+
+
+def set_fingerprint_format(fingerprint_format: str):
+    """Sets whether Morgan fingerprints are written as CSV bitstrings, packed bits or both."""
+    global FINGERPRINT_FORMAT
+    if fingerprint_format not in FINGERPRINT_FORMATS:
+        raise ValueError(
+            f"Unsupported fingerprint format: {fingerprint_format}. "
+            f"Choose from {list(FINGERPRINT_FORMATS)}."
+        )
+    FINGERPRINT_FORMAT = fingerprint_format
+
+
+def set_fingerprint_types(types: List[str]):
+    """Sets the additional fingerprint types computed by the fingerprint stage."""
+    global FINGERPRINT_SET
+    FINGERPRINT_SET = FingerprintSet(types).types
+
+
+def set_descriptor_options(
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    names: Optional[List[str]] = None,
+    groups: Optional[List[str]] = None,
+    max_tier: Optional[str] = None,
+):
+    """
+    Sets the descriptor worker count, the per-molecule time budget and the
+    descriptors to calculate (see ``select_descriptors``).
+    """
+    global DESCRIPTOR_WORKERS, DESCRIPTOR_TIMEOUT, DESCRIPTORS
+    if workers is not None:
+        if workers < 1:
+            raise ValueError(f"Descriptor workers must be at least 1, got {workers}")
+        DESCRIPTOR_WORKERS = workers
+    if timeout is not None:
+        if timeout <= 0:
+            raise ValueError(f"Descriptor timeout must be positive, got {timeout}")
+        DESCRIPTOR_TIMEOUT = timeout
+    if names or groups or max_tier is not None:
+        DESCRIPTORS = select_descriptors(names or None, groups or None, max_tier)
+
+
+def set_descriptor_format(descriptor_format: str):
+    """Sets whether descriptor tables are written as CSV, Parquet or Feather."""
+    global DESCRIPTOR_FORMAT
+    if descriptor_format not in DESCRIPTOR_FORMATS:
+        raise ValueError(
+            f"Unsupported descriptor format: {descriptor_format}. "
+            f"Choose from {list(DESCRIPTOR_FORMATS)}."
+        )
+    if descriptor_format != "csv":
+        require_pyarrow(f".{descriptor_format}")
+    DESCRIPTOR_FORMAT = descriptor_format
+
+
+def set_merge_options(
+    chunk_rows: Optional[int] = None,
+    read_workers: Optional[int] = None,
+    layout: Optional[str] = None,
+    dataset_dir: Optional[str] = None,
+):
+    """Sets the chunk size, read-ahead threads and output layout of the group merges."""
+    global MERGE_CHUNK_ROWS, MERGE_READ_WORKERS, MERGE_LAYOUT, DATASET_DIR
+    if chunk_rows is not None:
+        if chunk_rows < 1:
+            raise ValueError(f"Merge chunk rows must be at least 1, got {chunk_rows}")
+        MERGE_CHUNK_ROWS = chunk_rows
+    if read_workers is not None:
+        if read_workers < 1:
+            raise ValueError(
+                f"Merge read workers must be at least 1, got {read_workers}"
+            )
+        MERGE_READ_WORKERS = read_workers
+    if layout is not None:
+        if layout not in MERGE_LAYOUTS:
+            raise ValueError(
+                f"Unsupported merge layout: {layout}. Choose from {list(MERGE_LAYOUTS)}."
+            )
+        if layout == "dataset":
+            require_pyarrow(".parquet")
+        MERGE_LAYOUT = layout
+    if dataset_dir is not None:
+        DATASET_DIR = dataset_dir
+
+
+def set_publish_options(mode: Optional[str] = None, workers: Optional[int] = None):
+    """Sets how ``copy_and_rename_files`` publishes tables into MlData."""
+    global PUBLISH_MODE, PUBLISH_WORKERS
+    if mode is not None:
+        if mode not in PUBLISH_MODES:
+            raise ValueError(
+                f"Unsupported publish mode: {mode}. Choose from {list(PUBLISH_MODES)}."
+            )
+        PUBLISH_MODE = mode
+    if workers is not None:
+        if workers < 1:
+            raise ValueError(f"Publish workers must be at least 1, got {workers}")
+        PUBLISH_WORKERS = workers
+
+
+def _output_table(file_path: Path) -> Path:
+    return compressed_path(file_path, OUTPUT_COMPRESSION)
+
+
+def _descriptor_table(file_path: Path) -> Tuple[Path, Optional[str]]:
+    """
+    Returns where a descriptor table named like ``file_path`` (a ``.csv``
+    path) is written in ``DESCRIPTOR_FORMAT``, and its internal codec.
+    """
+    if DESCRIPTOR_FORMAT == "csv":
+        return _output_table(file_path), None
+    output_file = file_path.with_suffix(f".{DESCRIPTOR_FORMAT}")
+    return output_file, COLUMNAR_CODECS[output_file.suffix][OUTPUT_COMPRESSION]
+
+
+def _save_descriptor_table(df: pd.DataFrame, file_path: Path) -> Path:
+    """Writes a descriptor table in ``DESCRIPTOR_FORMAT`` and returns its path."""
+    output_file, codec = _descriptor_table(file_path)
+    if codec is None:
+        df.to_csv(output_file, index=False)
+    else:
+        write_file(df, output_file, compression=codec)
+    return output_file
+
+
+def _merge_assay_tables(root_dir: str, table: str, sources: dict, output_file: Path):
+    """
+    Streams the per-assay tables of a group (``{aid: path}``) into
+    ``output_file``, or with the dataset layout into their partitions of the
+    ``DATASET_DIR/{table}`` dataset.
+    """
+    if not sources:
+        logger.error(f"No files found for {root_dir}")
+        return
+    if MERGE_LAYOUT == "dataset":
+        _write_assay_partitions(root_dir, Path(DATASET_DIR) / table, sources)
+        return
+    codec = COLUMNAR_CODECS.get(output_file.suffix, {}).get(OUTPUT_COMPRESSION)
+    start = time.perf_counter()
+    rows = merge_tables(
+        list(sources.values()),
+        output_file,
+        chunk_size=MERGE_CHUNK_ROWS,
+        read_workers=MERGE_READ_WORKERS,
+        compression=codec,
+    )
+    logger.info(
+        f"Merged file saved to {output_file} ({rows} rows from "
+        f"{len(sources)} assays in {time.perf_counter() - start:.2f}s)"
+    )
+
+
+def _write_assay_partitions(root_dir: str, dataset_dir: Path, sources: dict):
+    """
+    Writes each assay table to ``group={root_dir}/aid={aid}`` of a dataset.
+
+    A partition is only rewritten when the SHA-256 of its source table (and
+    the output codec) differs from the one recorded next to it, so adding
+    an assay to a group only writes that assay's partition even when the
+    fetch stage has rebuilt every assay directory; partitions of
+    assays no longer in the group are removed. A group or AID that cannot
+    name a partition is logged and skipped.
+    """
+    try:
+        group_dir = partition_path(dataset_dir, group=root_dir)
+    except ValueError as e:
+        logger.error(f"Skipping dataset {dataset_dir} for {root_dir}: {e}")
+        return
+    written = 0
+    current = set()
+    for aid, source in sources.items():
+        try:
+            output_dir = partition_path(group_dir, aid=aid)
+        except ValueError as e:
+            logger.error(f"Skipping AID {aid} in dataset {dataset_dir}: {e}")
+            continue
+        current.add(output_dir.name)
+        output_file = output_dir / PARTITION_FILE
+        digest_file = output_dir / PARTITION_DIGEST
+        codec = COLUMNAR_CODECS[".parquet"][OUTPUT_COMPRESSION]
+        digest = f"{file_checksum(source)} {codec}"
+        if (
+            output_file.exists()
+            and digest_file.exists()
+            and digest_file.read_text().strip() == digest
+        ):
+            continue
+        merge_tables(
+            [source], output_file, chunk_size=MERGE_CHUNK_ROWS, compression=codec
+        )
+        digest_file.write_text(f"{digest}\n")
+        written += 1
+    stale = [
+        path
+        for path in group_dir.glob("aid=*")
+        if path.is_dir() and path.name not in current
+    ]
+    for path in stale:
+        shutil.rmtree(path)
+    logger.info(
+        f"Dataset {dataset_dir} for {root_dir}: {written} of {len(sources)} "
+        f"assay partitions written, the rest up to date; "
+        f"{len(stale)} stale partitions removed"
+    )
+
+
 # Introduction message
 def show_intro():
     console.clear()
@@ -93,78 +582,312 @@ def read_assay_dictionary(file_name: str) -> dict:
     return dict_of_lists
 
 
-def fetch_assay_data(aid: str, output_file: Path) -> bool:
+def _download_assay(
+    aid: str,
+    output_file: Path,
+    session: requests.Session,
+    headers: Optional[dict] = None,
+    compression: str = "none",
+    rate_limiter: Optional[TokenBucket] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    result: Optional[dict] = None,
+) -> Optional[TransferStats]:
     for attempt in range(RETRIES):
+        if breaker is not None:
+            breaker.wait()
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        retry_after = None
         try:
-            response = requests.get(BASE_URL.format(aid), timeout=TIMEOUT)
-            if response.status_code == 200:
-                with open(output_file, "w") as file:
-                    file.write(response.text)
-                logger.info(f"Assay data for AID {aid} saved to {output_file}")
-                return True
+            stats = download_to_file(
+                session,
+                BASE_URL.format(aid),
+                output_file,
+                timeout=TIMEOUT,
+                headers=headers,
+                compression=compression,
+            )
+            if stats.status_code in (200, 304) and breaker is not None:
+                breaker.record(True)
+            if stats.status_code == 200:
+                logger.info(
+                    f"Assay data for AID {aid} saved to {output_file} "
+                    f"({stats.describe()})"
+                )
+                return stats
+            elif stats.status_code == 304:
+                logger.info(f"Assay data for AID {aid} not modified since last fetch")
+                return stats
             else:
                 logger.warning(
-                    f"Failed to retrieve assay data for AID {aid}. Status code: {response.status_code}"
+                    f"Failed to retrieve assay data for AID {aid}. Status code: {stats.status_code}"
                 )
+                if stats.status_code not in RETRYABLE_STATUS_CODES:
+                    return None
+                retry_after = parse_retry_after(stats.headers.get("Retry-After"))
         except requests.exceptions.RequestException as e:
             logger.error(f"Attempt {attempt + 1} for AID {aid} failed with error: {e}")
-            time.sleep(2)
-    return False
-
-
-def fetch_multiple_assays(aid_list: List[str], root_dir: str):
-    for aid in aid_list:
-        try:
-            assay_output_dir = Path(root_dir) / f"AID_{aid}"
-            if assay_output_dir.exists():
-                shutil.rmtree(assay_output_dir)
-            assay_output_dir.mkdir(parents=True)
-            output_file = assay_output_dir / f"rawdata_{aid}.csv"
-            if fetch_assay_data(aid, output_file):
-                logger.info(f"Successfully fetched data for AID {aid}")
-            else:
-                logger.warning(
-                    f"Failed to fetch data for AID {aid} after multiple attempts"
-                )
-        except Exception as e:
-            logger.error(f"Error fetching multiple assays for AID {aid}: {e}")
-        time.sleep(0.2)
+        if breaker is not None:
+            breaker.record(False)
+        if attempt + 1 < RETRIES:
+            delay = backoff_delay(attempt, BACKOFF_BASE, BACKOFF_MAX, retry_after)
+            if result is not None:
+                result["retries"] += 1
+            logger.info(f"Retrying AID {aid} in {delay:.1f}s")
+            time.sleep(delay)
+    return None
 
 
-def get_standardize_smiles(smiles: str) -> Optional[str]:
+def fetch_assay_data(
+    aid: str,
+    output_file: Path,
+    session: Optional[requests.Session] = None,
+    compression: str = "none",
+    breaker: Optional[CircuitBreaker] = None,
+) -> bool:
+    stats = _download_assay(
+        aid,
+        output_file,
+        session or get_session(),
+        compression=compression,
+        breaker=breaker,
+    )
+    return stats is not None
+
+
+def _fetch_from_store(
+    aid: str,
+    output_file: Path,
+    store: RawAssayStore,
+    max_age_days: float,
+    rate_limiter: TokenBucket,
+    session: requests.Session,
+    breaker: CircuitBreaker,
+    result: dict,
+) -> bool:
+    record = store.get(aid)
+    if store.is_fresh(record, max_age_days):
+        result["source"] = "cache"
+    else:
+        stats = _download_assay(
+            aid,
+            store.staging_path(aid),
+            session,
+            headers=store.conditional_headers(record),
+            compression=OUTPUT_COMPRESSION,
+            rate_limiter=rate_limiter,
+            breaker=breaker,
+            result=result,
+        )
+        if stats is not None and stats.status_code == 304 and record is None:
+            # Nothing stored to revalidate (e.g. the index was lost): refetch
+            logger.warning(
+                f"AID {aid}: not modified, but no stored copy; fetching it again"
+            )
+            stats = _download_assay(
+                aid,
+                store.staging_path(aid),
+                session,
+                headers={"Cache-Control": "no-cache"},
+                compression=OUTPUT_COMPRESSION,
+                rate_limiter=rate_limiter,
+                breaker=breaker,
+                result=result,
+            )
+            if stats is not None and stats.status_code == 304:
+                logger.error(f"AID {aid}: server keeps answering 304 Not Modified")
+                return False
+        if stats is None:
+            return False
+        if stats.status_code == 304:
+            record = store.mark_validated(record)
+            result["source"] = "not_modified"
+        else:
+            record = store.add(
+                aid, store.staging_path(aid), stats, compression=OUTPUT_COMPRESSION
+            )
+            result["source"] = "download"
+            result["bytes"] = stats.bytes_written
+    store.materialize(record, output_file)
+    return True
+
+
+def _reset_assay_dir(assay_output_dir: Path):
+    """
+    Empties an assay directory before it is fetched again, keeping the
+    partial files of an interrupted download so the next fetch resumes it.
+    """
+    assay_output_dir.mkdir(parents=True, exist_ok=True)
+    for entry in os.scandir(assay_output_dir):
+        if entry.name.endswith(PARTIAL_SUFFIXES):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.unlink(entry.path)
+
+
+def _fetch_one_assay(
+    aid: str,
+    root_dir: str,
+    rate_limiter: TokenBucket,
+    session: requests.Session,
+    breaker: CircuitBreaker,
+    store: Optional[RawAssayStore] = None,
+    max_age_days: float = 0.0,
+) -> dict:
+    result = {
+        "aid": aid,
+        "success": False,
+        "latency": 0.0,
+        "bytes": 0,
+        "source": "download",
+        "retries": 0,
+    }
     try:
-        mol = Chem.MolFromSmiles(smiles)
-        if mol:
-            return rdMolStandardize.StandardizeSmiles(
-                Chem.MolToSmiles(mol, isomericSmiles=False)
+        assay_output_dir = Path(root_dir) / f"AID_{aid}"
+        _reset_assay_dir(assay_output_dir)
+        output_file = assay_output_dir / f"rawdata_{aid}.csv"
+        start = time.perf_counter()
+        if store is not None:
+            result["success"] = _fetch_from_store(
+                aid,
+                output_file,
+                store,
+                max_age_days,
+                rate_limiter,
+                session,
+                breaker,
+                result,
+            )
+        else:
+            output_file = _output_table(output_file)
+            stats = _download_assay(
+                aid,
+                output_file,
+                session,
+                compression=OUTPUT_COMPRESSION,
+                rate_limiter=rate_limiter,
+                breaker=breaker,
+                result=result,
+            )
+            result["success"] = stats is not None
+            if result["success"]:
+                result["bytes"] = output_file.stat().st_size
+        result["latency"] = time.perf_counter() - start
+        if result["success"]:
+            logger.info(
+                f"Successfully fetched data for AID {aid} in {result['latency']:.2f}s "
+                f"(source: {result['source']})"
+            )
+        else:
+            logger.warning(
+                f"Failed to fetch data for AID {aid} after multiple attempts"
             )
     except Exception as e:
-        logger.error(f"Error standardizing SMILES {smiles}: {e}")
-    return None
+        logger.error(f"Error fetching multiple assays for AID {aid}: {e}")
+    return result
+
+
+def fetch_multiple_assays(
+    aid_list: List[str],
+    root_dir: str,
+    workers: int = FETCH_WORKERS,
+    requests_per_second: float = REQUESTS_PER_SECOND,
+    store: Optional[RawAssayStore] = None,
+    max_age_days: float = parse_refresh_policy(REFRESH_POLICY),
+    breaker: Optional[CircuitBreaker] = None,
+) -> List[dict]:
+    rate_limiter = TokenBucket(requests_per_second)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            error_rate=BREAKER_ERROR_RATE,
+            window=BREAKER_WINDOW,
+            cooldown=BREAKER_COOLDOWN,
+        )
+    start = time.perf_counter()
+    results = []
+    with (
+        create_session(pool_size=max(1, workers)) as session,
+        ThreadPoolExecutor(max_workers=max(1, workers)) as executor,
+    ):
+        futures = [
+            executor.submit(
+                _fetch_one_assay,
+                aid,
+                root_dir,
+                rate_limiter,
+                session,
+                breaker,
+                store,
+                max_age_days,
+            )
+            for aid in aid_list
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+    elapsed = time.perf_counter() - start
+
+    order = {aid: i for i, aid in enumerate(aid_list)}
+    results.sort(key=lambda r: order[r["aid"]])
+    succeeded = sum(r["success"] for r in results)
+    reused = sum(r["success"] and r["source"] != "download" for r in results)
+    total_bytes = sum(r["bytes"] for r in results)
+    retries = sum(r["retries"] for r in results)
+    throughput = len(results) / elapsed if elapsed > 0 else 0.0
+    byte_rate = total_bytes / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Fetched {succeeded}/{len(results)} assays for {root_dir} in {elapsed:.2f}s "
+        f"({throughput:.2f} AIDs/s, {byte_rate / 1e6:.2f} MB/s, {workers} workers, "
+        f"{reused} reused from raw assay store, {retries} retries, "
+        f"circuit breaker {breaker.state})"
+    )
+    return results
+
+
+def get_standardize_smiles(smiles: str) -> Optional[str]:
+    return standardize_smiles(smiles)
 
 
 def compare_smiles(smiles: str, standardized_smiles: str) -> bool:
     return smiles != standardized_smiles
 
 
-def process_assay_data(aid: str, file_path: Path, output_dir: Path):
+def process_assay_data(
+    aid: str,
+    file_path: Path,
+    output_dir: Path,
+    workers: int = STANDARDIZE_WORKERS,
+    cache: Optional[StandardizationCache] = None,
+):
     try:
         df = pd.read_csv(file_path, low_memory=False)
         if all(col in df.columns for col in REQUIRED_COLUMNS):
             df = df[REQUIRED_COLUMNS].dropna()
             df["PUBCHEM_CID"] = df["PUBCHEM_CID"].astype(int)
 
-            failed_standardizations = []
-
-            def try_standardize(row):
-                smiles = row["PUBCHEM_EXT_DATASOURCE_SMILES"]
-                pubchem_cid = row["PUBCHEM_CID"]
-                standardized_smiles = get_standardize_smiles(smiles)
-                if standardized_smiles is None:
-                    failed_standardizations.append(pubchem_cid)
-                return standardized_smiles
-
-            df["STANDARDIZED_SMILES"] = df.apply(try_standardize, axis=1)
+            start = time.perf_counter()
+            hits_before = cache.hits if cache is not None else 0
+            standardized = standardize_smiles_parallel(
+                df["PUBCHEM_EXT_DATASOURCE_SMILES"], workers=workers, cache=cache
+            )
+            df["STANDARDIZED_SMILES"] = df["PUBCHEM_EXT_DATASOURCE_SMILES"].map(
+                standardized
+            )
+            cache_report = ""
+            if cache is not None and standardized:
+                hit_rate = (cache.hits - hits_before) / len(standardized)
+                cache_report = f", cache hit rate {hit_rate:.1%}"
+            ratio = len(df) / len(standardized) if standardized else 1.0
+            logger.info(
+                f"AID {aid}: standardized {len(standardized)} unique SMILES for "
+                f"{len(df)} rows (deduplication ratio {ratio:.2f}x) in "
+                f"{time.perf_counter() - start:.2f}s with {workers} workers"
+                f"{cache_report}"
+            )
+            failed_standardizations = df.loc[
+                df["STANDARDIZED_SMILES"].isna(), "PUBCHEM_CID"
+            ]
 
             failed_file = Path(output_dir) / f"failed_standardize_smiles_{aid}.txt"
             with failed_file.open("w") as f:
@@ -173,17 +896,14 @@ def process_assay_data(aid: str, file_path: Path, output_dir: Path):
             logger.info(f"Failed standardizations for AID {aid} saved to {failed_file}")
 
             df.dropna(subset=["STANDARDIZED_SMILES"], inplace=True)
-            df["IS_STANDARDIZED"] = df.apply(
-                lambda row: compare_smiles(
-                    row["PUBCHEM_EXT_DATASOURCE_SMILES"], row["STANDARDIZED_SMILES"]
-                ),
-                axis=1,
+            df["IS_STANDARDIZED"] = (
+                df["PUBCHEM_EXT_DATASOURCE_SMILES"] != df["STANDARDIZED_SMILES"]
             )
 
             df = df[["PUBCHEM_CID", "STANDARDIZED_SMILES", "PUBCHEM_ACTIVITY_OUTCOME"]]
             df = df[df["PUBCHEM_ACTIVITY_OUTCOME"].isin(["Active", "Inactive"])]
 
-            output_file = Path(output_dir) / f"cleaned_data_{aid}.csv"
+            output_file = _output_table(Path(output_dir) / f"cleaned_data_{aid}.csv")
             df.to_csv(output_file, index=False)
             logger.info(f"Processed data for AID {aid} saved to {output_file}")
         else:
@@ -193,24 +913,84 @@ def process_assay_data(aid: str, file_path: Path, output_dir: Path):
         logger.error(f"Error processing assay data for AID {aid}: {e}")
 
 
-def fetch_and_process_assays(dict_of_lists: dict):
+def fetch_and_process_assays(
+    dict_of_lists: dict,
+    fetch_workers: int = FETCH_WORKERS,
+    raw_store_dir: Optional[str] = RAW_STORE_DIR,
+    refresh: str = REFRESH_POLICY,
+    workers: int = STANDARDIZE_WORKERS,
+    standardize_cache: Optional[str] = STANDARDIZE_CACHE,
+) -> dict:
+    store = RawAssayStore(raw_store_dir) if raw_store_dir else None
+    cache = (
+        StandardizationCache(
+            standardize_cache, max_entries=STANDARDIZE_CACHE_MAX_ENTRIES
+        )
+        if standardize_cache
+        else None
+    )
+    max_age_days = parse_refresh_policy(refresh)
+    breaker = CircuitBreaker(
+        error_rate=BREAKER_ERROR_RATE,
+        window=BREAKER_WINDOW,
+        cooldown=BREAKER_COOLDOWN,
+    )
+    fetch_results = []
     for root_dir, aid_list in dict_of_lists.items():
         Path(root_dir).mkdir(parents=True, exist_ok=True)
-        fetch_multiple_assays(aid_list, root_dir)
+        fetch_results += fetch_multiple_assays(
+            aid_list,
+            root_dir,
+            workers=fetch_workers,
+            store=store,
+            max_age_days=max_age_days,
+            breaker=breaker,
+        )
         for aid in aid_list:
             try:
                 assay_output_dir = Path(root_dir) / f"AID_{aid}"
                 process_assay_data(
                     aid,
-                    assay_output_dir / f"rawdata_{aid}.csv",
+                    find_compressed_file(assay_output_dir / f"rawdata_{aid}.csv"),
                     assay_output_dir,
+                    workers=workers,
+                    cache=cache,
                 )
             except Exception as e:
                 logger.error(f"Error processing assays for AID {aid}: {e}")
 
+    summary = {
+        "assays": len(fetch_results),
+        "fetched": sum(r["success"] for r in fetch_results),
+        "retries": sum(r["retries"] for r in fetch_results),
+        "circuit_breaker": breaker.summary(),
+        "standardize_cache_hit_rate": None,
+    }
+    if cache is not None:
+        summary["standardize_cache_hit_rate"] = cache.hit_rate
+        logger.info(
+            f"Standardization cache: {cache.hits} hits, {cache.misses} misses "
+            f"({cache.hit_rate:.1%} hit rate, {len(cache)} entries)"
+        )
+        cache.close()
+    return summary
+
+
+def _unique_structures(aid: str, smiles: pd.Series, stage: str):
+    """Factorizes a SMILES column so per-molecule work runs once per structure."""
+    codes, uniques = pd.factorize(smiles, use_na_sentinel=False)
+    ratio = len(smiles) / len(uniques) if len(uniques) else 1.0
+    logger.info(
+        f"AID {aid}: {stage} on {len(uniques)} unique structures for "
+        f"{len(smiles)} rows (deduplication ratio {ratio:.2f}x)"
+    )
+    return codes, uniques
+
 
 def get_cleaned_data(aid: str, root_dir: str) -> Optional[pd.DataFrame]:
-    file_path = Path(root_dir) / f"AID_{aid}" / f"cleaned_data_{aid}.csv"
+    file_path = find_compressed_file(
+        Path(root_dir) / f"AID_{aid}" / f"cleaned_data_{aid}.csv"
+    )
     if file_path.exists():
         return pd.read_csv(file_path)
     else:
@@ -218,151 +998,177 @@ def get_cleaned_data(aid: str, root_dir: str) -> Optional[pd.DataFrame]:
         return None
 
 
-def process_assay(aid: str, root_dir: str):
-    try:
-        df = get_cleaned_data(aid, root_dir)
-        if df is None:
-            return
+_morgan_generator = rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=2048)
 
-        logger.info(f"AID {aid}: Total rows = {df.shape[0]}")
 
-        df["PUBCHEM_CID"] = df["PUBCHEM_CID"].astype(int)
-        df["Molecule"] = df["STANDARDIZED_SMILES"].apply(Chem.MolFromSmiles)
-        df["Fingerprint"] = df["Molecule"].apply(
-            lambda mol: (
-                AllChem.GetMorganFingerprintAsBitVect(mol, 2, nBits=2048)
-                if mol is not None
-                else None
-            )
+def _similarity_fingerprint(mol):
+    """Morgan radius-2, 2048-bit vector shared by similarity and bitstring output."""
+    if mol is None:
+        return None
+    return _morgan_generator.GetFingerprint(mol)
+
+
+def _select_similar_inactives(aid: str, root_dir: str, df: pd.DataFrame):
+    """Pairs actives with their most similar inactives using the Fingerprint column."""
+    df = df.dropna(subset=["Molecule", "Fingerprint"])
+    active_df = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Active"]
+    inactive_df = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Inactive"]
+
+    logger.info(f"AID {aid}: Active compounds count = {active_df.shape[0]}")
+    logger.info(f"AID {aid}: Inactive compounds count = {inactive_df.shape[0]}")
+
+    search_stats = {}
+    matches, similarities = match_nearest(
+        active_df["Fingerprint"].tolist(),
+        inactive_df["Fingerprint"].tolist(),
+        search=SIMILARITY_SEARCH,
+        recall=LSH_RECALL,
+        assignment=ASSIGNMENT,
+        k=TOP_K,
+        workers=MATCH_WORKERS,
+        stats=search_stats,
+    )
+    if search_stats["candidates"]:
+        pruned = 1 - search_stats["compared"] / search_stats["candidates"]
+        message = (
+            f"AID {aid}: {SIMILARITY_SEARCH} similarity search skipped {pruned:.1%} "
+            f"of {search_stats['candidates']} active/inactive pairs"
         )
+        if SIMILARITY_SEARCH == "lsh":
+            message += f" ({search_stats['fallbacks']} exact fallbacks)"
+        logger.info(message)
+    paired = [similarity for similarity in similarities if similarity is not None]
+    if paired:
+        logger.info(
+            f"AID {aid}: {ASSIGNMENT} assignment paired {len(paired)}/"
+            f"{len(similarities)} actives, mean pair similarity "
+            f"{np.mean(paired):.3f}"
+        )
+    used_inactive = np.zeros(len(inactive_df), dtype=bool)
+    used_inactive[matches[matches >= 0]] = True
+
+    results = []
+    not_selected_active = []
+    inactive_records = inactive_df[MATCH_COLUMNS].to_numpy(dtype=object)
+    active_records = active_df[MATCH_COLUMNS].to_numpy(dtype=object)
+    for (cid, smiles, outcome), match, similarity in zip(
+        active_records, matches, similarities
+    ):
+        if match >= 0:
+            inactive_cid, inactive_smiles, inactive_outcome = inactive_records[match]
+            results.append(
+                {
+                    "Active_PUBCHEM_CID": cid,
+                    "Active_SMILES": smiles,
+                    "Active_PUBCHEM_ACTIVITY_OUTCOME": outcome,
+                    "Inactive_PUBCHEM_CID": inactive_cid,
+                    "Inactive_SMILES": inactive_smiles,
+                    "Inactive_PUBCHEM_ACTIVITY_OUTCOME": inactive_outcome,
+                    "Similarity": similarity,
+                }
+            )
+        else:
+            results.append(
+                {
+                    "Active_PUBCHEM_CID": cid,
+                    "Active_SMILES": smiles,
+                    "Active_PUBCHEM_ACTIVITY_OUTCOME": outcome,
+                    "Inactive_PUBCHEM_CID": None,
+                    "Inactive_SMILES": None,
+                    "Inactive_PUBCHEM_ACTIVITY_OUTCOME": None,
+                    "Similarity": None,
+                }
+            )
+            not_selected_active.append(
+                {
+                    "PUBCHEM_CID": cid,
+                    "STANDARDIZED_SMILES": smiles,
+                    "PUBCHEM_ACTIVITY_OUTCOME": outcome,
+                }
+            )
+    not_selected_inactive = inactive_df[~used_inactive]
 
-        df = df.dropna(subset=["Molecule", "Fingerprint"])
-        active_df = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Active"]
-        inactive_df = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Inactive"]
-
-        logger.info(f"AID {aid}: Active compounds count = {active_df.shape[0]}")
-        logger.info(f"AID {aid}: Inactive compounds count = {inactive_df.shape[0]}")
-
-        results = []
-        not_selected_active = []
-        not_selected_inactive = inactive_df.copy()
-        used_inactive_indices = set()
+    results_df = pd.DataFrame(results)
+    not_selected_active_df = pd.DataFrame(not_selected_active)
+    not_selected_inactive_df = not_selected_inactive
 
-        for idx, active_row in active_df.iterrows():
-            active_fp = active_row["Fingerprint"]
-            similarities = inactive_df["Fingerprint"].apply(
-                lambda x: TanimotoSimilarity(active_fp, x)
-            )
+    results_df["Inactive_PUBCHEM_CID"] = results_df["Inactive_PUBCHEM_CID"].astype(
+        pd.Int64Dtype()
+    )
 
-            similarities = similarities[~similarities.index.isin(used_inactive_indices)]
-
-            if not similarities.empty and similarities.max() > 0:
-                most_similar_idx = similarities.idxmax()
-                most_similar_inactive = inactive_df.loc[most_similar_idx]
-                used_inactive_indices.add(most_similar_idx)
-
-                results.append(
-                    {
-                        "Active_PUBCHEM_CID": active_row["PUBCHEM_CID"],
-                        "Active_SMILES": active_row["STANDARDIZED_SMILES"],
-                        "Active_PUBCHEM_ACTIVITY_OUTCOME": active_row[
-                            "PUBCHEM_ACTIVITY_OUTCOME"
-                        ],
-                        "Inactive_PUBCHEM_CID": most_similar_inactive["PUBCHEM_CID"],
-                        "Inactive_SMILES": most_similar_inactive["STANDARDIZED_SMILES"],
-                        "Inactive_PUBCHEM_ACTIVITY_OUTCOME": most_similar_inactive[
-                            "PUBCHEM_ACTIVITY_OUTCOME"
-                        ],
-                        "Similarity": similarities[most_similar_idx],
-                    }
-                )
+    final_results_df = pd.concat(
+        [
+            results_df[
+                [
+                    "Active_PUBCHEM_CID",
+                    "Active_SMILES",
+                    "Active_PUBCHEM_ACTIVITY_OUTCOME",
+                ]
+            ].rename(
+                columns={
+                    "Active_PUBCHEM_CID": "PUBCHEM_CID",
+                    "Active_SMILES": "STANDARDIZED_SMILES",
+                    "Active_PUBCHEM_ACTIVITY_OUTCOME": "PUBCHEM_ACTIVITY_OUTCOME",
+                }
+            ),
+            results_df[
+                [
+                    "Inactive_PUBCHEM_CID",
+                    "Inactive_SMILES",
+                    "Inactive_PUBCHEM_ACTIVITY_OUTCOME",
+                ]
+            ]
+            .dropna()
+            .rename(
+                columns={
+                    "Inactive_PUBCHEM_CID": "PUBCHEM_CID",
+                    "Inactive_SMILES": "STANDARDIZED_SMILES",
+                    "Inactive_PUBCHEM_ACTIVITY_OUTCOME": "PUBCHEM_ACTIVITY_OUTCOME",
+                }
+            ),
+        ]
+    )
 
-                not_selected_inactive = not_selected_inactive.drop(most_similar_idx)
-            else:
-                results.append(
-                    {
-                        "Active_PUBCHEM_CID": active_row["PUBCHEM_CID"],
-                        "Active_SMILES": active_row["STANDARDIZED_SMILES"],
-                        "Active_PUBCHEM_ACTIVITY_OUTCOME": active_row[
-                            "PUBCHEM_ACTIVITY_OUTCOME"
-                        ],
-                        "Inactive_PUBCHEM_CID": None,
-                        "Inactive_SMILES": None,
-                        "Inactive_PUBCHEM_ACTIVITY_OUTCOME": None,
-                        "Similarity": None,
-                    }
-                )
-                not_selected_active.append(
-                    {
-                        "PUBCHEM_CID": active_row["PUBCHEM_CID"],
-                        "STANDARDIZED_SMILES": active_row["STANDARDIZED_SMILES"],
-                        "PUBCHEM_ACTIVITY_OUTCOME": active_row[
-                            "PUBCHEM_ACTIVITY_OUTCOME"
-                        ],
-                    }
-                )
+    final_results_df = final_results_df.drop_duplicates().reset_index(drop=True)
 
-        results_df = pd.DataFrame(results)
-        not_selected_active_df = pd.DataFrame(not_selected_active)
-        not_selected_inactive_df = not_selected_inactive
+    assay_output_dir = Path(root_dir) / f"AID_{aid}"
+    assay_output_dir.mkdir(parents=True, exist_ok=True)
 
-        results_df["Inactive_PUBCHEM_CID"] = results_df["Inactive_PUBCHEM_CID"].astype(
-            pd.Int64Dtype()
-        )
+    results_df.to_csv(
+        _output_table(assay_output_dir / f"most_similar_inactive_compounds_{aid}.csv"),
+        index=False,
+    )
+    not_selected_active_df.to_csv(
+        _output_table(assay_output_dir / f"not_selected_active_compounds_{aid}.csv"),
+        index=False,
+    )
+    not_selected_inactive_df.to_csv(
+        _output_table(assay_output_dir / f"not_selected_inactive_compounds_{aid}.csv"),
+        index=False,
+    )
+    final_results_df.to_csv(
+        _output_table(assay_output_dir / f"SmilesForMl_{aid}.csv"), index=False
+    )
 
-        final_results_df = pd.concat(
-            [
-                results_df[
-                    [
-                        "Active_PUBCHEM_CID",
-                        "Active_SMILES",
-                        "Active_PUBCHEM_ACTIVITY_OUTCOME",
-                    ]
-                ].rename(
-                    columns={
-                        "Active_PUBCHEM_CID": "PUBCHEM_CID",
-                        "Active_SMILES": "STANDARDIZED_SMILES",
-                        "Active_PUBCHEM_ACTIVITY_OUTCOME": "PUBCHEM_ACTIVITY_OUTCOME",
-                    }
-                ),
-                results_df[
-                    [
-                        "Inactive_PUBCHEM_CID",
-                        "Inactive_SMILES",
-                        "Inactive_PUBCHEM_ACTIVITY_OUTCOME",
-                    ]
-                ]
-                .dropna()
-                .rename(
-                    columns={
-                        "Inactive_PUBCHEM_CID": "PUBCHEM_CID",
-                        "Inactive_SMILES": "STANDARDIZED_SMILES",
-                        "Inactive_PUBCHEM_ACTIVITY_OUTCOME": "PUBCHEM_ACTIVITY_OUTCOME",
-                    }
-                ),
-            ]
-        )
 
-        final_results_df = final_results_df.drop_duplicates().reset_index(drop=True)
+def process_assay(aid: str, root_dir: str):
+    try:
+        df = get_cleaned_data(aid, root_dir)
+        if df is None:
+            return
 
-        assay_output_dir = Path(root_dir) / f"AID_{aid}"
-        assay_output_dir.mkdir(parents=True, exist_ok=True)
+        logger.info(f"AID {aid}: Total rows = {df.shape[0]}")
 
-        results_df.to_csv(
-            assay_output_dir / f"most_similar_inactive_compounds_{aid}.csv",
-            index=False,
-        )
-        not_selected_active_df.to_csv(
-            assay_output_dir / f"not_selected_active_compounds_{aid}.csv",
-            index=False,
-        )
-        not_selected_inactive_df.to_csv(
-            assay_output_dir / f"not_selected_inactive_compounds_{aid}.csv",
-            index=False,
-        )
-        final_results_df.to_csv(
-            assay_output_dir / f"SmilesForMl_{aid}.csv", index=False
+        df["PUBCHEM_CID"] = df["PUBCHEM_CID"].astype(int)
+        codes, uniques = _unique_structures(
+            aid, df["STANDARDIZED_SMILES"], "similarity fingerprints"
         )
+        unique_mols = [Chem.MolFromSmiles(smiles) for smiles in uniques]
+        unique_fps = [_similarity_fingerprint(mol) for mol in unique_mols]
+        df["Molecule"] = [unique_mols[code] for code in codes]
+        df["Fingerprint"] = [unique_fps[code] for code in codes]
+
+        _select_similar_inactives(aid, root_dir, df)
     except Exception as e:
         logger.error(f"Error processing assay for AID {aid}: {e}")
 
@@ -377,20 +1183,115 @@ def process_all_assays(dict_of_lists: dict):
                 logger.error(f"Error processing all assays for AID {aid}: {e}")
 
 
-def get_mol_descriptors(smiles: str, missing_val=None) -> dict:
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is not None:
-        try:
-            descriptors = {desc[0]: desc[1](mol) for desc in Descriptors._descList}
-            return descriptors
-        except Exception as e:
-            logger.error(
-                f"Error calculating descriptors for SMILES: {smiles}, Error: {e}"
-            )
-            return {desc[0]: missing_val for desc in Descriptors._descList}
+def get_mol_descriptors(smiles: str, missing_val=None, names=None) -> dict:
+    names = names or descriptor_names()
+    values, _ = descriptor_values(Chem.MolFromSmiles(smiles), smiles, names)
+    if values is None:
+        return dict.fromkeys(names, missing_val)
+    return dict(zip(names, values))
+
+
+def _calculate_unique_descriptors(aid: str, uniques, unique_mols=None):
+    """
+    Runs the descriptor engine on the unique structures and logs its throughput.
+
+    Structures found in the feature store are not recalculated; new results
+    are written back in one batch, except timeouts and worker crashes,
+    which may succeed on another run.
+    """
+    config = feature_config_hash("descriptors", names=DESCRIPTORS or descriptor_names())
+    keys, stored = _stored_features("descriptors", config, uniques, unique_mols)
+    values = [None] * len(uniques)
+    reasons = [None] * len(uniques)
+    missing = []
+    for i, key in enumerate(keys):
+        if key in stored:
+            values[i], reasons[i] = stored[key]
+        else:
+            missing.append(i)
+
+    stats = {}
+    computed, computed_reasons = calculate_descriptors(
+        [uniques[i] for i in missing],
+        mols=[unique_mols[i] for i in missing] if unique_mols is not None else None,
+        names=DESCRIPTORS,
+        workers=DESCRIPTOR_WORKERS,
+        timeout=DESCRIPTOR_TIMEOUT,
+        stats=stats,
+    )
+    for i, row, reason in zip(missing, computed, computed_reasons):
+        values[i], reasons[i] = row, reason
+    if _feature_store is not None:
+        _feature_store.put_many(
+            "descriptors",
+            config,
+            {
+                keys[i]: (values[i], reasons[i])
+                for i in missing
+                if reasons[i] is None
+                or not reasons[i].startswith(("timed out", "worker exited"))
+            },
+        )
+
+    rate = stats["molecules"] / stats["seconds"] if stats["seconds"] else 0.0
+    logger.info(
+        f"AID {aid}: descriptors for {stats['molecules']} structures in "
+        f"{stats['seconds']:.2f}s ({rate:.1f} molecules/s, {stats['timeouts']} "
+        f"timed out, {stats['restarts']} workers restarted), "
+        f"{len(uniques) - len(missing)} from the feature store"
+    )
+    return values, reasons
+
+
+def _write_descriptors(
+    aid: str,
+    root_dir: str,
+    df: pd.DataFrame,
+    codes,
+    values: List[Optional[list]],
+    reasons: List[Optional[str]],
+):
+    """
+    Broadcasts per-structure descriptors to the rows of ``df`` and saves them.
+
+    For columnar ``DESCRIPTOR_FORMAT``s the descriptors are packed into a
+    float32 block once per structure, so every table has the columns of
+    ``df`` followed by one float32 column per descriptor, with NaN on rows
+    whose structure failed. Those rows are also written to
+    ``raw_failed_descriptors_{aid}.csv`` with the failure ``Reason``.
+    """
+    names = DESCRIPTORS or descriptor_names()
+    if DESCRIPTOR_FORMAT == "csv":
+        empty = [None] * len(names)
+        descriptors_df = pd.DataFrame(
+            [row if row is not None else empty for row in values], columns=names
+        ).iloc[codes]
+        descriptors_df.index = df.index
     else:
-        logger.warning(f"Invalid SMILES: {smiles}")
-        return {desc[0]: missing_val for desc in Descriptors._descList}
+        descriptors_df = pd.DataFrame(
+            descriptor_block(values, len(names))[codes],
+            columns=names,
+            index=df.index,
+        )
+    failed_unique = [idx for idx, reason in enumerate(reasons) if reason is not None]
+    failed_indices = np.flatnonzero(np.isin(codes, failed_unique))
+    df_with_descriptors = pd.concat([df, descriptors_df], axis=1)
+
+    output_file = _save_descriptor_table(
+        df_with_descriptors,
+        Path(root_dir) / f"AID_{aid}" / f"raw_descriptors_{aid}.csv",
+    )
+    logger.info(f"Descriptors saved to {output_file}")
+
+    if len(failed_indices):
+        failed_df = df.iloc[failed_indices].assign(
+            Reason=[reasons[code] for code in codes[failed_indices]]
+        )
+        failed_file = _output_table(
+            Path(root_dir) / f"AID_{aid}" / f"raw_failed_descriptors_{aid}.csv"
+        )
+        failed_df.to_csv(failed_file, index=False)
+        logger.info(f"Failed descriptors saved to {failed_file}")
 
 
 def process_aid_descriptors(aid: str, root_dir: str):
@@ -401,30 +1302,11 @@ def process_aid_descriptors(aid: str, root_dir: str):
 
         logger.info(f"Processing AID {aid} in {root_dir} with {len(df)} records.")
 
-        descriptor_dicts = []
-        failed_indices = []
-
-        for idx, smiles in tqdm(enumerate(df["STANDARDIZED_SMILES"]), total=len(df)):
-            descriptors = get_mol_descriptors(smiles)
-            descriptor_dicts.append(descriptors)
-            if all(val is None for val in descriptors.values()):
-                failed_indices.append(idx)
-
-        descriptors_df = pd.DataFrame(descriptor_dicts)
-        descriptors_df.index = df.index
-        df_with_descriptors = pd.concat([df, descriptors_df], axis=1)
-
-        output_file = Path(root_dir) / f"AID_{aid}" / f"raw_descriptors_{aid}.csv"
-        df_with_descriptors.to_csv(output_file, index=False)
-        logger.info(f"Descriptors saved to {output_file}")
-
-        if failed_indices:
-            failed_df = df.iloc[failed_indices]
-            failed_file = (
-                Path(root_dir) / f"AID_{aid}" / f"raw_failed_descriptors_{aid}.csv"
-            )
-            failed_df.to_csv(failed_file, index=False)
-            logger.info(f"Failed descriptors saved to {failed_file}")
+        codes, uniques = _unique_structures(
+            aid, df["STANDARDIZED_SMILES"], "descriptors"
+        )
+        values, reasons = _calculate_unique_descriptors(aid, uniques)
+        _write_descriptors(aid, root_dir, df, codes, values, reasons)
     except Exception as e:
         logger.error(f"Error processing descriptors for AID {aid}: {e}")
 
@@ -440,14 +1322,122 @@ def process_all_aids_descriptors(dict_of_lists: dict):
 
 
 def calculate_fingerprint(smiles: str) -> Optional[str]:
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is not None:
-        fingerprint = AllChem.GetMorganFingerprintAsBitVect(mol, 2, nBits=2048)
+    fingerprint = _similarity_fingerprint(Chem.MolFromSmiles(smiles))
+    if fingerprint is not None:
         return fingerprint.ToBitString()
     else:
         return None
 
 
+def _write_fingerprints(
+    aid: str, root_dir: str, df: pd.DataFrame, codes, unique_fps: List
+):
+    """
+    Broadcasts per-structure Morgan fingerprints to the rows of ``df`` and saves them.
+
+    Depending on ``FINGERPRINT_FORMAT`` writes ``raw_morgan_fingerprints_{aid}.csv``
+    with a bitstring column and/or ``raw_morgan_fingerprints_{aid}.npy``, a
+    memory-mappable ``np.packbits`` matrix of the rows whose fingerprint could
+    be computed, with their CIDs in ``raw_morgan_fingerprints_{aid}_cids.npy``.
+    """
+    assay_dir = Path(root_dir) / f"AID_{aid}"
+    valid = np.array([fp is not None for fp in unique_fps], dtype=bool)[codes]
+    failed_indices = np.flatnonzero(~valid)
+
+    if FINGERPRINT_FORMAT in ("csv", "both"):
+        bitstrings = [fp.ToBitString() if fp is not None else None for fp in unique_fps]
+        fingerprints_df = pd.DataFrame(
+            [bitstrings[code] for code in codes], columns=["MorganFingerprint"]
+        )
+        fingerprints_df.index = df.index
+        df_with_fingerprints = pd.concat([df, fingerprints_df], axis=1)
+
+        output_file = _output_table(assay_dir / f"raw_morgan_fingerprints_{aid}.csv")
+        df_with_fingerprints.to_csv(output_file, index=False)
+        logger.info(f"Morgan fingerprints saved to {output_file}")
+
+    if FINGERPRINT_FORMAT in ("packed", "both"):
+        computed = [code for code, fp in enumerate(unique_fps) if fp is not None]
+        packed = packbits_fingerprints([unique_fps[code] for code in computed])
+        packed_row = np.full(len(unique_fps), -1, dtype=np.int64)
+        packed_row[computed] = np.arange(len(computed))
+        output_file, _ = save_packed_fingerprints(
+            assay_dir / f"raw_morgan_fingerprints_{aid}.npy",
+            packed[packed_row[codes[valid]]],
+            df["PUBCHEM_CID"].to_numpy()[valid],
+        )
+        logger.info(f"Packed Morgan fingerprints saved to {output_file}")
+
+    if len(failed_indices):
+        failed_df = df.iloc[failed_indices]
+        failed_file = _output_table(assay_dir / f"failed_morgan_fingerprints_{aid}.csv")
+        failed_df.to_csv(failed_file, index=False)
+        logger.info(f"Failed fingerprints saved to {failed_file}")
+
+
+def _write_fingerprint_set(
+    aid: str, root_dir: str, df: pd.DataFrame, codes, unique_mols: List
+):
+    """
+    Computes the ``FINGERPRINT_SET`` types per structure and saves them together.
+
+    Writes ``raw_fingerprints_{aid}.npz`` with one matrix per type for the
+    rows whose SMILES could be parsed, their ``PUBCHEM_CID`` and logs the
+    time spent on each type.
+    """
+    if not FINGERPRINT_SET:
+        return
+    fingerprint_set = FingerprintSet(FINGERPRINT_SET)
+    matrices = fingerprint_set.compute(unique_mols)
+    valid = np.array([mol is not None for mol in unique_mols], dtype=bool)[codes]
+    output_file = save_fingerprint_bundle(
+        Path(root_dir) / f"AID_{aid}" / f"raw_fingerprints_{aid}.npz",
+        {name: matrix[codes[valid]] for name, matrix in matrices.items()},
+        df["PUBCHEM_CID"].to_numpy()[valid],
+    )
+    timing = ", ".join(
+        f"{name} {seconds:.2f}s" for name, seconds in fingerprint_set.seconds.items()
+    )
+    logger.info(
+        f"AID {aid}: {len(FINGERPRINT_SET)} fingerprint types for "
+        f"{len(unique_mols)} structures ({timing}) saved to {output_file}"
+    )
+
+
+def _unique_fingerprints(aid: str, uniques, unique_mols=None) -> List:
+    """
+    Morgan fingerprints of the unique structures, served from the feature
+    store where possible; only misses are parsed (unless ``unique_mols`` are
+    given) and fingerprinted, and written back in one batch.
+    """
+    config = feature_config_hash("morgan", radius=2, n_bits=2048)
+    keys, stored = _stored_features("morgan", config, uniques, unique_mols)
+    unique_fps = []
+    new = {}
+    for i, key in enumerate(keys):
+        if key in stored:
+            binary = stored[key]
+            unique_fps.append(
+                DataStructs.ExplicitBitVect(binary) if binary is not None else None
+            )
+            continue
+        mol = (
+            unique_mols[i]
+            if unique_mols is not None
+            else Chem.MolFromSmiles(uniques[i])
+        )
+        fp = _similarity_fingerprint(mol)
+        new[key] = fp.ToBinary() if fp is not None else None
+        unique_fps.append(fp)
+    if _feature_store is not None:
+        _feature_store.put_many("morgan", config, new)
+        logger.info(
+            f"AID {aid}: {len(uniques) - len(new)}/{len(uniques)} Morgan "
+            f"fingerprints from the feature store"
+        )
+    return unique_fps
+
+
 def process_aid_fingerprints(aid: str, root_dir: str):
     try:
         df = get_cleaned_data(aid, root_dir)
@@ -456,32 +1446,14 @@ def process_aid_fingerprints(aid: str, root_dir: str):
 
         logger.info(f"Processing AID {aid} with {len(df)} records.")
 
-        fingerprint_list = []
-        failed_indices = []
-
-        for idx, smiles in tqdm(enumerate(df["STANDARDIZED_SMILES"]), total=len(df)):
-            fingerprint = calculate_fingerprint(smiles)
-            fingerprint_list.append(fingerprint)
-            if fingerprint is None:
-                failed_indices.append(idx)
-
-        fingerprints_df = pd.DataFrame(fingerprint_list, columns=["MorganFingerprint"])
-        fingerprints_df.index = df.index
-        df_with_fingerprints = pd.concat([df, fingerprints_df], axis=1)
-
-        output_file = (
-            Path(root_dir) / f"AID_{aid}" / f"raw_morgan_fingerprints_{aid}.csv"
+        codes, uniques = _unique_structures(
+            aid, df["STANDARDIZED_SMILES"], "Morgan fingerprints"
         )
-        df_with_fingerprints.to_csv(output_file, index=False)
-        logger.info(f"Morgan fingerprints saved to {output_file}")
-
-        if failed_indices:
-            failed_df = df.iloc[failed_indices]
-            failed_file = (
-                Path(root_dir) / f"AID_{aid}" / f"failed_morgan_fingerprints_{aid}.csv"
-            )
-            failed_df.to_csv(failed_file, index=False)
-            logger.info(f"Failed fingerprints saved to {failed_file}")
+        unique_fps = _unique_fingerprints(aid, uniques)
+        _write_fingerprints(aid, root_dir, df, codes, unique_fps)
+        if FINGERPRINT_SET:
+            unique_mols = [Chem.MolFromSmiles(smiles) for smiles in uniques]
+            _write_fingerprint_set(aid, root_dir, df, codes, unique_mols)
     except Exception as e:
         logger.error(f"Error processing fingerprints for AID {aid}: {e}")
 
@@ -496,116 +1468,414 @@ def process_all_aids_fingerprints(dict_of_lists: dict):
                 logger.error(f"Error processing all fingerprints for AID {aid}: {e}")
 
 
+def _load_molecules(
+    aid: str,
+    root_dir: str,
+    uniques,
+    cache_mols: bool = False,
+    max_bytes: int = MOL_CACHE_MAX_BYTES,
+):
+    """
+    Parses each unique SMILES once, optionally reusing pickled molecules.
+
+    With ``cache_mols`` the ``Mol.ToBinary()`` pickles of the assay are kept
+    in ``molecules_{aid}.pkl`` next to the cleaned data, keyed by SMILES;
+    rebuilding a molecule from its pickle skips SMILES parsing and
+    sanitization on later runs. The cache is tagged with the RDKit version
+    and discarded when it was written by another one. Only the current
+    SMILES are kept, up to ``max_bytes`` of pickles. Returns the molecules
+    (None for unparsable SMILES) and the number of SMILES actually parsed.
+    """
+    cache_file = Path(root_dir) / f"AID_{aid}" / f"molecules_{aid}.pkl"
+    pickles = {}
+    if cache_mols and cache_file.exists():
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("rdkit") == rdBase.rdkitVersion:
+                pickles = cached["molecules"]
+            else:
+                logger.info(f"AID {aid}: molecule cache is from another RDKit")
+        except Exception as e:
+            logger.warning(f"AID {aid}: ignoring unreadable molecule cache: {e}")
+
+    mols = []
+    parsed = 0
+    kept = {}
+    size = 0
+    for smiles in uniques:
+        if smiles in pickles:
+            binary = pickles[smiles]
+            mol = Chem.Mol(binary) if binary is not None else None
+        else:
+            mol = Chem.MolFromSmiles(smiles)
+            parsed += 1
+            binary = mol.ToBinary() if cache_mols and mol is not None else None
+        if cache_mols and size + len(binary or b"") <= max_bytes:
+            kept[smiles] = binary
+            size += len(binary or b"")
+        mols.append(mol)
+
+    if cache_mols and (parsed or kept.keys() != pickles.keys()):
+        fd, tmp_name = tempfile.mkstemp(
+            dir=cache_file.parent, prefix=f".{cache_file.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(
+                    {"rdkit": rdBase.rdkitVersion, "molecules": kept},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_name, cache_file)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+    return mols, parsed
+
+
+def featurize_assay(aid: str, root_dir: str, cache_mols: bool = MOL_CACHE):
+    """
+    Single-pass featurization of one assay.
+
+    Each unique standardized molecule is parsed once and the same ``Mol`` is
+    used for the similarity fingerprint, the Morgan fingerprint output and the
+    descriptor row. Writes the outputs of ``process_assay``,
+    ``process_aid_descriptors`` and ``process_aid_fingerprints``.
+    """
+    try:
+        df = get_cleaned_data(aid, root_dir)
+        if df is None:
+            return
+
+        logger.info(f"AID {aid}: Total rows = {df.shape[0]}")
+
+        df["PUBCHEM_CID"] = df["PUBCHEM_CID"].astype(int)
+        codes, uniques = _unique_structures(
+            aid, df["STANDARDIZED_SMILES"], "featurization"
+        )
+
+        start = time.perf_counter()
+        unique_mols, parsed = _load_molecules(aid, root_dir, uniques, cache_mols)
+        parse_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        unique_fps = _unique_fingerprints(aid, uniques, unique_mols)
+        values, reasons = _calculate_unique_descriptors(aid, uniques, unique_mols)
+        feature_time = time.perf_counter() - start
+        logger.info(
+            f"AID {aid}: parsed {parsed}/{len(uniques)} molecules in "
+            f"{parse_time:.2f}s, features computed in {feature_time:.2f}s"
+        )
+
+        _write_descriptors(aid, root_dir, df, codes, values, reasons)
+        _write_fingerprints(aid, root_dir, df, codes, unique_fps)
+        _write_fingerprint_set(aid, root_dir, df, codes, unique_mols)
+
+        df["Molecule"] = [unique_mols[code] for code in codes]
+        df["Fingerprint"] = [unique_fps[code] for code in codes]
+        _select_similar_inactives(aid, root_dir, df)
+    except Exception as e:
+        logger.error(f"Error featurizing AID {aid}: {e}")
+
+
+def featurize_all_assays(dict_of_lists: dict, cache_mols: bool = MOL_CACHE):
+    for root_dir, aid_list in dict_of_lists.items():
+        Path(root_dir).mkdir(parents=True, exist_ok=True)
+        for aid in aid_list:
+            try:
+                featurize_assay(aid, root_dir, cache_mols=cache_mols)
+            except Exception as e:
+                logger.error(f"Error featurizing all assays for AID {aid}: {e}")
+
+
+def export_sparse_fingerprints(
+    dict_of_lists: dict,
+    radius: int = SPARSE_RADIUS,
+    min_frequency: int = SPARSE_MIN_FREQUENCY,
+):
+    """
+    Writes unfolded Morgan count fingerprints of each assay as sparse matrices.
+
+    Each assay group gets one column vocabulary of hashed environment IDs,
+    so the ``sparse_morgan_counts_{aid}.npz`` matrices of a group can be
+    stacked. A first pass parses and fingerprints every assay of the group
+    (one chunk of SMILES at a time) into a temporary file and counts the rows
+    containing each environment; environments found in fewer than
+    ``min_frequency`` rows of the group are pruned, and a second pass
+    remaps each assay to the shared columns. Load the results with
+    ``toxichempy.chemoinformatics.fingerprints.load_sparse_fingerprints``.
+    """
+    for root_dir, aid_list in dict_of_lists.items():
+        Path(root_dir).mkdir(parents=True, exist_ok=True)
+        vocabulary = frequencies = None
+        pending = {}
+        with tempfile.TemporaryDirectory(dir=root_dir) as tmp_dir:
+            for aid in aid_list:
+                try:
+                    df = get_cleaned_data(aid, root_dir)
+                    if df is None:
+                        continue
+                    codes, uniques = _unique_structures(
+                        aid, df["STANDARDIZED_SMILES"], "sparse fingerprints"
+                    )
+                    indptr, env_ids, counts, parsed = sparse_morgan_counts(
+                        uniques, radius
+                    )
+                    valid = parsed[codes]
+                    indptr, env_ids, counts = take_sparse_rows(
+                        indptr, env_ids, counts, codes[valid]
+                    )
+                    vocabulary, frequencies = environment_frequencies(
+                        env_ids, vocabulary, frequencies
+                    )
+                    pending[aid] = Path(tmp_dir) / f"{aid}.npz"
+                    np.savez(
+                        pending[aid],
+                        indptr=indptr,
+                        env_ids=env_ids,
+                        counts=counts,
+                        cids=df["PUBCHEM_CID"].to_numpy()[valid],
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Error computing sparse fingerprints for AID {aid}: {e}"
+                    )
+
+            if vocabulary is None:
+                continue
+            kept = vocabulary[frequencies >= min_frequency]
+            logger.info(
+                f"{root_dir}: {len(kept)} of {len(vocabulary)} Morgan environments "
+                f"kept for sparse fingerprints (min frequency {min_frequency})"
+            )
+            for aid, tmp_file in pending.items():
+                try:
+                    with np.load(tmp_file) as raw:
+                        indptr, columns, counts = remap_sparse_columns(
+                            raw["indptr"], raw["env_ids"], raw["counts"], kept
+                        )
+                        output_file = save_sparse_fingerprints(
+                            Path(root_dir)
+                            / f"AID_{aid}"
+                            / f"sparse_morgan_counts_{aid}.npz",
+                            indptr,
+                            columns,
+                            counts,
+                            kept,
+                            raw["cids"],
+                        )
+                    logger.info(
+                        f"AID {aid}: sparse fingerprints with {indptr[-1]} non-zeros "
+                        f"saved to {output_file}"
+                    )
+                except Exception as e:
+                    logger.error(f"Error saving sparse fingerprints for AID {aid}: {e}")
+
+
 def merge_smiles_files(dict_of_lists: dict):
     for root_dir, aid_list in dict_of_lists.items():
         Path(root_dir).mkdir(parents=True, exist_ok=True)
         logger.info(f"Merging files for {root_dir}")
-        all_files = []
+        all_files = {}
         for aid in aid_list:
-            file_path = Path(root_dir) / f"AID_{aid}" / f"SmilesForMl_{aid}.csv"
+            file_path = find_compressed_file(
+                Path(root_dir) / f"AID_{aid}" / f"SmilesForMl_{aid}.csv"
+            )
             if file_path.exists():
-                all_files.append(pd.read_csv(file_path))
+                all_files[aid] = file_path
             else:
                 logger.error(f"File not found: {file_path}")
-        if all_files:
-            merged_df = pd.concat(all_files, ignore_index=True)
-            output_file = Path(root_dir) / f"SmilesForMl_{root_dir}.csv"
-            merged_df.to_csv(output_file, index=False)
-            logger.info(f"Merged file saved to {output_file}")
-        else:
-            logger.error(f"No files found for {root_dir}")
+        _merge_assay_tables(
+            root_dir,
+            "SmilesForMl",
+            all_files,
+            _output_table(Path(root_dir) / f"SmilesForMl_{root_dir}.csv"),
+        )
 
 
 def merge_descriptor_files(dict_of_lists: dict):
     for root_dir, aid_list in dict_of_lists.items():
         Path(root_dir).mkdir(parents=True, exist_ok=True)
         logger.info(f"Merging files for {root_dir}")
-        all_files = []
+        all_files = {}
         for aid in aid_list:
-            file_path = Path(root_dir) / f"AID_{aid}" / f"raw_descriptors_{aid}.csv"
+            file_path = find_table(
+                Path(root_dir) / f"AID_{aid}" / f"raw_descriptors_{aid}.csv"
+            )
             if file_path.exists():
-                all_files.append(pd.read_csv(file_path))
+                all_files[aid] = file_path
             else:
                 logger.error(f"File not found: {file_path}")
-        if all_files:
-            merged_df = pd.concat(all_files, ignore_index=True)
-            output_file = Path(root_dir) / f"raw_descriptors_{root_dir}.csv"
-            merged_df.to_csv(output_file, index=False)
-            logger.info(f"Merged file saved to {output_file}")
-        else:
-            logger.error(f"No files found for {root_dir}")
+        output_file, _ = _descriptor_table(
+            Path(root_dir) / f"raw_descriptors_{root_dir}.csv"
+        )
+        _merge_assay_tables(root_dir, "raw_descriptors", all_files, output_file)
 
 
 def copy_and_rename_files(
     dict_of_lists: dict, file_patterns: List[str], timeout_seconds: int = 300
-):
+) -> dict:
+    """
+    Publishes the merged group tables into ``MlData`` with ``PUBLISH_MODE``,
+    skipping those unchanged since the last publish, and returns how many
+    files were published each way. ``timeout_seconds`` is checked before
+    each group and pattern, not per file.
+    """
     start_time = datetime.now()
     ml_data_dir = Path("MlData").resolve()
-    ml_data_dir.mkdir(parents=True, exist_ok=True)
+    publisher = Publisher(ml_data_dir, mode=PUBLISH_MODE, workers=PUBLISH_WORKERS)
 
-    for root_dir, aid_list in dict_of_lists.items():
-        for pattern in file_patterns:
-            search_pattern = str(Path(root_dir) / pattern.format(root_dir=root_dir))
-            files = glob.glob(search_pattern)
-            if not files:
-                logger.error(f"No files found for pattern: {search_pattern}")
-            for file_path in files:
-                if (datetime.now() - start_time).seconds > timeout_seconds:
+    try:
+        for root_dir, aid_list in dict_of_lists.items():
+            # One listing of the group directory serves every pattern
+            names = (
+                sorted(e.name for e in os.scandir(root_dir) if e.is_file())
+                if Path(root_dir).is_dir()
+                else []
+            )
+            for pattern in file_patterns:
+                if MERGE_LAYOUT == "dataset":
+                    # A group's dataset partitions are published under
+                    # MlData/<table>/group=<group>, keeping the hive layout
+                    table = pattern.split("_{root_dir}")[0]
+                    try:
+                        search_pattern = partition_path(
+                            Path(DATASET_DIR) / table, group=root_dir
+                        )
+                        dest_dir = partition_path(
+                            ml_data_dir / table.replace("raw_descriptors", "data"),
+                            group=root_dir,
+                        )
+                    except ValueError as e:
+                        logger.error(f"Skipping {table} of {root_dir}: {e}")
+                        continue
+                    copies = [
+                        (file_path, dest_dir / file_path.relative_to(search_pattern))
+                        for _, file_path in dataset_partitions(search_pattern)
+                    ]
+                    # Drop published partitions of assays no longer in the group
+                    current = {dest_path.parent for _, dest_path in copies}
+                    for stale in dest_dir.glob("aid=*"):
+                        if stale.is_dir() and stale not in current:
+                            shutil.rmtree(stale)
+                else:
+                    search_pattern = Path(root_dir) / pattern.format(root_dir=root_dir)
+                    copies = [
+                        (
+                            Path(root_dir) / name,
+                            ml_data_dir / name.replace("raw_descriptors_", "data_"),
+                        )
+                        for variant in table_variants(search_pattern)
+                        for name in fnmatch.filter(names, variant.name)
+                    ]
+                if not copies:
+                    logger.error(f"No files found for pattern: {search_pattern}")
+                # Checked once per batch rather than per published file
+                if (datetime.now() - start_time).total_seconds() > timeout_seconds:
                     logger.error("Process timed out.")
-                    return
-                try:
-                    dest_filename = Path(file_path).name.replace(
-                        "raw_descriptors_", "data_"
-                    )
-                    dest_path = ml_data_dir / dest_filename
-                    shutil.copy(file_path, dest_path)
-                    logger.info(f"Copied {file_path} to {dest_path}")
-                except Exception as e:
-                    logger.error(f"Failed to copy {file_path} to {dest_path}: {e}")
+                    return dict(publisher.counts)
+                for file_path, dest_path in copies:
+                    try:
+                        method = publisher.publish(file_path, dest_path)
+                        logger.info(f"Published {file_path} to {dest_path} ({method})")
+                    except Exception as e:
+                        logger.error(
+                            f"Failed to publish {file_path} to {dest_path}: {e}"
+                        )
+    finally:
+        publisher.save()
+    logger.info(f"Published to {ml_data_dir}: {dict(publisher.counts)}")
+    return dict(publisher.counts)
+
+
+def _deduplicate_dataset_group(
+    group_dir: Path, output_dir: Path
+) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Drops repeated CIDs across the assay partitions of one dataset group.
+
+    Only the CID and outcome columns of the group are held in memory; each
+    partition is then filtered and written to the same place under
+    ``output_dir``. Returns those two columns before and after, or None for
+    a group without partitions.
+    """
+    partitions = dataset_partitions(group_dir)
+    if not partitions:
+        return None
+    key_columns = ["PUBCHEM_CID", "PUBCHEM_ACTIVITY_OUTCOME"]
+    parts = [read_file(path, columns=key_columns) for _, path in partitions]
+    df = pd.concat(parts, ignore_index=True)
+    keep = ~df["PUBCHEM_CID"].duplicated().to_numpy()
+    offset = 0
+    for (_, path), part in zip(partitions, parts):
+        mask = keep[offset : offset + len(part)]
+        offset += len(part)
+        new_file_path = output_dir / path.relative_to(group_dir)
+        new_file_path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(read_file(path)[mask], new_file_path)
+    logger.info(f"Dataset without duplicates saved at {output_dir}")
+    return df, df[keep]
+
+
+def _duplicate_summary(
+    name: str, df: pd.DataFrame, df_no_duplicates: pd.DataFrame
+) -> dict:
+    total_entries_before = len(df)
+    active_count_before = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Active"].shape[0]
+    inactive_count_before = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Inactive"].shape[0]
+
+    total_entries_after = len(df_no_duplicates)
+    active_count_after = df_no_duplicates[
+        df_no_duplicates["PUBCHEM_ACTIVITY_OUTCOME"] == "Active"
+    ].shape[0]
+    inactive_count_after = df_no_duplicates[
+        df_no_duplicates["PUBCHEM_ACTIVITY_OUTCOME"] == "Inactive"
+    ].shape[0]
+    duplicate_count = total_entries_before - total_entries_after
+    unique_count = df_no_duplicates["PUBCHEM_CID"].nunique()
+
+    return {
+        "Filename": name,
+        "Total Entries Before": total_entries_before,
+        "Active Before": active_count_before,
+        "Inactive Before": inactive_count_before,
+        "Total Entries After": total_entries_after,
+        "Active After": active_count_after,
+        "Inactive After": inactive_count_after,
+        "Duplicate Count": duplicate_count,
+        "Unique Count": unique_count,
+    }
 
 
 def create_comparative_table(directory: str) -> pd.DataFrame:
     file_info_list = []
 
-    for filename in Path(directory).iterdir():
-        if filename.is_file() and filename.suffix == ".csv":
-            df = pd.read_csv(filename)
-
-            total_entries_before = len(df)
-            active_count_before = df[df["PUBCHEM_ACTIVITY_OUTCOME"] == "Active"].shape[
-                0
-            ]
-            inactive_count_before = df[
-                df["PUBCHEM_ACTIVITY_OUTCOME"] == "Inactive"
-            ].shape[0]
-
+    for filename in sorted(Path(directory).iterdir()):
+        if filename.is_file() and (
+            ".csv" in filename.suffixes or filename.suffix in COLUMNAR_EXTENSIONS
+        ):
+            df = read_file(filename)
             df_no_duplicates = df.drop_duplicates(subset=["PUBCHEM_CID"])
             new_file_path = Path(directory) / f"No_duplicates_{filename.name}"
-            df_no_duplicates.to_csv(new_file_path, index=False)
+            write_file(df_no_duplicates, new_file_path)
             logger.info(f"File without duplicates saved at {new_file_path}")
-
-            total_entries_after = len(df_no_duplicates)
-            active_count_after = df_no_duplicates[
-                df_no_duplicates["PUBCHEM_ACTIVITY_OUTCOME"] == "Active"
-            ].shape[0]
-            inactive_count_after = df_no_duplicates[
-                df_no_duplicates["PUBCHEM_ACTIVITY_OUTCOME"] == "Inactive"
-            ].shape[0]
-            duplicate_count = total_entries_before - total_entries_after
-            unique_count = df_no_duplicates["PUBCHEM_CID"].nunique()
-
-            file_info = {
-                "Filename": filename.name,
-                "Total Entries Before": total_entries_before,
-                "Active Before": active_count_before,
-                "Inactive Before": inactive_count_before,
-                "Total Entries After": total_entries_after,
-                "Active After": active_count_after,
-                "Inactive After": inactive_count_after,
-                "Duplicate Count": duplicate_count,
-                "Unique Count": unique_count,
-            }
-            file_info_list.append(file_info)
+            file_info_list.append(
+                _duplicate_summary(filename.name, df, df_no_duplicates)
+            )
+        elif filename.is_dir() and not filename.name.startswith("No_duplicates_"):
+            # Hive-partitioned dataset: one summary row per group
+            for group_dir in sorted(filename.glob("group=*")):
+                deduplicated = _deduplicate_dataset_group(
+                    group_dir,
+                    Path(directory) / f"No_duplicates_{filename.name}" / group_dir.name,
+                )
+                if deduplicated is not None:
+                    file_info_list.append(
+                        _duplicate_summary(
+                            f"{filename.name}/{group_dir.name}", *deduplicated
+                        )
+                    )
 
     df_summary = pd.DataFrame(file_info_list)
     output_csv = Path(directory) / "comparative_table.csv"
@@ -617,21 +1887,239 @@ def create_comparative_table(directory: str) -> pd.DataFrame:
 # Single Typer CLI Command
 @app.command()
 def run(
-    input_file: str = typer.Argument(..., help="Path to the assay dictionary CSV file")
+    input_file: str = typer.Argument(..., help="Path to the assay dictionary CSV file"),
+    fetch_workers: int = typer.Option(
+        FETCH_WORKERS,
+        "--fetch-workers",
+        min=1,
+        help="Number of assays downloaded concurrently (rate-limited to PubChem policy)",
+    ),
+    refresh: str = typer.Option(
+        REFRESH_POLICY,
+        "--refresh",
+        help="Revalidate cached raw assays: 'never', 'always' or after N days",
+    ),
+    raw_store: str = typer.Option(
+        RAW_STORE_DIR,
+        "--raw-store",
+        help="Directory of the raw assay store shared by all assay groups",
+    ),
+    compression: str = typer.Option(
+        OUTPUT_COMPRESSION,
+        "--compression",
+        help="Compression for raw and intermediate tables: none, gzip or zstd",
+    ),
+    workers: int = typer.Option(
+        STANDARDIZE_WORKERS,
+        "--workers",
+        min=1,
+        help="Worker processes for SMILES standardization",
+    ),
+    standardize_cache: str = typer.Option(
+        STANDARDIZE_CACHE,
+        "--standardize-cache",
+        help="SQLite memo of standardized SMILES shared across runs ('' to disable)",
+    ),
+    separate_stages: bool = typer.Option(
+        False,
+        "--separate-stages",
+        help="Run similarity, descriptors and fingerprints as separate passes",
+    ),
+    similarity_search: str = typer.Option(
+        SIMILARITY_SEARCH,
+        "--similarity-search",
+        help="Nearest-inactive search: exhaustive, pruned (exact) or lsh (approximate)",
+    ),
+    lsh_recall: float = typer.Option(
+        LSH_RECALL,
+        "--lsh-recall",
+        help="Recall target of the lsh search for inactives at similarity 0.5",
+    ),
+    assignment: str = typer.Option(
+        ASSIGNMENT,
+        "--assignment",
+        help="Active/inactive pairing: ordered, greedy or optimal (needs scipy)",
+    ),
+    top_k: int = typer.Option(
+        TOP_K,
+        "--top-k",
+        min=1,
+        help="Nearest inactives listed per active for greedy and optimal pairing",
+    ),
+    match_workers: int = typer.Option(
+        MATCH_WORKERS,
+        "--match-workers",
+        min=1,
+        help="Worker processes for the nearest-inactive search (exact searches)",
+    ),
+    fingerprint_format: str = typer.Option(
+        FINGERPRINT_FORMAT,
+        "--fingerprint-format",
+        help="Morgan fingerprint output: csv (bitstrings), packed (.npy bits) or both",
+    ),
+    fingerprint_types: str = typer.Option(
+        ",".join(FINGERPRINT_SET),
+        "--fingerprint-types",
+        help="Comma-separated extra fingerprints in one pass, e.g. morgan3,maccs,atompair",
+    ),
+    sparse_fingerprints: bool = typer.Option(
+        SPARSE_FINGERPRINTS,
+        "--sparse-fingerprints",
+        help="Also export unfolded Morgan counts as sparse matrices for ML",
+    ),
+    sparse_min_frequency: int = typer.Option(
+        SPARSE_MIN_FREQUENCY,
+        "--sparse-min-frequency",
+        min=1,
+        help="Drop Morgan environments found in fewer rows of an assay group",
+    ),
+    descriptor_workers: int = typer.Option(
+        DESCRIPTOR_WORKERS,
+        "--descriptor-workers",
+        min=1,
+        help="Worker processes for RDKit descriptors",
+    ),
+    descriptor_timeout: Optional[float] = typer.Option(
+        DESCRIPTOR_TIMEOUT,
+        "--descriptor-timeout",
+        help="Seconds allowed per molecule for descriptors before its worker is recycled",
+    ),
+    descriptors: str = typer.Option(
+        "",
+        "--descriptors",
+        help="Comma-separated descriptor names to calculate (default: all)",
+    ),
+    descriptor_groups: str = typer.Option(
+        "",
+        "--descriptor-groups",
+        help="Comma-separated descriptor groups, e.g. counts,physchem,fragments",
+    ),
+    descriptor_format: str = typer.Option(
+        DESCRIPTOR_FORMAT,
+        "--descriptor-format",
+        help="Descriptor tables: csv, or parquet/feather (float32 columns, needs pyarrow)",
+    ),
+    descriptor_tier: Optional[str] = typer.Option(
+        None,
+        "--descriptor-tier",
+        help="Most expensive descriptor cost tier to keep: cheap, moderate or expensive",
+    ),
+    feature_store: str = typer.Option(
+        FEATURE_STORE,
+        "--feature-store",
+        help="SQLite store of descriptors and fingerprints shared across assays ('' to disable)",
+    ),
+    feature_store_key: str = typer.Option(
+        FEATURE_STORE_KEY,
+        "--feature-store-key",
+        help="Compound key of the feature store: smiles (standardized) or inchikey",
+    ),
+    compact_feature_store: bool = typer.Option(
+        False,
+        "--compact-feature-store",
+        help="Drop feature store entries of other configurations and reclaim space",
+    ),
+    merge_read_workers: int = typer.Option(
+        MERGE_READ_WORKERS,
+        "--merge-read-workers",
+        min=1,
+        help="Threads reading per-assay tables ahead of the streaming group merge",
+    ),
+    merge_layout: str = typer.Option(
+        MERGE_LAYOUT,
+        "--merge-layout",
+        help="Group merge output: file, or dataset (Parquet partitioned by group and AID)",
+    ),
+    dataset_dir: str = typer.Option(
+        DATASET_DIR,
+        "--dataset-dir",
+        help="Root of the partitioned datasets written by --merge-layout dataset",
+    ),
+    publish_mode: str = typer.Option(
+        PUBLISH_MODE,
+        "--publish-mode",
+        help="Publishing into MlData: copy, reflink, hardlink, symlink or auto",
+    ),
+    publish_workers: int = typer.Option(
+        PUBLISH_WORKERS,
+        "--publish-workers",
+        min=1,
+        help="Threads of the chunked copy used when tables cannot be linked",
+    ),
+    cache_mols: bool = typer.Option(
+        MOL_CACHE,
+        "--cache-mols",
+        help="Keep pickled RDKit molecules per assay to skip parsing on reruns",
+    ),
 ):
     """Run the entire bioassay data preparation pipeline with the specified input file."""
+    set_output_compression(compression)
+    set_fingerprint_format(fingerprint_format)
+    set_descriptor_format(descriptor_format)
+    set_merge_options(
+        read_workers=merge_read_workers, layout=merge_layout, dataset_dir=dataset_dir
+    )
+    set_publish_options(mode=publish_mode, workers=publish_workers)
+    set_descriptor_options(
+        workers=descriptor_workers,
+        timeout=descriptor_timeout,
+        names=[name for name in descriptors.split(",") if name],
+        groups=[group for group in descriptor_groups.split(",") if group],
+        max_tier=descriptor_tier,
+    )
+    set_fingerprint_types([name for name in fingerprint_types.split(",") if name])
+    set_matching_options(
+        search=similarity_search,
+        lsh_recall=lsh_recall,
+        assignment=assignment,
+        top_k=top_k,
+        workers=match_workers,
+    )
     show_intro()
     assay_dict = read_assay_dictionary(input_file)
-    fetch_and_process_assays(assay_dict)
-    process_all_assays(assay_dict)
-    process_all_aids_descriptors(assay_dict)
-    process_all_aids_fingerprints(assay_dict)
+    fetch_summary = fetch_and_process_assays(
+        assay_dict,
+        fetch_workers=fetch_workers,
+        raw_store_dir=raw_store,
+        refresh=refresh,
+        workers=workers,
+        standardize_cache=standardize_cache,
+    )
+    open_feature_store(feature_store, key=feature_store_key)
+    try:
+        if separate_stages:
+            process_all_assays(assay_dict)
+            process_all_aids_descriptors(assay_dict)
+            process_all_aids_fingerprints(assay_dict)
+        else:
+            featurize_all_assays(assay_dict, cache_mols=cache_mols)
+    finally:
+        store_summary = close_feature_store(compact=compact_feature_store)
+    if sparse_fingerprints:
+        export_sparse_fingerprints(assay_dict, min_frequency=sparse_min_frequency)
     merge_smiles_files(assay_dict)
     merge_descriptor_files(assay_dict)
     file_patterns = ["raw_descriptors_{root_dir}.csv"]
     copy_and_rename_files(assay_dict, file_patterns)
     ml_data_dir = Path("./MlData").resolve()
     create_comparative_table(str(ml_data_dir))
+    breaker_summary = fetch_summary["circuit_breaker"]
+    console.print(
+        f"Fetched {fetch_summary['fetched']}/{fetch_summary['assays']} assays with "
+        f"{fetch_summary['retries']} retries; circuit breaker {breaker_summary['state']} "
+        f"(tripped {breaker_summary['trips']} times, paused "
+        f"{breaker_summary['paused_seconds']}s)"
+    )
+    if fetch_summary["standardize_cache_hit_rate"] is not None:
+        console.print(
+            f"Standardization cache hit rate: "
+            f"{fetch_summary['standardize_cache_hit_rate']:.1%}"
+        )
+    if store_summary is not None:
+        console.print(
+            f"Feature store hit rate: {store_summary['hit_rate']:.1%} "
+            f"({store_summary['entries']} entries)"
+        )
     console.print(
         f"[bold green]Bioassay data preparation pipeline completed for {input_file}."
     )
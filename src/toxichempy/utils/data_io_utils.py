@@ -1,15 +1,212 @@
+import gzip
+import os
 import pickle
 import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
+# File suffix appended to a table's name for each supported compression codec
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+# Columnar table formats (need pyarrow); they compress internally, so are
+# never given a codec suffix
+COLUMNAR_EXTENSIONS = (".parquet", ".feather")
+# Rows per chunk when streaming tables (bounds the memory of a merge)
+CHUNK_ROWS = 100_000
+# Data file of each partition of a hive-partitioned Parquet dataset
+PARTITION_FILE = "part-0.parquet"
+
+
+def compressed_path(file_path: str, compression: str = "none") -> Path:
+    """
+    Returns the path a table is written to under the given compression codec.
+
+    Parameters:
+    -----------
+    file_path : str
+        Uncompressed file path (e.g. ``cleaned_data_1.csv``).
+    compression : str
+        One of ``"none"``, ``"gzip"`` or ``"zstd"``.
+
+    Returns:
+    --------
+    Path
+        ``file_path`` with the codec suffix appended (e.g. ``.csv.gz``).
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(
+            f"Unsupported compression: {compression}. "
+            f"Choose from {list(COMPRESSION_SUFFIXES)}."
+        )
+    return Path(f"{file_path}{COMPRESSION_SUFFIXES[compression]}")
+
+
+def find_compressed_file(file_path: str) -> Path:
+    """
+    Locates a table written under any supported compression codec.
+
+    Parameters:
+    -----------
+    file_path : str
+        Uncompressed file path (e.g. ``cleaned_data_1.csv``).
+
+    Returns:
+    --------
+    Path
+        The first existing variant of ``file_path`` (uncompressed, ``.gz``
+        or ``.zst``), or ``file_path`` itself if none exists.
+    """
+    for suffix in COMPRESSION_SUFFIXES.values():
+        candidate = Path(f"{file_path}{suffix}")
+        if candidate.exists():
+            return candidate
+    return Path(file_path)
+
+
+def table_variants(file_path: str) -> List[Path]:
+    """
+    Lists every path a table may have been written under.
+
+    Parameters:
+    -----------
+    file_path : str
+        Uncompressed text table path (e.g. ``raw_descriptors_1.csv``).
+
+    Returns:
+    --------
+    List[Path]
+        ``file_path`` with each compression suffix, followed by ``file_path``
+        with its extension replaced by each columnar format.
+    """
+    variants = [
+        Path(f"{file_path}{suffix}") for suffix in COMPRESSION_SUFFIXES.values()
+    ]
+    variants += [Path(file_path).with_suffix(ext) for ext in COLUMNAR_EXTENSIONS]
+    return variants
+
+
+def find_table(file_path: str) -> Path:
+    """
+    Locates a table written compressed or in a columnar format.
+
+    Returns the first existing path of ``table_variants(file_path)``, or
+    ``file_path`` itself if none exists.
+    """
+    for candidate in table_variants(file_path):
+        if candidate.exists():
+            return candidate
+    return Path(file_path)
+
+
+def partition_path(dataset_dir: str, **keys) -> Path:
+    """
+    Returns the directory of a hive partition, e.g.
+    ``partition_path("ds", group="tox", aid=1)`` is ``ds/group=tox/aid=1``.
+    """
+    path = Path(dataset_dir)
+    for key, value in keys.items():
+        if "/" in str(value) or "=" in str(value):
+            raise ValueError(f"Invalid partition value for {key}: {value}")
+        path /= f"{key}={value}"
+    return path
+
+
+def _partition_order(value: str):
+    return (0, int(value), "") if value.isdigit() else (1, 0, value)
+
+
+def dataset_partitions(dataset_dir: str) -> List[Tuple[Dict[str, str], Path]]:
+    """
+    Lists the Parquet files of a hive-partitioned dataset.
+
+    Returns:
+    --------
+    List[Tuple[Dict[str, str], Path]]
+        The partition keys parsed from the ``key=value`` directories of each
+        file and its path, ordered by partition (numeric values numerically).
+        Hidden files, such as partitions being written, are skipped.
+    """
+    partitions = []
+    for file_path in Path(dataset_dir).rglob("*.parquet"):
+        if file_path.name.startswith((".", "_")):
+            continue
+        parts = file_path.parent.relative_to(dataset_dir).parts
+        keys = dict(part.split("=", 1) for part in parts if "=" in part)
+        partitions.append((keys, file_path))
+    partitions.sort(
+        key=lambda item: [_partition_order(value) for value in item[0].values()]
+        + [(1, 0, item[1].name)]
+    )
+    return partitions
+
+
+def require_pyarrow(extension: str):
+    """Raises ImportError if pyarrow, needed for columnar tables, is missing."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            f"{extension} files require the 'pyarrow' package: pip install pyarrow"
+        )
+
+
+def open_compressed_writer(file_obj, compression: str = "none"):
+    """
+    Wraps a binary file object so that bytes written to it are compressed.
+
+    Parameters:
+    -----------
+    file_obj : file object
+        Binary file opened for writing.
+    compression : str
+        One of ``"none"``, ``"gzip"`` or ``"zstd"``.
+
+    Returns:
+    --------
+    file object
+        Writer to use in place of ``file_obj`` (``file_obj`` itself when
+        uncompressed). Closing a codec writer flushes it without closing
+        ``file_obj``.
+    """
+    if compression == "none":
+        return file_obj
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=file_obj, mode="wb", compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "zstd compression requires the 'zstandard' package: pip install zstandard"
+            )
+        return zstandard.ZstdCompressor().stream_writer(file_obj, closefd=False)
+    raise ValueError(
+        f"Unsupported compression: {compression}. "
+        f"Choose from {list(COMPRESSION_SUFFIXES)}."
+    )
+
+
+def _table_extension(file_path: str) -> str:
+    """Returns the format extension, looking through a compression suffix."""
+    suffixes = [s.lower() for s in Path(file_path).suffixes]
+    if len(suffixes) > 1 and suffixes[-1] in (".gz", ".zst"):
+        return suffixes[-2]
+    return Path(file_path).suffix.lower()
+
 
 def read_file(file_path: str, delimiter=None, **kwargs) -> pd.DataFrame:
     """
     Reads a file into a pandas DataFrame.
 
-    Supports: CSV, TSV, Excel, JSON, Pickle, SQLite, HDF5, TXT.
+    Supports: CSV, TSV, Excel, JSON, Pickle, SQLite, HDF5, TXT, Parquet,
+    Feather. CSV, TSV and TXT files may additionally be gzip (``.gz``) or
+    zstd (``.zst``) compressed. A directory is read as a hive-partitioned
+    Parquet dataset, whose partition keys become columns; pass ``columns``
+    and ``filters`` to read only some columns and partitions.
 
     Parameters:
     -----------
@@ -27,8 +224,11 @@ def read_file(file_path: str, delimiter=None, **kwargs) -> pd.DataFrame:
     """
     if not Path(file_path).exists():
         raise FileNotFoundError(f"File not found: {file_path}")
+    if Path(file_path).is_dir():
+        require_pyarrow(".parquet")
+        return pd.read_parquet(file_path, **kwargs)
 
-    extension = Path(file_path).suffix.lower()
+    extension = _table_extension(file_path)
 
     if extension == ".csv":
         return pd.read_csv(file_path, **kwargs)
@@ -38,6 +238,12 @@ def read_file(file_path: str, delimiter=None, **kwargs) -> pd.DataFrame:
         return pd.read_excel(file_path, **kwargs)
     elif extension == ".json":
         return pd.read_json(file_path, **kwargs)
+    elif extension == ".parquet":
+        require_pyarrow(extension)
+        return pd.read_parquet(file_path, **kwargs)
+    elif extension == ".feather":
+        require_pyarrow(extension)
+        return pd.read_feather(file_path, **kwargs)
     elif extension in [".pkl", ".pickle"]:
         with open(file_path, "rb") as f:
             return pickle.load(f)
@@ -69,7 +275,10 @@ def write_file(df: pd.DataFrame, file_path: str, **kwargs) -> bool:
     """
     Writes a pandas DataFrame to a file.
 
-    Supported Formats: CSV, TSV, Excel, JSON, Pickle, SQLite, HDF5, TXT.
+    Supported Formats: CSV, TSV, Excel, JSON, Pickle, SQLite, HDF5, TXT,
+    Parquet, Feather.
+    A trailing ``.gz`` or ``.zst`` on CSV, TSV and TXT paths compresses the
+    output with gzip or zstd.
 
     Parameters:
     -----------
@@ -88,7 +297,7 @@ def write_file(df: pd.DataFrame, file_path: str, **kwargs) -> bool:
     if not isinstance(df, pd.DataFrame):
         raise TypeError("Input must be a pandas DataFrame")
 
-    extension = Path(file_path).suffix.lower()
+    extension = _table_extension(file_path)
 
     if extension == ".csv":
         df.to_csv(file_path, index=False, **kwargs)
@@ -98,6 +307,12 @@ def write_file(df: pd.DataFrame, file_path: str, **kwargs) -> bool:
         df.to_excel(file_path, index=False, **kwargs)
     elif extension == ".json":
         df.to_json(file_path, orient="records", **kwargs)
+    elif extension == ".parquet":
+        require_pyarrow(extension)
+        df.to_parquet(file_path, index=False, **kwargs)
+    elif extension == ".feather":
+        require_pyarrow(extension)
+        df.reset_index(drop=True).to_feather(file_path, **kwargs)
     elif extension in [".pkl", ".pickle"]:
         with open(file_path, "wb") as f:
             pickle.dump(df, f)
@@ -125,6 +340,353 @@ def write_file(df: pd.DataFrame, file_path: str, **kwargs) -> bool:
     return True
 
 
+def _normalized_dtype(dtype) -> np.dtype:
+    # Strings of any flavour (object, "str", "string") are one type here
+    if pd.api.types.is_string_dtype(dtype) or dtype == object:
+        return np.dtype(object)
+    return dtype
+
+
+def common_dtype(first, second):
+    """
+    Returns the type of a column holding values of both dtypes: numbers
+    widen (``int64`` and ``float64`` give ``float64``), any other mixture
+    gives ``object`` (written as strings). None stands for no values.
+    """
+    if first is None or second is None:
+        return second if first is None else first
+    first, second = _normalized_dtype(first), _normalized_dtype(second)
+    if first == second:
+        return first
+    numeric = [
+        pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d)
+        for d in (first, second)
+    ]
+    if all(numeric):
+        return np.result_type(first, second)
+    return np.dtype(object)
+
+
+def _with_missing_values(dtype):
+    # The type a column takes once rows lacking it are filled with NaN
+    if dtype is None:
+        return None
+    if pd.api.types.is_bool_dtype(dtype):
+        return np.dtype(object)
+    if pd.api.types.is_integer_dtype(dtype):
+        return np.dtype("float64")
+    return dtype
+
+
+def table_dtypes(file_path: str, chunk_size: int = CHUNK_ROWS) -> Dict[str, object]:
+    """
+    Returns the pandas dtype of each column of a table, in column order.
+
+    Parquet and Feather dtypes come from the schema alone (None for columns
+    of nulls only); CSV, TSV and TXT tables are scanned chunk by chunk and
+    the chunks' dtypes combined with ``common_dtype``.
+    """
+    extension = _table_extension(file_path)
+    if extension in COLUMNAR_EXTENSIONS:
+        require_pyarrow(extension)
+        import pyarrow as pa
+
+        if extension == ".parquet":
+            import pyarrow.parquet as pq
+
+            schema = pq.read_schema(file_path)
+        else:
+            import pyarrow.ipc as ipc
+
+            with ipc.open_file(file_path) as reader:
+                schema = reader.schema
+        dtypes = schema.empty_table().to_pandas().dtypes
+        return {
+            name: None if pa.types.is_null(schema.field(name).type) else dtypes[name]
+            for name in schema.names
+        }
+    dtypes = {}
+    for chunk in iter_table_chunks(file_path, chunk_size):
+        for name, dtype in chunk.dtypes.items():
+            if chunk[name].isna().all():
+                dtype = None
+            dtypes[name] = common_dtype(dtypes.get(name), dtype)
+    return dtypes
+
+
+def iter_table_chunks(
+    file_path: str, chunk_size: int = CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads a table as consecutive DataFrames of at most ``chunk_size`` rows.
+
+    CSV, TSV and TXT tables (optionally compressed), Parquet and Feather are
+    streamed; other formats are read whole and yielded as one chunk.
+    """
+    extension = _table_extension(file_path)
+    if extension in (".csv", ".tsv", ".txt"):
+        sep = "," if extension == ".csv" else "\t"
+        with pd.read_csv(file_path, sep=sep, chunksize=chunk_size) as reader:
+            yield from reader
+    elif extension == ".parquet":
+        require_pyarrow(extension)
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(file_path) as parquet_file:
+            for batch in parquet_file.iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+    elif extension == ".feather":
+        require_pyarrow(extension)
+        import pyarrow.ipc as ipc
+
+        with ipc.open_file(file_path) as reader:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for offset in range(0, batch.num_rows, chunk_size):
+                    yield batch.slice(offset, chunk_size).to_pandas()
+    else:
+        yield read_file(file_path)
+
+
+def stream_tables(
+    file_paths: Sequence[str], chunk_size: int = CHUNK_ROWS, read_workers: int = 1
+) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Yields ``(file_path, chunk)`` for every chunk of several tables, in order.
+
+    With ``read_workers > 1`` a thread pool reads ahead while the caller
+    processes the current chunk: the next chunk of the current table and the
+    first chunks of the following ``read_workers - 1`` tables are fetched
+    concurrently, so at most ``read_workers + 1`` chunks are held at once.
+    """
+    if read_workers <= 1:
+        for file_path in file_paths:
+            for chunk in iter_table_chunks(file_path, chunk_size):
+                yield file_path, chunk
+        return
+
+    readers = [iter_table_chunks(file_path, chunk_size) for file_path in file_paths]
+    pending = {}
+    with ThreadPoolExecutor(max_workers=read_workers) as executor:
+
+        def prefetch(i: int):
+            # One outstanding read per table: a generator is not re-entrant
+            if i < len(readers) and i not in pending:
+                pending[i] = executor.submit(next, readers[i], None)
+
+        try:
+            for i in range(read_workers):
+                prefetch(i)
+            for i, file_path in enumerate(file_paths):
+                while True:
+                    prefetch(i)
+                    chunk = pending.pop(i).result()
+                    if chunk is None:
+                        break
+                    prefetch(i)
+                    yield file_path, chunk
+                prefetch(i + read_workers)
+        finally:
+            for future in pending.values():
+                future.cancel()
+
+
+def _cast_column(series: pd.Series, dtype) -> pd.Series:
+    if dtype != object:
+        return series.astype(dtype)
+    # Strings, keeping missing values missing
+    return series.astype(object).where(series.isna(), series.astype(str))
+
+
+class TableWriter:
+    """
+    Appends DataFrame chunks to one CSV/TSV (optionally ``.gz``/``.zst``
+    compressed), Parquet or Feather table.
+
+    Every chunk is aligned to ``columns`` (missing columns are left empty,
+    unknown ones dropped); without ``columns`` the first chunk's are used.
+    With ``dtypes`` every chunk is cast to them (``object`` columns to
+    strings) and a Parquet or Feather schema follows them, so chunks that
+    lack a column or infer another type still fit; otherwise the first
+    chunk fixes the types.
+    Rows are written to a temporary file next to ``file_path`` that replaces
+    it on ``close``, so readers never see a partial table; leaving a ``with``
+    block on an exception discards it.
+
+    Parameters:
+    -----------
+    file_path : str or Path
+        Output table; the format and text codec follow its suffixes.
+    columns : Sequence[str], optional
+        Output columns, in order.
+    compression : str, optional
+        Internal codec of a Parquet or Feather table (pyarrow codec name).
+    dtypes : Mapping[str, dtype], optional
+        Output type of each column, e.g. from ``table_dtypes``; None (or a
+        missing column) leaves the chunk's type.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        columns: Optional[Sequence[str]] = None,
+        compression: Optional[str] = None,
+        dtypes: Optional[Mapping[str, object]] = None,
+    ):
+        self.file_path = Path(file_path)
+        self.columns = list(columns) if columns is not None else None
+        self.dtypes = {
+            name: dtype for name, dtype in (dtypes or {}).items() if dtype is not None
+        }
+        self.compression = compression
+        self.rows = 0
+        self._extension = _table_extension(self.file_path)
+        if self._extension not in (".csv", ".tsv", *COLUMNAR_EXTENSIONS):
+            raise ValueError(f"Unsupported streaming format: {self._extension}")
+        if self._extension in COLUMNAR_EXTENSIONS:
+            require_pyarrow(self._extension)
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=self.file_path.parent, prefix=f".{self.file_path.name}.", suffix=".tmp"
+        )
+        self._file = os.fdopen(fd, "wb")
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def _open(self, df: pd.DataFrame):
+        if self._extension in COLUMNAR_EXTENSIONS:
+            import pyarrow as pa
+
+            schema = pa.Schema.from_pandas(df, preserve_index=False)
+            # Columns that are empty (or strings) in the first chunk
+            for name, dtype in self.dtypes.items():
+                if dtype == object and name in schema.names:
+                    index = schema.get_field_index(name)
+                    schema = schema.set(index, pa.field(name, pa.string()))
+            self._schema = schema
+            if self._extension == ".parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(
+                    self._file, self._schema, compression=self.compression or "snappy"
+                )
+            else:
+                import pyarrow.ipc as ipc
+
+                codec = self.compression
+                options = ipc.IpcWriteOptions(
+                    compression=None if codec in (None, "uncompressed") else codec
+                )
+                self._writer = ipc.new_file(self._file, self._schema, options=options)
+        else:
+            codec = {".gz": "gzip", ".zst": "zstd"}.get(self.file_path.suffix, "none")
+            self._writer = open_compressed_writer(self._file, codec)
+
+    def write(self, df: pd.DataFrame):
+        """Appends the rows of ``df``."""
+        if self.columns is None:
+            self.columns = list(df.columns)
+        elif list(df.columns) != self.columns:
+            df = df.reindex(columns=self.columns)
+        if self.dtypes:
+            df = df.assign(
+                **{
+                    name: _cast_column(df[name], dtype)
+                    for name, dtype in self.dtypes.items()
+                    if name in df.columns
+                }
+            )
+        first = self._writer is None
+        if first:
+            self._open(df)
+        if self._extension in COLUMNAR_EXTENSIONS:
+            import pyarrow as pa
+
+            self._writer.write(
+                pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            )
+        else:
+            sep = "," if self._extension == ".csv" else "\t"
+            text = df.to_csv(sep=sep, index=False, header=first)
+            self._writer.write(text.encode("utf-8"))
+        self.rows += len(df)
+
+    def close(self) -> Path:
+        """Finishes the table and moves it into place."""
+        if self._writer is None:
+            self.write(pd.DataFrame(columns=self.columns or []))
+        if self._writer is not self._file:
+            self._writer.close()
+        self._file.close()
+        os.replace(self._tmp_path, self.file_path)
+        return self.file_path
+
+    def discard(self):
+        """Drops the partially written table."""
+        self._file.close()
+        Path(self._tmp_path).unlink(missing_ok=True)
+
+
+def merge_tables(
+    file_paths: Sequence[str],
+    output_path: str,
+    chunk_size: int = CHUNK_ROWS,
+    read_workers: int = 1,
+    compression: Optional[str] = None,
+) -> int:
+    """
+    Concatenates tables into one by streaming them chunk by chunk.
+
+    The output columns are the union of the inputs' columns in order of
+    first appearance, and their types are reconciled across all inputs
+    before any row is written (as ``pd.concat`` would: integers and floats
+    widen to floats, other mixtures become strings); rows of a table
+    lacking a column leave it empty. Parquet and Feather inputs only need
+    their schema for this, CSV inputs are read once more. Memory is bounded
+    by a few chunks whatever the size of the inputs.
+
+    Parameters:
+    -----------
+    file_paths : Sequence[str]
+        Tables to concatenate, in output order.
+    output_path : str
+        Merged table (see ``TableWriter`` for formats).
+    chunk_size : int, optional
+        Rows read at a time (default: ``CHUNK_ROWS``).
+    read_workers : int, optional
+        Threads reading ahead of the writer (default: 1, no read-ahead).
+    compression : str, optional
+        Internal codec of a Parquet or Feather output.
+
+    Returns:
+    --------
+    int
+        Number of rows written.
+    """
+    inputs = [table_dtypes(file_path, chunk_size) for file_path in file_paths]
+    columns = {}
+    for dtypes in inputs:
+        for name, dtype in dtypes.items():
+            columns[name] = common_dtype(columns.get(name), dtype)
+    for name, dtype in columns.items():
+        if any(name not in dtypes for dtypes in inputs):
+            columns[name] = _with_missing_values(dtype)
+    with TableWriter(
+        output_path, list(columns), compression=compression, dtypes=columns
+    ) as writer:
+        for _, chunk in stream_tables(file_paths, chunk_size, read_workers):
+            writer.write(chunk)
+    return writer.rows
+
+
 def convert_file(source_path: str, target_path: str, **kwargs) -> bool:
     """
     Converts a file from one format to another.
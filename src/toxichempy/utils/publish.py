@@ -0,0 +1,270 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+# How published files are materialized: a physical copy, a copy-on-write
+# clone, a hard link, a symbolic link, or the cheapest of reflink/hardlink
+# with a copy as the last resort
+PUBLISH_MODES = ("copy", "reflink", "hardlink", "symlink", "auto")
+# Bytes per copy task and threads copying one file in parallel
+COPY_CHUNK = 64 << 20
+COPY_WORKERS = 4
+# Manifest of what was published, kept in the publish directory
+MANIFEST_NAME = ".publish_manifest.json"
+# ioctl request cloning a whole file on Linux copy-on-write file systems
+FICLONE = 0x40049409
+
+
+def file_checksum(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink_file(source: str, dest: str):
+    """
+    Clones ``source`` to a new file ``dest`` sharing its blocks (btrfs, XFS,
+    ...); raises OSError where the file system or platform cannot.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(dest)
+            raise
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, length: int):
+    end = offset + length
+    in_kernel = hasattr(os, "copy_file_range")
+    while offset < end:
+        if in_kernel:
+            try:
+                copied = os.copy_file_range(
+                    src_fd, dst_fd, end - offset, offset, offset
+                )
+            except OSError:
+                # e.g. across file systems on older kernels
+                in_kernel = False
+        if not in_kernel:
+            data = os.pread(src_fd, min(end - offset, 1 << 20), offset)
+            copied = os.pwrite(dst_fd, data, offset)
+        if not copied:
+            raise OSError(f"Unexpected end of file at byte {offset}")
+        offset += copied
+
+
+def parallel_copy(
+    source: str,
+    dest: str,
+    workers: int = COPY_WORKERS,
+    chunk_size: int = COPY_CHUNK,
+):
+    """
+    Copies ``source`` to ``dest`` in ``chunk_size`` ranges written by
+    ``workers`` threads at their offsets (in-kernel ``copy_file_range``
+    where available), keeping the permission bits. Falls back to
+    ``shutil.copyfile`` on platforms without positional I/O.
+    """
+    if not hasattr(os, "pwrite"):
+        shutil.copyfile(source, dest)
+        shutil.copymode(source, dest)
+        return
+    size = os.path.getsize(source)
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(dst_fd, size)
+            offsets = range(0, size, chunk_size)
+            if workers <= 1 or len(offsets) <= 1:
+                for offset in offsets:
+                    _copy_range(src_fd, dst_fd, offset, min(chunk_size, size - offset))
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(
+                            _copy_range,
+                            src_fd,
+                            dst_fd,
+                            offset,
+                            min(chunk_size, size - offset),
+                        )
+                        for offset in offsets
+                    ]
+                    for future in futures:
+                        future.result()
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copymode(source, dest)
+
+
+class Publisher:
+    """
+    Publishes files into a directory without copying when it can, and not
+    at all when they have not changed.
+
+    Each file is materialized under a temporary name and moved over its
+    destination, so readers of the publish directory see either the old or
+    the new file. Reflinks and hard links are only tried when source and
+    destination share a file system, and fall back to ``parallel_copy``.
+    Hard links and symlinks share the source's contents: the pipeline
+    replaces its tables rather than rewriting them in place, so a published
+    link keeps the old contents until it is republished.
+
+    A manifest in the publish directory records the size and modification
+    time of each published source. A source whose size and modification
+    time are unchanged is skipped without reading it. When they changed, a
+    physical copy is only rewritten if the source's checksum differs from
+    that of the published copy; links are cheaper to recreate than to hash.
+    Either way the destination must still be the file that was published.
+
+    Parameters:
+    -----------
+    publish_dir : str or Path
+        Directory files are published into (created if missing).
+    mode : str, optional
+        One of ``PUBLISH_MODES`` (default: ``"copy"``).
+    workers : int, optional
+        Threads of a parallel copy (default: 4).
+    chunk_size : int, optional
+        Bytes per parallel copy task (default: 64 MiB).
+    """
+
+    def __init__(
+        self,
+        publish_dir,
+        mode: str = "copy",
+        workers: int = COPY_WORKERS,
+        chunk_size: int = COPY_CHUNK,
+    ):
+        if mode not in PUBLISH_MODES:
+            raise ValueError(
+                f"Unsupported publish mode: {mode}. Choose from {list(PUBLISH_MODES)}."
+            )
+        self.publish_dir = Path(publish_dir)
+        self.publish_dir.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.counts = Counter()
+        self._manifest_path = self.publish_dir / MANIFEST_NAME
+        try:
+            self.manifest = json.loads(self._manifest_path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.manifest = {}
+
+    def _key(self, dest: Path) -> str:
+        # Not resolve(): a published symlink points outside the directory
+        return (
+            Path(os.path.abspath(dest))
+            .relative_to(os.path.abspath(self.publish_dir))
+            .as_posix()
+        )
+
+    def _unchanged(self, entry: Optional[dict], source: Path, dest: Path) -> bool:
+        if entry is None or entry["source"] != str(source) or not dest.exists():
+            return False
+        dest_stat = dest.stat()
+        if [dest_stat.st_size, dest_stat.st_mtime_ns] != entry["dest"]:
+            return False
+        source_stat = source.stat()
+        if [source_stat.st_size, source_stat.st_mtime_ns] == entry["stat"]:
+            return True
+        if entry["method"] != "copy" or source_stat.st_size != dest_stat.st_size:
+            return False
+        # The copy still holds the last published contents, so its checksum
+        # (cached once taken) is the checksum of the last published source
+        published = entry.get("checksum") or file_checksum(dest)
+        entry["checksum"] = published
+        if file_checksum(source) != published:
+            return False
+        entry["stat"] = [source_stat.st_size, source_stat.st_mtime_ns]
+        return True
+
+    def _materialize(self, source: Path, tmp: str, same_device: bool) -> str:
+        if self.mode == "symlink":
+            os.symlink(source, tmp)
+            return "symlink"
+        if same_device and self.mode in ("reflink", "auto"):
+            try:
+                reflink_file(source, tmp)
+                return "reflink"
+            except OSError:
+                pass
+        if same_device and self.mode in ("hardlink", "auto"):
+            try:
+                os.link(source, tmp)
+                return "hardlink"
+            except OSError:
+                pass
+        parallel_copy(source, tmp, workers=self.workers, chunk_size=self.chunk_size)
+        return "copy"
+
+    def publish(self, source, dest) -> str:
+        """
+        Publishes ``source`` as ``dest`` (inside the publish directory).
+
+        Returns:
+        --------
+        str
+            ``"unchanged"`` if it was skipped, otherwise how it was
+            materialized: ``"reflink"``, ``"hardlink"``, ``"symlink"`` or
+            ``"copy"``.
+        """
+        source = Path(source).resolve()
+        dest = Path(dest)
+        key = self._key(dest)
+        if self._unchanged(self.manifest.get(key), source, dest):
+            self.counts["unchanged"] += 1
+            return "unchanged"
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        same_device = source.stat().st_dev == dest.parent.stat().st_dev
+        # Links need a name that does not exist yet, hence a private directory
+        tmp_dir = tempfile.mkdtemp(dir=dest.parent, prefix=f".{dest.name}.")
+        tmp = os.path.join(tmp_dir, dest.name)
+        try:
+            method = self._materialize(source, tmp, same_device)
+            os.replace(tmp, dest)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        source_stat = source.stat()
+        dest_stat = dest.stat()
+        self.manifest[key] = {
+            "source": str(source),
+            "stat": [source_stat.st_size, source_stat.st_mtime_ns],
+            "method": method,
+            "dest": [dest_stat.st_size, dest_stat.st_mtime_ns],
+        }
+        self.counts[method] += 1
+        return method
+
+    def save(self):
+        """Writes the manifest atomically."""
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.publish_dir, prefix=f"{MANIFEST_NAME}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_name, self._manifest_path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
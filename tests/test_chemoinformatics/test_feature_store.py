@@ -0,0 +1,55 @@
+import pytest
+from rdkit import Chem
+
+from toxichempy.chemoinformatics.feature_store import (
+    FeatureStore,
+    compound_keys,
+    feature_config_hash,
+)
+
+
+def test_feature_store_round_trip_and_hit_rate(tmp_path):
+    """Test bulk lookups, stored failures and hit counting across instances."""
+    store = FeatureStore(tmp_path / "store.sqlite")
+    config = feature_config_hash("descriptors", names=["MolWt", "TPSA"])
+    store.put_many(
+        "descriptors",
+        config,
+        {"CCO": ([46.07, 20.23], None), "bad": (None, "invalid SMILES")},
+    )
+    store.close()
+
+    store = FeatureStore(tmp_path / "store.sqlite")
+    found = store.get_many("descriptors", config, ["CCO", "bad", "CCN", None])
+    assert found == {"CCO": ([46.07, 20.23], None), "bad": (None, "invalid SMILES")}
+    assert (store.hits, store.misses) == (2, 1)
+    other = feature_config_hash("descriptors", names=["MolWt"])
+    assert other != config
+    assert store.get_many("descriptors", other, ["CCO"]) == {}
+    assert store.get_many("morgan", config, ["CCO"]) == {}
+
+
+def test_feature_store_evicts_to_size_cap_and_compacts(tmp_path):
+    """Test that least recently used entries go first and compaction drops stale configs."""
+    store = FeatureStore(tmp_path / "store.sqlite", max_bytes=2500)
+    store.put_many("fp", "a", {"A": b"x" * 1000})
+    store.put_many("fp", "a", {"B": b"x" * 1000})
+    store.get_many("fp", "a", ["A"])
+    store.put_many("fp", "b", {"C": b"x" * 1000})
+    assert len(store) == 2 and store.size() <= 2500
+    assert set(store.get_many("fp", "a", ["A", "B"])) == {"A"}
+    assert store.compact(keep_configs=[]) == 0
+    assert store.compact(keep_configs=["b"]) == 1
+    assert len(store) == 1
+
+
+def test_compound_keys_by_inchikey():
+    """Test that InChIKeys merge equivalent SMILES and skip invalid ones."""
+    keys = compound_keys(["OCC", "CCO", "not_a_smiles"], key="inchikey")
+    assert keys[0] == keys[1] == "LFQSCWFLJHTTHZ-UHFFFAOYSA-N"
+    assert keys[2] is None
+    mols = [Chem.MolFromSmiles("OCC"), None]
+    assert compound_keys(["", ""], key="inchikey", mols=mols) == [keys[0], None]
+    assert compound_keys(["OCC"]) == ["OCC"]
+    with pytest.raises(ValueError):
+        compound_keys(["CCO"], key="cas")
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+from rdkit import Chem
+from rdkit.Chem import AllChem, MACCSkeys, rdFingerprintGenerator
+
+from toxichempy.chemoinformatics.fingerprints import (
+    FingerprintSet,
+    environment_frequencies,
+    load_fingerprint_bundle,
+    load_packed_fingerprints,
+    load_sparse_fingerprints,
+    packbits_fingerprints,
+    packed_sidecar_path,
+    remap_sparse_columns,
+    save_fingerprint_bundle,
+    save_packed_fingerprints,
+    save_sparse_fingerprints,
+    sparse_morgan_counts,
+    take_sparse_rows,
+)
+
+SMILES = ["CCO", "c1ccccc1", "CC(=O)Oc1ccccc1C(=O)O", "C"]
+
+
+def _morgan(smiles):
+    return AllChem.GetMorganFingerprintAsBitVect(Chem.MolFromSmiles(smiles), 2, 2048)
+
+
+def test_packbits_fingerprints_unpack_to_bitstrings():
+    """Test that unpacking a packed row gives the fingerprint's bitstring."""
+    fps = [_morgan(smiles) for smiles in SMILES]
+    packed = packbits_fingerprints(fps)
+    assert packed.shape == (4, 256) and packed.dtype == np.uint8
+    for row, fp in zip(np.unpackbits(packed, axis=1), fps):
+        assert "".join(map(str, row)) == fp.ToBitString()
+
+
+def test_packbits_fingerprints_in_chunks_with_padding():
+    """Test that chunked packing and zero-padded rows keep the same bits."""
+    fps = [_morgan(smiles) for smiles in SMILES]
+    packed = packbits_fingerprints(fps, row_bytes=260, chunk_size=3)
+    assert packed.shape == (4, 260)
+    assert np.array_equal(packed[:, :256], packbits_fingerprints(fps))
+    assert not packed[:, 256:].any()
+    with pytest.raises(ValueError):
+        packbits_fingerprints(fps, row_bytes=255)
+
+
+def test_packed_fingerprints_round_trip(tmp_path):
+    """Test saving, memory-mapped loading and conversion back to bit vectors."""
+    fps = [_morgan(smiles) for smiles in SMILES]
+    file_path, sidecar = save_packed_fingerprints(
+        tmp_path / "fps.npy", packbits_fingerprints(fps), [10, 20, 30, 40]
+    )
+    assert sidecar == packed_sidecar_path(file_path) == tmp_path / "fps_cids.npy"
+    cids, packed = load_packed_fingerprints(file_path)
+    assert isinstance(packed, np.memmap)
+    assert list(cids) == [10, 20, 30, 40]
+    cids, bitvects = load_packed_fingerprints(file_path, as_bitvects=True)
+    assert [bv.ToBitString() for bv in bitvects] == [fp.ToBitString() for fp in fps]
+
+
+def test_save_packed_fingerprints_rejects_mismatched_index(tmp_path):
+    """Test that a CID index of the wrong length is refused."""
+    packed = packbits_fingerprints([_morgan("CCO")])
+    with pytest.raises(ValueError):
+        save_packed_fingerprints(tmp_path / "fps.npy", packed, [1, 2])
+
+
+class _CountingList(list):
+    """List counting the chunks sliced out of it."""
+
+    slices = 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self.slices += 1
+        return super().__getitem__(index)
+
+
+def test_fingerprint_set_computes_every_type_in_one_pass(tmp_path):
+    """Test each type against RDKit's own functions and the per-type timings."""
+    mols = [Chem.MolFromSmiles(smiles) for smiles in SMILES] + [None]
+    fingerprint_set = FingerprintSet(["morgan2", "morgan2_count", "maccs", "morgan2"])
+    matrices = fingerprint_set.compute(mols)
+    assert fingerprint_set.types == ("morgan2", "morgan2_count", "maccs")
+    assert set(fingerprint_set.seconds) == set(fingerprint_set.types)
+
+    expected = packbits_fingerprints([_morgan(smiles) for smiles in SMILES])
+    assert (matrices["morgan2"][:4] == expected).all()
+    assert not matrices["morgan2"][4].any()
+    counts = matrices["morgan2_count"]
+    assert counts.dtype == np.uint16
+    assert ((counts[:4] > 0) == np.unpackbits(expected, axis=1).astype(bool)).all()
+    maccs = np.unpackbits(matrices["maccs"], axis=1)[:, :167]
+    assert "".join(map(str, maccs[2])) == MACCSkeys.GenMACCSKeys(mols[2]).ToBitString()
+    chunked_mols = _CountingList(mols)
+    chunked = fingerprint_set.compute(chunked_mols, chunk_size=2)
+    assert all((chunked[name] == matrices[name]).all() for name in matrices)
+    # Every type of a chunk is computed from one walk over its molecules
+    assert chunked_mols.slices == 3
+
+    file_path = save_fingerprint_bundle(tmp_path / "fps.npz", matrices, range(5))
+    cids, loaded = load_fingerprint_bundle(file_path)
+    assert list(cids) == list(range(5))
+    assert all((loaded[name] == matrices[name]).all() for name in matrices)
+    with pytest.raises(ValueError):
+        FingerprintSet(["ecfp"])
+
+
+def test_sparse_morgan_counts_round_trip(tmp_path):
+    """Test chunked sparse counts, row selection, pruning and loading with SciPy."""
+    pytest.importorskip("scipy")
+    mols = [Chem.MolFromSmiles(smiles) for smiles in SMILES]
+    indptr, env_ids, counts, valid = sparse_morgan_counts(
+        SMILES + ["C1CC1("], chunk_size=2
+    )
+    assert valid.tolist() == [True, True, True, True, False]
+    generator = rdFingerprintGenerator.GetMorganGenerator(radius=2)
+    for i, mol in enumerate(mols):
+        row = slice(indptr[i], indptr[i + 1])
+        expected = generator.GetSparseCountFingerprint(mol).GetNonzeroElements()
+        assert dict(zip(env_ids[row].tolist(), counts[row].tolist())) == expected
+    assert indptr[5] == indptr[4]
+
+    indptr, env_ids, counts = take_sparse_rows(
+        indptr, env_ids, counts, np.array([2, 0, 2])
+    )
+    vocabulary, frequencies = environment_frequencies(env_ids)
+    assert frequencies.max() == 3
+    kept = vocabulary[frequencies >= 2]
+    indptr, columns, counts = remap_sparse_columns(indptr, env_ids, counts, kept)
+    file_path = save_sparse_fingerprints(
+        tmp_path / "counts.npz", indptr, columns, counts, kept, [3, 1, 3]
+    )
+    cids, matrix, loaded_vocabulary = load_sparse_fingerprints(file_path)
+    assert list(cids) == [3, 1, 3]
+    assert matrix.shape == (3, len(kept))
+    assert (loaded_vocabulary == kept).all()
+    dense = matrix.toarray()
+    assert (dense[0] == dense[2]).all() and dense[0].all()
+    aspirin = generator.GetSparseCountFingerprint(mols[2]).GetNonzeroElements()
+    assert dense[0].tolist() == [aspirin[env_id] for env_id in kept]
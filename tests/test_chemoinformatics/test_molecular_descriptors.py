@@ -1,8 +1,22 @@
 # tests/test_sum_module.py
 
+import multiprocessing
+import os
+import time
+
+import numpy as np
 import pytest
+from rdkit.Chem import Descriptors
 
-from toxichempy.chemoinformatics import add_numbers
+from toxichempy.chemoinformatics import add_numbers, molecular_descriptors
+from toxichempy.chemoinformatics.molecular_descriptors import (
+    COST_TIER_LIMITS,
+    calculate_descriptors,
+    descriptor_block,
+    descriptor_costs,
+    descriptor_names,
+    select_descriptors,
+)
 
 
 def test_add_numbers():
@@ -16,5 +30,128 @@ def test_add_numbers():
     assert add_numbers(-10, -20) == -30
 
 
+def _atoms_hanging_on_propane(mol):
+    if mol.GetNumAtoms() == 3:
+        time.sleep(60)
+    if mol.GetNumAtoms() == 5:
+        os._exit(3)
+    return mol.GetNumAtoms()
+
+
+fork_only = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="patched descriptors reach workers only through fork",
+)
+
+
+def test_parallel_descriptors_equal_serial():
+    """Test that worker processes return the in-process descriptor values."""
+    smiles = ["CCO", "c1ccccc1", "CC(=O)Oc1ccccc1C(=O)O", "not_a_smiles", "C"]
+    serial, serial_reasons = calculate_descriptors(smiles)
+    parallel, parallel_reasons = calculate_descriptors(smiles, workers=2, chunk_size=2)
+    assert (
+        parallel_reasons == serial_reasons == [None, None, None, "invalid SMILES", None]
+    )
+    assert parallel[3] is None
+    for a, b in zip(serial[:3] + serial[4:], parallel[:3] + parallel[4:]):
+        assert len(a) == len(descriptor_names())
+        np.testing.assert_array_equal(np.array(a, float), np.array(b, float))
+
+
+@fork_only
+def test_watchdog_recycles_hung_and_crashed_workers(monkeypatch):
+    """Test that hung and crashing molecules fail alone while the rest complete."""
+    monkeypatch.setattr(
+        Descriptors, "_descList", [("Atoms", _atoms_hanging_on_propane)]
+    )
+    smiles = ["CC", "CCC", "CCCC", "bad(", "CCCCC", "CO", "C"]
+    stats = {}
+    values, reasons = calculate_descriptors(
+        smiles, workers=2, timeout=0.5, chunk_size=3, stats=stats
+    )
+    assert values == [[2], None, [4], None, None, [2], [1]]
+    assert reasons[1] == "timed out after 0.5s"
+    assert reasons[3] == "invalid SMILES"
+    assert reasons[4] == "worker exited with code 3"
+    assert stats["timeouts"] == 1 and stats["restarts"] == 2
+    assert stats["molecules"] == 7
+
+
+def test_dead_idle_worker_is_replaced(monkeypatch):
+    """Test that a worker dying before it gets a chunk is restarted, not fatal."""
+    spawned = []
+
+    class _DyingWorker(molecular_descriptors._DescriptorWorker):
+        def __init__(self, *args):
+            super().__init__(*args)
+            spawned.append(self)
+            if len(spawned) == 1:
+                self.process.kill()
+                self.process.join()
+
+    monkeypatch.setattr(molecular_descriptors, "_DescriptorWorker", _DyingWorker)
+    stats = {}
+    values, reasons = calculate_descriptors(
+        ["CCO", "C", "CC"], names=["MolWt"], workers=2, chunk_size=1, stats=stats
+    )
+    assert reasons == [None, None, None] and all(values)
+    assert stats["restarts"] == 1 and len(spawned) == 3
+
+
+def test_registry_profiles_every_descriptor():
+    """Test that the shipped cost profile covers the registry in column order."""
+    registry = descriptor_costs()
+    assert list(registry["name"]) == descriptor_names()
+    assert registry["microseconds"].notna().mean() > 0.9
+    assert set(registry["tier"]) <= set(COST_TIER_LIMITS)
+    assert (
+        registry.loc[registry["name"].str.startswith("fr_"), "group"] == "fragments"
+    ).all()
+
+
+def test_select_descriptors_keeps_registry_order():
+    """Test selection by name, group and tier in stable column order."""
+    names = descriptor_names()
+    selected = select_descriptors(names=["TPSA", "MolWt"], groups=["bcut"])
+    assert selected == [
+        n for n in names if n in ("TPSA", "MolWt") or n.startswith("BCUT2D_")
+    ]
+    assert select_descriptors() == names
+    registry = descriptor_costs().set_index("name")
+    cheap = select_descriptors(groups=["surface", "physchem"], max_tier="cheap")
+    assert cheap and (registry.loc[cheap, "tier"] == "cheap").all()
+    assert "qed" not in select_descriptors(max_tier="moderate")
+    for bad in [{"names": ["Nope"]}, {"groups": ["nope"]}, {"max_tier": "free"}]:
+        with pytest.raises(ValueError):
+            select_descriptors(**bad)
+
+
+def test_calculate_descriptors_evaluates_only_selected(monkeypatch):
+    """Test that unselected descriptors are never called."""
+
+    def fail(mol):
+        raise AssertionError("unselected descriptor evaluated")
+
+    monkeypatch.setattr(
+        Descriptors,
+        "_descList",
+        [
+            (name, fail if name != "MolWt" else function)
+            for name, function in Descriptors._descList
+        ],
+    )
+    values, reasons = calculate_descriptors(["CCO"], names=["MolWt"])
+    assert reasons == [None] and values[0] == [pytest.approx(46.069)]
+
+
+def test_descriptor_block_is_float32_with_nan_for_failures():
+    """Test that failed molecules become NaN rows and overflow becomes inf."""
+    block = descriptor_block([[1, 2.5], None, [1e300, None]], 2)
+    assert block.dtype == np.float32 and block.shape == (3, 2)
+    np.testing.assert_array_equal(
+        block, np.array([[1, 2.5], [np.nan, np.nan], [np.inf, np.nan]], np.float32)
+    )
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,243 @@
+import random
+
+import numpy as np
+import pytest
+from rdkit import DataStructs
+
+from toxichempy.chemoinformatics.similarity import (
+    MinHashLSHIndex,
+    bulk_tanimoto,
+    lsh_parameters,
+    match_nearest,
+    pack_fingerprints,
+    popcounts,
+    top_k_neighbours,
+)
+
+
+def _random_fps(n, n_bits=100, density=0.1, seed=0):
+    rng = random.Random(seed)
+    fps = []
+    for _ in range(n):
+        fp = DataStructs.ExplicitBitVect(n_bits)
+        for bit in range(n_bits):
+            if rng.random() < density:
+                fp.SetBit(bit)
+        fps.append(fp)
+    return fps
+
+
+def _reference_match(query_fps, target_fps):
+    used = set()
+    matches, similarities = [], []
+    for query in query_fps:
+        sims = {
+            i: DataStructs.TanimotoSimilarity(query, target)
+            for i, target in enumerate(target_fps)
+            if i not in used
+        }
+        best = max(sims, key=lambda i: (sims[i], -i)) if sims else None
+        if best is not None and sims[best] > 0:
+            used.add(best)
+            matches.append(best)
+            similarities.append(sims[best])
+        else:
+            matches.append(-1)
+            similarities.append(None)
+    return matches, similarities
+
+
+def test_bulk_tanimoto_matches_rdkit():
+    """Test that packed similarities equal RDKit's, including empty fingerprints."""
+    fps = _random_fps(20) + [DataStructs.ExplicitBitVect(100)] * 2
+    packed = pack_fingerprints(fps)
+    counts = popcounts(packed)
+    assert list(counts) == [fp.GetNumOnBits() for fp in fps]
+    sims = bulk_tanimoto(packed, counts, packed, counts)
+    for i, a in enumerate(fps):
+        assert list(sims[i]) == DataStructs.BulkTanimotoSimilarity(a, fps)
+
+
+@pytest.mark.parametrize(
+    "search,block_elements",
+    [("exhaustive", 1), ("exhaustive", 7), ("exhaustive", 1 << 20), ("pruned", 1)],
+)
+@pytest.mark.parametrize("n_queries,n_targets", [(15, 40), (40, 15)])
+def test_match_nearest_equals_greedy_reference(
+    search, block_elements, n_queries, n_targets
+):
+    """Test greedy pairing, tie-breaking and target exhaustion against a naive loop."""
+    query_fps = _random_fps(n_queries, density=0.05, seed=1)
+    target_fps = _random_fps(n_targets, density=0.05, seed=2)
+    target_fps += target_fps[:5]
+    matches, similarities = match_nearest(
+        query_fps, target_fps, block_elements=block_elements, search=search
+    )
+    expected_matches, expected_similarities = _reference_match(query_fps, target_fps)
+    assert list(matches) == expected_matches
+    assert similarities == expected_similarities
+
+
+def test_match_nearest_handles_empty_inputs():
+    """Test that empty query or target lists leave every query unmatched."""
+    matches, similarities = match_nearest(_random_fps(3), [])
+    assert list(matches) == [-1, -1, -1]
+    assert similarities == [None, None, None]
+    matches, similarities = match_nearest([], _random_fps(3))
+    assert len(matches) == 0 and similarities == []
+
+
+def test_match_nearest_prunes_buckets_and_stops_on_identical_fingerprints():
+    """Test that popcount bounds skip candidates without changing the pairs."""
+    target_fps = _random_fps(200, n_bits=256, density=0.2, seed=3)
+    query_fps = target_fps[:10] + _random_fps(10, n_bits=256, density=0.2, seed=4)
+    pruned_stats, full_stats = {}, {}
+    pruned = match_nearest(query_fps, target_fps, search="pruned", stats=pruned_stats)
+    full = match_nearest(query_fps, target_fps, search="exhaustive", stats=full_stats)
+    assert list(pruned[0]) == list(full[0])
+    assert pruned[1] == full[1]
+    assert list(pruned[0][:10]) == list(range(10))
+    assert pruned_stats["candidates"] == full_stats["compared"] == 20 * 200
+    assert pruned_stats["compared"] < full_stats["compared"]
+
+
+def test_lsh_parameters_meet_recall_target():
+    """Test that the chosen banding reaches the recall target at the threshold."""
+    for recall in (0.5, 0.9, 0.99):
+        bands, rows = lsh_parameters(64, recall, 0.5)
+        assert bands * rows <= 64
+        assert 1 - (1 - 0.5**rows) ** bands >= recall
+    assert lsh_parameters(64, 0.9, 0.5)[1] > lsh_parameters(64, 0.99, 0.5)[1]
+
+
+def test_minhash_lsh_index_finds_identical_fingerprints():
+    """Test that a fingerprint is always among the candidates of its own copy."""
+    fps = _random_fps(300, n_bits=256, density=0.1, seed=5)
+    packed = pack_fingerprints(fps)
+    index = MinHashLSHIndex(packed, 256)
+    keys = index.band_keys(packed)
+    for i in range(len(fps)):
+        assert i in index.candidates(keys[i])
+    assert len(index.candidates(keys[0])) < len(fps)
+
+
+def test_match_nearest_lsh_verifies_shortlists_exactly():
+    """Test that LSH pairs carry exact similarities and every query is paired."""
+    target_fps = _random_fps(200, n_bits=256, density=0.1, seed=6)
+    query_fps = target_fps[:20] + _random_fps(10, n_bits=256, density=0.1, seed=7)
+    stats = {}
+    matches, similarities = match_nearest(
+        query_fps, target_fps, search="lsh", stats=stats
+    )
+    assert list(matches[:20]) == list(range(20))
+    for query, match, similarity in zip(query_fps, matches, similarities):
+        assert match >= 0
+        assert similarity == DataStructs.TanimotoSimilarity(query, target_fps[match])
+    assert len(set(matches)) == len(matches)
+    assert stats["compared"] < stats["candidates"]
+
+
+def test_match_nearest_rejects_unknown_search():
+    """Test that an unknown search method raises ValueError."""
+    with pytest.raises(ValueError):
+        match_nearest(_random_fps(2), _random_fps(2), search="magic")
+
+
+def _similarity_matrix(query_fps, target_fps):
+    return np.array(
+        [DataStructs.BulkTanimotoSimilarity(query, target_fps) for query in query_fps]
+    )
+
+
+@pytest.mark.parametrize("search", ["exhaustive", "pruned"])
+def test_top_k_neighbours_equal_brute_force(search):
+    """Test top-k lists, ranked by similarity then target position."""
+    query_fps = _random_fps(20, density=0.05, seed=8)
+    target_fps = _random_fps(60, density=0.05, seed=9)
+    target_fps += target_fps[:10]
+    neighbours, sims = top_k_neighbours(
+        pack_fingerprints(query_fps),
+        pack_fingerprints(target_fps),
+        100,
+        k=5,
+        search=search,
+    )
+    matrix = _similarity_matrix(query_fps, target_fps)
+    for i, row in enumerate(matrix):
+        expected = [j for j in np.lexsort((np.arange(len(row)), -row)) if row[j] > 0][
+            :5
+        ]
+        listed = [j for j in neighbours[i] if j >= 0]
+        assert listed == expected
+        assert list(sims[i][: len(listed)]) == [row[j] for j in expected]
+
+
+def test_greedy_assignment_pairs_highest_similarities_first():
+    """Test the heap greedy against a sorted list of every positive pair."""
+    query_fps = _random_fps(25, density=0.05, seed=10)
+    target_fps = _random_fps(30, density=0.05, seed=11)
+    matrix = _similarity_matrix(query_fps, target_fps)
+    matches, similarities = match_nearest(
+        query_fps, target_fps, assignment="greedy", k=len(target_fps)
+    )
+    expected = {}
+    taken = set()
+    pairs = sorted((-matrix[i, j], i, j) for i, j in zip(*np.nonzero(matrix > 0)))
+    for _, i, j in pairs:
+        if i not in expected and j not in taken:
+            expected[i] = j
+            taken.add(j)
+    assert list(matches) == [expected.get(i, -1) for i in range(len(query_fps))]
+    for i, match in enumerate(matches):
+        if match >= 0:
+            assert similarities[i] == matrix[i, match]
+
+
+@pytest.mark.parametrize("assignment", ["greedy", "optimal"])
+def test_global_assignment_falls_back_when_lists_are_exhausted(assignment):
+    """Test that queries sharing the same short list still all get a target."""
+    if assignment == "optimal":
+        pytest.importorskip("scipy")
+    target_fps = _random_fps(30, density=0.1, seed=12)
+    query_fps = [target_fps[0]] * 5
+    matches, similarities = match_nearest(
+        query_fps, target_fps, assignment=assignment, k=2
+    )
+    assert len(set(matches)) == 5
+    assert 0 in matches
+    assert all(similarity > 0 for similarity in similarities)
+
+
+def test_optimal_assignment_maximizes_total_similarity():
+    """Test the sparse assignment against a dense linear-assignment solve."""
+    optimize = pytest.importorskip("scipy.optimize")
+    query_fps = _random_fps(20, density=0.05, seed=13)
+    target_fps = _random_fps(25, density=0.05, seed=14)
+    matrix = _similarity_matrix(query_fps, target_fps)
+    matches, similarities = match_nearest(
+        query_fps, target_fps, assignment="optimal", k=len(target_fps)
+    )
+    rows, cols = optimize.linear_sum_assignment(matrix, maximize=True)
+    total = sum(similarity or 0.0 for similarity in similarities)
+    assert total == pytest.approx(matrix[rows, cols].sum())
+    _, greedy_similarities = match_nearest(
+        query_fps, target_fps, assignment="greedy", k=len(target_fps)
+    )
+    assert total >= sum(similarity or 0.0 for similarity in greedy_similarities)
+
+
+@pytest.mark.parametrize("assignment", ["ordered", "greedy"])
+@pytest.mark.parametrize("k", [1, 3])
+def test_parallel_matching_equals_single_process(assignment, k):
+    """Test that worker processes sharing the targets return identical pairs."""
+    query_fps = _random_fps(40, density=0.05, seed=15)
+    query_fps += query_fps[:10]
+    target_fps = _random_fps(60, density=0.05, seed=16)
+    serial = match_nearest(query_fps, target_fps, assignment=assignment, k=k)
+    parallel = match_nearest(
+        query_fps, target_fps, assignment=assignment, k=k, workers=2
+    )
+    assert list(parallel[0]) == list(serial[0])
+    assert parallel[1] == serial[1]
+    if assignment == "ordered":
+        assert list(serial[0]) == _reference_match(query_fps, target_fps)[0]
@@ -0,0 +1,61 @@
+import pytest
+
+from toxichempy.chemoinformatics.standardization import (
+    StandardizationCache,
+    standardize_smiles,
+    standardize_smiles_parallel,
+)
+
+SMILES = ["CCO", "OCC", "C[C@H](N)C(=O)O", "not_a_smiles", "CCO", "c1ccccc1O"] * 20
+
+
+def test_standardize_smiles():
+    """Test standardization of valid and invalid SMILES."""
+    assert standardize_smiles("OCC") == "CCO"
+    assert standardize_smiles("C[C@H](N)C(=O)O") == "CC(N)C(=O)O"
+    assert standardize_smiles("not_a_smiles") is None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_standardize_smiles_parallel_matches_serial(workers):
+    """Test that the parallel engine returns the serial result per unique SMILES."""
+    mapping = standardize_smiles_parallel(SMILES, workers=workers, chunk_size=2)
+    assert set(mapping) == set(SMILES)
+    for smiles, standardized in mapping.items():
+        assert standardized == standardize_smiles(smiles)
+
+
+def test_standardization_cache_hits_on_second_pass(tmp_path):
+    """Test that cached results are reused, including failures, across instances."""
+    cache = StandardizationCache(tmp_path / "cache.sqlite")
+    first = standardize_smiles_parallel(SMILES, cache=cache)
+    assert cache.hits == 0
+    assert cache.misses == len(set(SMILES))
+    cache.close()
+
+    cache = StandardizationCache(tmp_path / "cache.sqlite")
+    second = standardize_smiles_parallel(SMILES, cache=cache)
+    assert second == first
+    assert cache.hit_rate == 1.0
+    assert second["not_a_smiles"] is None
+
+
+def test_standardization_cache_is_versioned(tmp_path):
+    """Test that entries from another standardizer version are not reused."""
+    cache = StandardizationCache(tmp_path / "cache.sqlite", version="old")
+    cache.put_many({"CCO": "stale"})
+    cache.close()
+    cache = StandardizationCache(tmp_path / "cache.sqlite")
+    assert standardize_smiles_parallel(["CCO"], cache=cache) == {"CCO": "CCO"}
+    assert cache.hits == 0
+
+
+def test_standardization_cache_evicts_least_recently_used(tmp_path):
+    """Test that the cache stays within max_entries, dropping the oldest rows."""
+    cache = StandardizationCache(tmp_path / "cache.sqlite", max_entries=2)
+    cache.put_many({"A": "a"})
+    cache.put_many({"B": "b"})
+    cache.get_many(["A"])
+    cache.put_many({"C": "c"})
+    assert len(cache) == 2
+    assert set(cache.get_many(["A", "B", "C"])) == {"A", "C"}
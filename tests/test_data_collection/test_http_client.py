@@ -0,0 +1,280 @@
+import gzip
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from toxichempy.data_collection.http_client import (
+    CircuitBreaker,
+    IncompleteDownloadError,
+    TokenBucket,
+    backoff_delay,
+    create_session,
+    download_to_file,
+    parse_retry_after,
+)
+
+PAYLOAD = b"PUBCHEM_CID,SMILES\n" + b"1,CCO\n" * 50000
+
+
+class _PayloadHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/data.csv":
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _FlakyRangeHandler(BaseHTTPRequestHandler):
+    """Drops the connection half way through every full-body response."""
+
+    def do_GET(self):
+        self.server.range_headers.append(self.headers.get("Range"))
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == '"v1"':
+            offset = int(range_header.split("=")[1].rstrip("-"))
+            if offset >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = PAYLOAD[offset:]
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {offset}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}"
+            )
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD[: len(PAYLOAD) // 2])
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _GzipRangeHandler(BaseHTTPRequestHandler):
+    """
+    Ignores ``Accept-Encoding``, gzip-encodes the body, applies ranges to the
+    encoded bytes and drops the first response half way through.
+    """
+
+    def do_GET(self):
+        self.server.range_headers.append(self.headers.get("Range"))
+        self.server.accept_encodings.append(self.headers.get("Accept-Encoding"))
+        body = gzip.compress(PAYLOAD)
+        range_header = self.headers.get("Range")
+        offset = int(range_header.split("=")[1].rstrip("-")) if range_header else 0
+        self.send_response(206 if offset else 200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("ETag", '"v1"')
+        if offset:
+            self.send_header(
+                "Content-Range", f"bytes {offset}-{len(body) - 1}/{len(body)}"
+            )
+        self.send_header("Content-Length", str(len(body) - offset))
+        self.end_headers()
+        if len(self.server.range_headers) == 1:
+            self.wfile.write(body[: len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body[offset:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.range_headers = []
+    server.accept_encodings = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+@pytest.fixture
+def payload_url():
+    """Serves PAYLOAD from a local HTTP server."""
+    server = _serve(_PayloadHandler)
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def flaky_server():
+    """Serves PAYLOAD but drops full downloads mid-stream."""
+    server = _serve(_FlakyRangeHandler)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_allows_initial_burst():
+    """Test that a full bucket hands out its capacity without waiting."""
+    bucket = TokenBucket(rate=5, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.1
+
+
+def test_token_bucket_enforces_rate():
+    """Test that requests beyond the burst are spaced at the configured rate."""
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start >= 4 / 20 - 0.01
+
+
+def test_token_bucket_rejects_invalid_rate():
+    """Test that a non-positive rate raises ValueError."""
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_download_to_file_streams_in_chunks(payload_url, tmp_path):
+    """Test that a download is streamed to disk and its bytes are counted."""
+    output_file = tmp_path / "data.csv"
+    with create_session(pool_size=2) as session:
+        stats = download_to_file(
+            session, f"{payload_url}/data.csv", output_file, timeout=5, chunk_size=4096
+        )
+    assert stats.status_code == 200
+    assert stats.bytes_written == len(PAYLOAD)
+    assert stats.elapsed > 0
+    assert output_file.read_bytes() == PAYLOAD
+    assert [p.name for p in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_download_to_file_skips_error_responses(payload_url, tmp_path):
+    """Test that nothing is written when the server returns an error status."""
+    output_file = tmp_path / "missing.csv"
+    with create_session() as session:
+        stats = download_to_file(
+            session, f"{payload_url}/missing.csv", output_file, timeout=5
+        )
+    assert stats.status_code == 404
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_to_file_resumes_partial_download(flaky_server, tmp_path):
+    """Test that a dropped download is resumed with a Range request."""
+    url = f"http://127.0.0.1:{flaky_server.server_port}/data.csv"
+    output_file = tmp_path / "data.csv"
+    with create_session() as session:
+        with pytest.raises(requests.exceptions.RequestException):
+            download_to_file(session, url, output_file, timeout=5, chunk_size=4096)
+        part_file = tmp_path / "data.csv.part"
+        assert 0 < part_file.stat().st_size < len(PAYLOAD)
+        assert not output_file.exists()
+
+        stats = download_to_file(session, url, output_file, timeout=5)
+    assert flaky_server.range_headers[1] == f"bytes={stats.resumed_from}-"
+    assert stats.status_code == 200
+    assert stats.resumed_from > 0
+    assert stats.size == len(PAYLOAD)
+    assert stats.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+    assert output_file.read_bytes() == PAYLOAD
+    assert [p.name for p in tmp_path.iterdir()] == ["data.csv"]
+
+
+def test_download_to_file_restarts_on_unsatisfiable_range(flaky_server, tmp_path):
+    """Test that a 416 discards the partial file and downloads from byte 0."""
+    url = f"http://127.0.0.1:{flaky_server.server_port}/data.csv"
+    output_file = tmp_path / "data.csv"
+    (tmp_path / "data.csv.part").write_bytes(PAYLOAD + b"stale")
+    (tmp_path / "data.csv.part.validator").write_text('"v1"')
+    with create_session() as session:
+        with pytest.raises(requests.exceptions.RequestException):
+            download_to_file(session, url, output_file, timeout=5, chunk_size=4096)
+        stats = download_to_file(session, url, output_file, timeout=5)
+    assert flaky_server.range_headers[:2] == [f"bytes={len(PAYLOAD) + 5}-", None]
+    assert stats.resumed_from > 0
+    assert stats.status_code == 200
+    assert output_file.read_bytes() == PAYLOAD
+
+
+def test_download_to_file_does_not_resume_encoded_bodies(tmp_path):
+    """Test that a dropped gzip-encoded download restarts instead of resuming."""
+    server = _serve(_GzipRangeHandler)
+    url = f"http://127.0.0.1:{server.server_port}/data.csv"
+    output_file = tmp_path / "data.csv"
+    try:
+        with create_session() as session:
+            with pytest.raises(requests.exceptions.RequestException):
+                download_to_file(session, url, output_file, timeout=5, chunk_size=4096)
+            assert not (tmp_path / "data.csv.part").exists()
+            stats = download_to_file(session, url, output_file, timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert server.accept_encodings == ["identity", "identity"]
+    assert server.range_headers == [None, None]
+    assert stats.resumed_from == 0
+    assert stats.sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+    assert output_file.read_bytes() == PAYLOAD
+
+
+def test_incomplete_download_error_is_a_request_exception():
+    """Test that truncated bodies are retried like other request failures."""
+    assert issubclass(IncompleteDownloadError, requests.exceptions.RequestException)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("5", 5.0), (None, None), ("soon", None), ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0)],
+)
+def test_parse_retry_after(value, expected):
+    """Test parsing Retry-After given in seconds or as a past HTTP date."""
+    assert parse_retry_after(value) == expected
+
+
+def test_backoff_delay_grows_exponentially_with_jitter():
+    """Test that backoff delays stay within the jittered exponential bounds."""
+    for attempt in range(5):
+        delay = backoff_delay(attempt, base=1, cap=10)
+        upper = min(10, 2**attempt)
+        assert upper / 2 <= delay <= upper
+
+
+def test_backoff_delay_honours_retry_after():
+    """Test that Retry-After overrides the computed delay, up to the cap."""
+    assert backoff_delay(0, base=1, cap=10, retry_after=3) == 3
+    assert backoff_delay(0, base=1, cap=10, retry_after=120) == 10
+
+
+def test_circuit_breaker_opens_and_recovers():
+    """Test that the breaker opens on errors, pauses, then closes on a probe."""
+    breaker = CircuitBreaker(error_rate=0.5, window=4, min_requests=4, cooldown=0.1)
+    for success in (True, False, False, True):
+        breaker.record(success)
+    assert breaker.state == "open"
+    assert breaker.wait() > 0
+    assert breaker.state == "half_open"
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.wait() == 0
+    summary = breaker.summary()
+    assert summary["trips"] == 1
+    assert summary["failures"] == 2
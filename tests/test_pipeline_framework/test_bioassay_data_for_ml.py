@@ -0,0 +1,716 @@
+import math
+import multiprocessing
+import pickle
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+from rdkit.Chem import Descriptors
+
+from toxichempy.chemoinformatics.fingerprints import (
+    load_fingerprint_bundle,
+    load_packed_fingerprints,
+    load_sparse_fingerprints,
+)
+from toxichempy.data_collection.raw_assay_store import (
+    RawAssayStore,
+    parse_refresh_policy,
+)
+from toxichempy.pipeline_framework import bioassay_data_for_ml as bioassay
+
+RAW_ASSAY_CSV = (
+    "PUBCHEM_RESULT_TAG,PUBCHEM_CID,PUBCHEM_EXT_DATASOURCE_SMILES,PUBCHEM_ACTIVITY_OUTCOME\n"
+    "1,2244,CC(=O)OC1=CC=CC=C1C(=O)O,Active\n"
+    "2,702,CCO,Inactive\n"
+    "3,241,c1ccccc1,Inactive\n"
+)
+
+
+class _AssayHandler(BaseHTTPRequestHandler):
+    """Stand-in for the PubChem datatable endpoint."""
+
+    def do_GET(self):
+        aid = parse_qs(urlparse(self.path).query)["aid"][0]
+        self.server.requested.append(aid)
+        if aid == "404":
+            self.send_response(404)
+            self.end_headers()
+            return
+        if aid == "503" and self.server.requested.count(aid) == 1:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        etag = f'"assay-{aid}"'
+        # A cache in front of the server answering unconditional requests
+        if self.headers.get("If-None-Match") == etag or (
+            aid == "304" and self.server.requested.count(aid) == 1
+        ):
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = RAW_ASSAY_CSV.encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _DroppingAssayHandler(BaseHTTPRequestHandler):
+    """Drops every full assay download half way; honours Range requests."""
+
+    body = RAW_ASSAY_CSV.encode() + b"4,1,C,Inactive\n" * 200000
+
+    def do_GET(self):
+        self.server.ranges.append(self.headers.get("Range"))
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == '"v1"':
+            offset = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                f"bytes {offset}-{len(self.body) - 1}/{len(self.body)}",
+            )
+            self.send_header("Content-Length", str(len(self.body) - offset))
+            self.end_headers()
+            self.wfile.write(self.body[offset:])
+            return
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body[: len(self.body) // 2])
+        self.wfile.flush()
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def assay_server(monkeypatch):
+    """Serves fake assay tables on localhost and points BASE_URL at them."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _AssayHandler)
+    server.requested = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(
+        bioassay,
+        "BASE_URL",
+        f"http://127.0.0.1:{server.server_port}/assay/pcget.cgi?aid={{}}",
+    )
+    monkeypatch.setattr(bioassay, "RETRIES", 1)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_multiple_assays_concurrent(assay_server, tmp_path):
+    """Test that concurrent fetching downloads every AID and reports latency."""
+    aids = [str(aid) for aid in range(1, 9)]
+    results = bioassay.fetch_multiple_assays(
+        aids, str(tmp_path), workers=4, requests_per_second=100
+    )
+    assert [r["aid"] for r in results] == aids
+    assert all(r["success"] for r in results)
+    assert all(r["latency"] > 0 for r in results)
+    assert sorted(assay_server.requested) == sorted(aids)
+    for aid in aids:
+        raw_file = tmp_path / f"AID_{aid}" / f"rawdata_{aid}.csv"
+        assert raw_file.read_text() == RAW_ASSAY_CSV
+
+
+def test_fetch_multiple_assays_reports_failures(assay_server, tmp_path):
+    """Test that a failing AID is reported without stopping the batch."""
+    results = bioassay.fetch_multiple_assays(
+        ["1", "404"], str(tmp_path), workers=2, requests_per_second=100
+    )
+    assert [r["success"] for r in results] == [True, False]
+    # 404 is not retryable
+    assert assay_server.requested.count("404") == 1
+
+
+def test_fetch_retries_throttled_requests(assay_server, tmp_path, monkeypatch):
+    """Test that a 503 with Retry-After is retried and counted."""
+    monkeypatch.setattr(bioassay, "RETRIES", 3)
+    results = bioassay.fetch_multiple_assays(
+        ["503"], str(tmp_path), requests_per_second=100
+    )
+    assert results[0]["success"]
+    assert results[0]["retries"] == 1
+    assert assay_server.requested.count("503") == 2
+
+
+def test_fetch_resumes_partial_download_across_runs(tmp_path, monkeypatch):
+    """Test that a later fetch resumes the .part file an earlier one left."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DroppingAssayHandler)
+    server.ranges = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(
+        bioassay,
+        "BASE_URL",
+        f"http://127.0.0.1:{server.server_port}/assay/pcget.cgi?aid={{}}",
+    )
+    monkeypatch.setattr(bioassay, "RETRIES", 1)
+    try:
+        with bioassay.create_session() as session:
+            runs = [
+                bioassay._fetch_one_assay(
+                    "1",
+                    str(tmp_path),
+                    bioassay.TokenBucket(100),
+                    session,
+                    bioassay.CircuitBreaker(),
+                )
+                for _ in range(2)
+            ]
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [run["success"] for run in runs] == [False, True]
+    assert server.ranges[0] is None and server.ranges[1].startswith("bytes=")
+    assay_dir = tmp_path / "AID_1"
+    assert (assay_dir / "rawdata_1.csv").read_bytes() == _DroppingAssayHandler.body
+    assert [p.name for p in assay_dir.iterdir()] == ["rawdata_1.csv"]
+
+
+def test_raw_assay_store_reuses_cached_tables(assay_server, tmp_path):
+    """Test that fresh cached assays are served without contacting the server."""
+    store = RawAssayStore(tmp_path / "store")
+    first = bioassay.fetch_multiple_assays(
+        ["1", "2"], str(tmp_path / "group_a"), requests_per_second=100, store=store
+    )
+    assert [r["source"] for r in first] == ["download", "download"]
+    assert len(assay_server.requested) == 2
+
+    second = bioassay.fetch_multiple_assays(
+        ["1", "2"],
+        str(tmp_path / "group_b"),
+        requests_per_second=100,
+        store=store,
+        max_age_days=math.inf,
+    )
+    assert [r["source"] for r in second] == ["cache", "cache"]
+    assert len(assay_server.requested) == 2
+    raw_file = tmp_path / "group_b" / "AID_1" / "rawdata_1.csv"
+    assert raw_file.read_text() == RAW_ASSAY_CSV
+    # Identical tables are stored once
+    assert len(list((tmp_path / "store" / "objects").glob("*/*.csv"))) == 1
+
+
+def test_raw_assay_store_revalidates_stale_tables(assay_server, tmp_path):
+    """Test that stale cached assays are revalidated with a conditional request."""
+    store = RawAssayStore(tmp_path / "store")
+    bioassay.fetch_multiple_assays(
+        ["1"], str(tmp_path), requests_per_second=100, store=store
+    )
+    results = bioassay.fetch_multiple_assays(
+        ["1"], str(tmp_path), requests_per_second=100, store=store, max_age_days=0
+    )
+    assert results[0]["source"] == "not_modified"
+    assert results[0]["bytes"] == 0
+    assert (tmp_path / "AID_1" / "rawdata_1.csv").read_text() == RAW_ASSAY_CSV
+
+
+def test_raw_assay_store_refetches_not_modified_without_record(assay_server, tmp_path):
+    """Test that a 304 for an AID missing from the store is treated as a miss."""
+    store = RawAssayStore(tmp_path / "store")
+    results = bioassay.fetch_multiple_assays(
+        ["304"], str(tmp_path), requests_per_second=100, store=store
+    )
+    assert results[0]["success"]
+    assert results[0]["source"] == "download"
+    assert assay_server.requested.count("304") == 2
+    assert store.get("304") is not None
+    assert (tmp_path / "AID_304" / "rawdata_304.csv").read_text() == RAW_ASSAY_CSV
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("never", math.inf), ("always", 0.0), ("7", 7.0)]
+)
+def test_parse_refresh_policy(value, expected):
+    """Test parsing of the --refresh policy values."""
+    assert parse_refresh_policy(value) == expected
+
+
+def test_parse_refresh_policy_rejects_invalid_values():
+    """Test that an unknown refresh policy raises ValueError."""
+    with pytest.raises(ValueError):
+        parse_refresh_policy("sometimes")
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_compressed_outputs_are_read_transparently(
+    assay_server, tmp_path, monkeypatch, compression
+):
+    """Test that compressed raw and cleaned tables round-trip through the stages."""
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    monkeypatch.setattr(bioassay, "OUTPUT_COMPRESSION", compression)
+    root_dir = str(tmp_path / "group")
+    bioassay.fetch_and_process_assays(
+        {root_dir: ["1"]},
+        raw_store_dir=str(tmp_path / "store"),
+        standardize_cache=str(tmp_path / "cache.sqlite"),
+    )
+    suffix = {"gzip": ".gz", "zstd": ".zst"}[compression]
+    assay_dir = tmp_path / "group" / "AID_1"
+    assert (assay_dir / f"rawdata_1.csv{suffix}").exists()
+    assert (assay_dir / f"cleaned_data_1.csv{suffix}").exists()
+    df = bioassay.get_cleaned_data("1", root_dir)
+    assert list(df["PUBCHEM_CID"]) == [2244, 702, 241]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_process_assay_data_preserves_order_and_failures(tmp_path, workers):
+    """Test that parallel standardization keeps row order and failed CIDs."""
+    raw_file = tmp_path / "rawdata_1.csv"
+    raw_file.write_text(
+        "PUBCHEM_CID,PUBCHEM_EXT_DATASOURCE_SMILES,PUBCHEM_ACTIVITY_OUTCOME\n"
+        "3,OCC,Active\n"
+        "1,not_a_smiles,Inactive\n"
+        "2,c1ccccc1,Inactive\n"
+        "3,OCC,Inactive\n"
+        "4,bad,Active\n"
+    )
+    bioassay.process_assay_data("1", raw_file, tmp_path, workers=workers)
+    cleaned = (tmp_path / "cleaned_data_1.csv").read_text().splitlines()
+    assert cleaned == [
+        "PUBCHEM_CID,STANDARDIZED_SMILES,PUBCHEM_ACTIVITY_OUTCOME",
+        "3,CCO,Active",
+        "2,c1ccccc1,Inactive",
+        "3,CCO,Inactive",
+    ]
+    failed = (tmp_path / "failed_standardize_smiles_1.txt").read_text()
+    assert failed == "1\n4\n"
+
+
+def _write_cleaned_data(root_dir, aid, rows):
+    assay_dir = root_dir / f"AID_{aid}"
+    assay_dir.mkdir(parents=True, exist_ok=True)
+    lines = ["PUBCHEM_CID,STANDARDIZED_SMILES,PUBCHEM_ACTIVITY_OUTCOME"]
+    lines += [",".join(map(str, row)) for row in rows]
+    (assay_dir / f"cleaned_data_{aid}.csv").write_text("\n".join(lines) + "\n")
+    return assay_dir
+
+
+DUPLICATED_ROWS = [
+    (1, "CCO", "Active"),
+    (2, "c1ccccc1", "Inactive"),
+    (1, "CCO", "Inactive"),
+    (3, "C1CC1(", "Inactive"),
+    (2, "c1ccccc1", "Active"),
+]
+
+
+def test_fingerprint_stage_broadcasts_unique_results(tmp_path):
+    """Test that fingerprints computed per unique SMILES map back to every row."""
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.process_aid_fingerprints("1", str(tmp_path))
+    df = pd.read_csv(
+        assay_dir / "raw_morgan_fingerprints_1.csv", dtype={"MorganFingerprint": str}
+    )
+    expected = [bioassay.calculate_fingerprint(row[1]) for row in DUPLICATED_ROWS]
+    assert list(df["MorganFingerprint"].fillna("")) == [e or "" for e in expected]
+    failed = pd.read_csv(assay_dir / "failed_morgan_fingerprints_1.csv")
+    assert list(failed["PUBCHEM_CID"]) == [3]
+
+
+def test_descriptor_stage_broadcasts_unique_results(tmp_path):
+    """Test that descriptors computed per unique SMILES map back to every row."""
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.process_aid_descriptors("1", str(tmp_path))
+    df = pd.read_csv(assay_dir / "raw_descriptors_1.csv")
+    assert list(df["PUBCHEM_CID"]) == [1, 2, 1, 3, 2]
+    assert df.loc[0, "MolWt"] == df.loc[2, "MolWt"]
+    assert df.loc[1, "MolWt"] == df.loc[4, "MolWt"]
+    assert pd.isna(df.loc[3, "MolWt"])
+    failed = pd.read_csv(assay_dir / "raw_failed_descriptors_1.csv")
+    assert list(failed["PUBCHEM_CID"]) == [3]
+
+
+def test_featurize_assay_matches_separate_stages(tmp_path):
+    """Test that single-pass featurization writes the same files as the separate stages."""
+    separate_dir = _write_cleaned_data(tmp_path / "separate", "1", DUPLICATED_ROWS)
+    bioassay.process_assay("1", str(tmp_path / "separate"))
+    bioassay.process_aid_descriptors("1", str(tmp_path / "separate"))
+    bioassay.process_aid_fingerprints("1", str(tmp_path / "separate"))
+    single_dir = _write_cleaned_data(tmp_path / "single", "1", DUPLICATED_ROWS)
+    bioassay.featurize_assay("1", str(tmp_path / "single"))
+
+    for name in [
+        "SmilesForMl_1.csv",
+        "most_similar_inactive_compounds_1.csv",
+        "raw_descriptors_1.csv",
+        "raw_failed_descriptors_1.csv",
+        "raw_morgan_fingerprints_1.csv",
+        "failed_morgan_fingerprints_1.csv",
+    ]:
+        assert (single_dir / name).read_text() == (separate_dir / name).read_text()
+
+
+def test_featurize_assay_reuses_cached_molecules(tmp_path, monkeypatch):
+    """Test that pickled molecules are reused instead of reparsing SMILES."""
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.featurize_assay("1", str(tmp_path), cache_mols=True)
+    assert (assay_dir / "molecules_1.pkl").exists()
+    first = (assay_dir / "raw_descriptors_1.csv").read_text()
+
+    def fail_parse(smiles):
+        raise AssertionError(f"unexpected parse of {smiles}")
+
+    monkeypatch.setattr(bioassay.Chem, "MolFromSmiles", fail_parse)
+    mols, parsed = bioassay._load_molecules(
+        "1", str(tmp_path), ["CCO", "c1ccccc1", "C1CC1("], cache_mols=True
+    )
+    assert parsed == 0
+    assert mols[2] is None
+    monkeypatch.undo()
+    bioassay.featurize_assay("1", str(tmp_path), cache_mols=True)
+    assert (assay_dir / "raw_descriptors_1.csv").read_text() == first
+
+
+def test_molecule_cache_is_versioned_and_pruned(tmp_path, monkeypatch):
+    """Test that the molecule cache drops other RDKit versions, stale and excess entries."""
+    (tmp_path / "AID_1").mkdir()
+    cache_file = tmp_path / "AID_1" / "molecules_1.pkl"
+    bioassay._load_molecules("1", str(tmp_path), ["CCO", "CCN"], cache_mols=True)
+
+    monkeypatch.setattr(bioassay.rdBase, "rdkitVersion", "0000.00.0")
+    _, parsed = bioassay._load_molecules("1", str(tmp_path), ["CCO"], cache_mols=True)
+    assert parsed == 1
+    with open(cache_file, "rb") as f:
+        cached = pickle.load(f)
+    assert cached["rdkit"] == "0000.00.0" and list(cached["molecules"]) == ["CCO"]
+
+    size = len(cached["molecules"]["CCO"])
+    bioassay._load_molecules(
+        "1", str(tmp_path), ["CCO", "c1ccccc1"], cache_mols=True, max_bytes=size
+    )
+    with open(cache_file, "rb") as f:
+        assert list(pickle.load(f)["molecules"]) == ["CCO"]
+    assert [p.name for p in cache_file.parent.iterdir()] == ["molecules_1.pkl"]
+
+
+def test_load_molecules_skips_pickling_without_cache(tmp_path, monkeypatch):
+    """Test that molecules are only serialized when they are cached."""
+
+    def fail_pickle(mol):
+        raise AssertionError("unexpected Mol.ToBinary() call")
+
+    monkeypatch.setattr(bioassay.Chem.Mol, "ToBinary", fail_pickle)
+    mols, parsed = bioassay._load_molecules("1", str(tmp_path), ["CCO", "C1CC1("])
+    assert parsed == 2
+    assert mols[0] is not None and mols[1] is None
+
+
+def test_process_assay_with_lsh_search(tmp_path, monkeypatch):
+    """Test that the approximate search still pairs every active with an inactive."""
+    monkeypatch.setattr(bioassay, "SIMILARITY_SEARCH", bioassay.SIMILARITY_SEARCH)
+    monkeypatch.setattr(bioassay, "LSH_RECALL", bioassay.LSH_RECALL)
+    bioassay.set_matching_options(search="lsh", lsh_recall=0.95)
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.process_assay("1", str(tmp_path))
+    df = pd.read_csv(assay_dir / "most_similar_inactive_compounds_1.csv")
+    assert list(df["Active_PUBCHEM_CID"]) == [1, 2]
+    assert list(df["Inactive_PUBCHEM_CID"]) == [1, 2]
+    assert list(df["Similarity"]) == [1.0, 1.0]
+    with pytest.raises(ValueError):
+        bioassay.set_matching_options(search="magic")
+    with pytest.raises(ValueError):
+        bioassay.set_matching_options(lsh_recall=1.5)
+
+
+def test_process_assay_with_greedy_assignment(tmp_path, monkeypatch):
+    """Test that the global greedy assignment writes the same output layout."""
+    monkeypatch.setattr(bioassay, "ASSIGNMENT", bioassay.ASSIGNMENT)
+    monkeypatch.setattr(bioassay, "TOP_K", bioassay.TOP_K)
+    bioassay.set_matching_options(assignment="greedy", top_k=2)
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.process_assay("1", str(tmp_path))
+    df = pd.read_csv(assay_dir / "most_similar_inactive_compounds_1.csv")
+    assert list(df["Active_PUBCHEM_CID"]) == [1, 2]
+    assert list(df["Inactive_PUBCHEM_CID"]) == [1, 2]
+    with pytest.raises(ValueError):
+        bioassay.set_matching_options(assignment="random")
+    with pytest.raises(ValueError):
+        bioassay.set_matching_options(top_k=0)
+
+
+def test_fingerprint_stage_writes_packed_fingerprints(tmp_path, monkeypatch):
+    """Test that packed fingerprints hold the CSV bitstrings of the computed rows."""
+    monkeypatch.setattr(bioassay, "FINGERPRINT_FORMAT", bioassay.FINGERPRINT_FORMAT)
+    bioassay.set_fingerprint_format("both")
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.featurize_assay("1", str(tmp_path))
+    df = pd.read_csv(
+        assay_dir / "raw_morgan_fingerprints_1.csv", dtype={"MorganFingerprint": str}
+    ).dropna()
+    cids, bitvects = load_packed_fingerprints(
+        assay_dir / "raw_morgan_fingerprints_1.npy", as_bitvects=True
+    )
+    assert list(cids) == list(df["PUBCHEM_CID"]) == [1, 2, 1, 2]
+    assert [bv.ToBitString() for bv in bitvects] == list(df["MorganFingerprint"])
+    with pytest.raises(ValueError):
+        bioassay.set_fingerprint_format("sdf")
+
+
+def test_fingerprint_stage_writes_additional_types(tmp_path, monkeypatch):
+    """Test that extra fingerprint types are written per row in one bundle."""
+    monkeypatch.setattr(bioassay, "FINGERPRINT_SET", bioassay.FINGERPRINT_SET)
+    bioassay.set_fingerprint_types(["morgan3", "maccs", "morgan2_count"])
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.process_aid_fingerprints("1", str(tmp_path))
+    cids, matrices = load_fingerprint_bundle(assay_dir / "raw_fingerprints_1.npz")
+    assert list(cids) == [1, 2, 1, 2]
+    assert set(matrices) == {"morgan3", "maccs", "morgan2_count"}
+    for matrix in matrices.values():
+        assert (matrix[0] == matrix[2]).all() and (matrix[1] == matrix[3]).all()
+    with pytest.raises(ValueError):
+        bioassay.set_fingerprint_types(["ecfp4"])
+
+
+def test_sparse_fingerprints_share_pruned_group_vocabulary(tmp_path):
+    """Test that assays of a group share columns and rare environments are pruned."""
+    pytest.importorskip("scipy")
+    _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    _write_cleaned_data(tmp_path, "2", [(5, "CCO", "Active"), (6, "CCN", "Inactive")])
+    bioassay.export_sparse_fingerprints({str(tmp_path): ["1", "2"]}, min_frequency=2)
+    cids, first, vocabulary = load_sparse_fingerprints(
+        tmp_path / "AID_1" / "sparse_morgan_counts_1.npz"
+    )
+    assert list(cids) == [1, 2, 1, 2]
+    _, second, second_vocabulary = load_sparse_fingerprints(
+        tmp_path / "AID_2" / "sparse_morgan_counts_2.npz"
+    )
+    assert (vocabulary == second_vocabulary).all()
+    assert first.shape[1] == second.shape[1] == len(vocabulary)
+    assert (first[0] != second[0]).nnz == 0
+    assert (first.getnnz(axis=0) + second.getnnz(axis=0) >= 2).all()
+
+
+def _atoms_hanging_on_benzene(mol):
+    if mol.GetNumAtoms() == 6:
+        time.sleep(60)
+    return mol.GetNumAtoms()
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="patched descriptors reach workers only through fork",
+)
+def test_descriptor_timeouts_are_reported_with_reason(tmp_path, monkeypatch):
+    """Test that timed-out and invalid structures land in the failed file with a reason."""
+    monkeypatch.setattr(bioassay, "DESCRIPTOR_WORKERS", bioassay.DESCRIPTOR_WORKERS)
+    monkeypatch.setattr(bioassay, "DESCRIPTOR_TIMEOUT", bioassay.DESCRIPTOR_TIMEOUT)
+    monkeypatch.setattr(
+        Descriptors, "_descList", [("Atoms", _atoms_hanging_on_benzene)]
+    )
+    bioassay.set_descriptor_options(workers=2, timeout=0.5)
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.process_aid_descriptors("1", str(tmp_path))
+    df = pd.read_csv(assay_dir / "raw_descriptors_1.csv")
+    assert list(df["Atoms"].fillna(0)) == [3, 0, 3, 0, 0]
+    failed = pd.read_csv(assay_dir / "raw_failed_descriptors_1.csv")
+    assert list(failed["PUBCHEM_CID"]) == [2, 3, 2]
+    assert list(failed["Reason"]) == [
+        "timed out after 0.5s",
+        "invalid SMILES",
+        "timed out after 0.5s",
+    ]
+    with pytest.raises(ValueError):
+        bioassay.set_descriptor_options(timeout=0)
+
+
+def test_descriptor_stage_writes_selected_columns_in_registry_order(
+    tmp_path, monkeypatch
+):
+    """Test that a descriptor selection keeps the registry's column order."""
+    monkeypatch.setattr(bioassay, "DESCRIPTORS", bioassay.DESCRIPTORS)
+    bioassay.set_descriptor_options(names=["TPSA", "MolWt"], groups=["charge"])
+    assay_dir = _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS)
+    bioassay.featurize_assay("1", str(tmp_path))
+    df = pd.read_csv(assay_dir / "raw_descriptors_1.csv")
+    assert list(df.columns[3:]) == [
+        "MolWt",
+        "MaxPartialCharge",
+        "MinPartialCharge",
+        "MaxAbsPartialCharge",
+        "MinAbsPartialCharge",
+        "TPSA",
+    ]
+    assert df.loc[0, "MolWt"] == pytest.approx(46.069)
+
+
+def test_feature_store_serves_compounds_shared_across_assays(tmp_path, monkeypatch):
+    """Test that a second assay reuses stored features without calling RDKit."""
+    plain_dir = _write_cleaned_data(tmp_path / "plain", "2", DUPLICATED_ROWS[:3])
+    bioassay.process_aid_descriptors("2", str(tmp_path / "plain"))
+    bioassay.process_aid_fingerprints("2", str(tmp_path / "plain"))
+
+    store = bioassay.open_feature_store(str(tmp_path / "store.sqlite"))
+    try:
+        _write_cleaned_data(tmp_path, "1", DUPLICATED_ROWS[:3])
+        bioassay.featurize_assay("1", str(tmp_path))
+        assert store.hits == 0
+
+        def fail_parse(smiles):
+            raise AssertionError(f"unexpected parse of {smiles}")
+
+        monkeypatch.setattr(bioassay.Chem, "MolFromSmiles", fail_parse)
+        assay_dir = _write_cleaned_data(tmp_path, "2", DUPLICATED_ROWS[:3])
+        bioassay.process_aid_descriptors("2", str(tmp_path))
+        bioassay.process_aid_fingerprints("2", str(tmp_path))
+        monkeypatch.undo()
+        for name in ["raw_descriptors_2.csv", "raw_morgan_fingerprints_2.csv"]:
+            assert (assay_dir / name).read_text() == (plain_dir / name).read_text()
+    finally:
+        summary = bioassay.close_feature_store()
+    assert summary["hits"] == 4 and summary["hit_rate"] == 0.5
+
+
+def test_set_descriptor_format_rejects_unknown_formats():
+    """Test that only csv, parquet and feather descriptor tables are accepted."""
+    with pytest.raises(ValueError):
+        bioassay.set_descriptor_format("xlsx")
+
+
+@pytest.mark.parametrize("descriptor_format", ["parquet", "feather"])
+def test_columnar_descriptor_tables_flow_to_comparative_table(
+    tmp_path, monkeypatch, descriptor_format
+):
+    """Test float32 columnar descriptors through merging, copying and the summary."""
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(bioassay, "DESCRIPTOR_FORMAT", bioassay.DESCRIPTOR_FORMAT)
+    monkeypatch.chdir(tmp_path)
+    _write_cleaned_data(tmp_path / "plain", "1", DUPLICATED_ROWS)
+    bioassay.process_aid_descriptors("1", "plain")
+    csv_df = pd.read_csv(tmp_path / "plain" / "AID_1" / "raw_descriptors_1.csv")
+
+    bioassay.set_descriptor_format(descriptor_format)
+    _write_cleaned_data(tmp_path / "group", "1", DUPLICATED_ROWS)
+    _write_cleaned_data(tmp_path / "group", "2", DUPLICATED_ROWS[:3])
+    for aid in ["1", "2"]:
+        bioassay.process_aid_descriptors(aid, "group")
+    bioassay.merge_descriptor_files({"group": ["1", "2"]})
+    merged = bioassay.read_file(f"group/raw_descriptors_group.{descriptor_format}")
+    names = bioassay.descriptor_names()
+    assert list(merged.columns[3:]) == names
+    assert (merged[names].dtypes == np.float32).all()
+    assert list(merged["PUBCHEM_CID"]) == [1, 2, 1, 3, 2, 1, 2, 1]
+    assert merged[names].iloc[3].isna().all()
+    np.testing.assert_allclose(
+        merged.loc[:4, "MolWt"], csv_df["MolWt"].astype(np.float32)
+    )
+
+    bioassay.copy_and_rename_files(
+        {"group": ["1", "2"]}, ["raw_descriptors_{root_dir}.csv"]
+    )
+    assert (tmp_path / "MlData" / f"data_group.{descriptor_format}").exists()
+    summary = bioassay.create_comparative_table(str(tmp_path / "MlData"))
+    assert summary.loc[0, "Total Entries Before"] == 8
+    assert summary.loc[0, "Unique Count"] == 3
+
+
+def test_merge_smiles_files_streams_assays_in_order(tmp_path, monkeypatch):
+    """Test that the streaming group merge equals concatenating the assays."""
+    monkeypatch.setattr(bioassay, "MERGE_CHUNK_ROWS", bioassay.MERGE_CHUNK_ROWS)
+    monkeypatch.setattr(bioassay, "MERGE_READ_WORKERS", bioassay.MERGE_READ_WORKERS)
+    monkeypatch.chdir(tmp_path)
+    bioassay.set_merge_options(chunk_rows=2, read_workers=2)
+    frames = []
+    for aid, rows in [("1", DUPLICATED_ROWS), ("2", DUPLICATED_ROWS[:2])]:
+        assay_dir = _write_cleaned_data(tmp_path / "group", aid, rows)
+        (assay_dir / f"cleaned_data_{aid}.csv").rename(
+            assay_dir / f"SmilesForMl_{aid}.csv"
+        )
+        frames.append(pd.read_csv(assay_dir / f"SmilesForMl_{aid}.csv"))
+    bioassay.merge_smiles_files({"group": ["1", "3", "2"]})
+    merged = pd.read_csv(tmp_path / "group" / "SmilesForMl_group.csv")
+    pd.testing.assert_frame_equal(merged, pd.concat(frames, ignore_index=True))
+    with pytest.raises(ValueError):
+        bioassay.set_merge_options(read_workers=0)
+
+
+def test_dataset_layout_writes_only_new_assay_partitions(tmp_path, monkeypatch):
+    """Test partitioned merges, their publication and the comparative table."""
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(bioassay, "MERGE_LAYOUT", bioassay.MERGE_LAYOUT)
+    monkeypatch.chdir(tmp_path)
+    bioassay.set_merge_options(layout="dataset")
+    for aid, rows in [("1", DUPLICATED_ROWS), ("2", DUPLICATED_ROWS[:3])]:
+        _write_cleaned_data(tmp_path / "group", aid, rows)
+        bioassay.process_aid_descriptors(aid, "group")
+    bioassay.merge_descriptor_files({"group": ["1"]})
+    dataset = tmp_path / "AssayDatasets" / "raw_descriptors"
+    first = dataset / "group=group" / "aid=1" / "part-0.parquet"
+    written = first.stat().st_mtime_ns
+    # Rebuilt assay directories (as the fetch stage does) are newer, not changed
+    source = tmp_path / "group" / "AID_1" / "raw_descriptors_1.csv"
+    source.write_bytes(source.read_bytes())
+    bioassay.merge_descriptor_files({"group": ["1", "2"]})
+    assert first.stat().st_mtime_ns == written
+    assert [keys["aid"] for keys, _ in bioassay.dataset_partitions(dataset)] == [
+        "1",
+        "2",
+    ]
+    assert not (tmp_path / "group" / "raw_descriptors_group.csv").exists()
+
+    df = bioassay.read_file(
+        dataset, columns=["PUBCHEM_CID", "MolWt"], filters=[("aid", "=", 2)]
+    )
+    assert list(df["PUBCHEM_CID"]) == [1, 2, 1]
+
+    bioassay.copy_and_rename_files(
+        {"group": ["1", "2"]}, ["raw_descriptors_{root_dir}.csv"]
+    )
+    published = tmp_path / "MlData" / "data" / "group=group"
+    assert sorted(p.parent.name for p in published.rglob("*.parquet")) == [
+        "aid=1",
+        "aid=2",
+    ]
+    summary = bioassay.create_comparative_table(str(tmp_path / "MlData"))
+    assert summary.loc[0, "Filename"] == "data/group=group"
+    assert summary.loc[0, "Total Entries Before"] == 8
+    assert summary.loc[0, "Unique Count"] == 3
+    deduplicated = bioassay.read_file(tmp_path / "MlData" / "No_duplicates_data")
+    assert list(deduplicated["PUBCHEM_CID"]) == [1, 2, 3]
+
+    # Dropping an assay prunes its partition; an unusable group name is skipped
+    _write_cleaned_data(tmp_path / "sub" / "group", "1", DUPLICATED_ROWS)
+    bioassay.process_aid_descriptors("1", "sub/group")
+    bioassay.merge_descriptor_files({"sub/group": ["1"], "group": ["2"]})
+    assert not (dataset / "group=group" / "aid=1").exists()
+    assert (dataset / "group=group" / "aid=2" / "part-0.parquet").exists()
+    bioassay.copy_and_rename_files(
+        {"sub/group": ["1"], "group": ["2"]}, ["raw_descriptors_{root_dir}.csv"]
+    )
+    assert [p.parent.name for p in published.rglob("*.parquet")] == ["aid=2"]
+
+
+def test_copy_and_rename_files_links_and_skips_unchanged_tables(tmp_path, monkeypatch):
+    """Test hard-linked publication of merged tables and skipping on reruns."""
+    monkeypatch.setattr(bioassay, "PUBLISH_MODE", bioassay.PUBLISH_MODE)
+    monkeypatch.chdir(tmp_path)
+    bioassay.set_publish_options(mode="hardlink")
+    (tmp_path / "group").mkdir()
+    merged = tmp_path / "group" / "raw_descriptors_group.csv.gz"
+    merged.write_bytes(b"not really gzip")
+    (tmp_path / "group" / "raw_descriptors_group.csv.bak").touch()
+    patterns = ["raw_descriptors_{root_dir}.csv"]
+    assert bioassay.copy_and_rename_files({"group": []}, patterns) == {"hardlink": 1}
+    published = tmp_path / "MlData" / "data_group.csv.gz"
+    assert published.stat().st_ino == merged.stat().st_ino
+    assert bioassay.copy_and_rename_files({"group": []}, patterns) == {"unchanged": 1}
+    assert bioassay.copy_and_rename_files({"group": []}, patterns, -1) == {}
+    with pytest.raises(ValueError):
+        bioassay.set_publish_options(mode="move")
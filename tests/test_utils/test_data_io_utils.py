@@ -1,7 +1,20 @@
+import numpy as np
 import pandas as pd
 import pytest
 
-from toxichempy.utils.data_io_utils import convert_file, read_file, write_file
+from toxichempy.utils.data_io_utils import (
+    TableWriter,
+    compressed_path,
+    convert_file,
+    dataset_partitions,
+    find_compressed_file,
+    find_table,
+    merge_tables,
+    partition_path,
+    read_file,
+    stream_tables,
+    write_file,
+)
 
 
 @pytest.fixture
@@ -97,3 +110,159 @@ def test_unsupported_file_format(sample_dataframe, tmp_path):
         write_file(sample_dataframe, file_path)
     with pytest.raises(ValueError):
         read_file(file_path)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_write_read_compressed_csv(sample_dataframe, tmp_path, compression):
+    """Test writing and reading a compressed CSV file."""
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    file_path = compressed_path(tmp_path / "test.csv", compression)
+    write_file(sample_dataframe, file_path)
+    assert find_compressed_file(tmp_path / "test.csv") == file_path
+    df = read_file(file_path)
+    pd.testing.assert_frame_equal(df, sample_dataframe)
+
+
+def test_compressed_path_rejects_unknown_codec(tmp_path):
+    """Test that an unknown compression codec raises ValueError."""
+    with pytest.raises(ValueError):
+        compressed_path(tmp_path / "test.csv", "lzma")
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".feather"])
+def test_write_read_columnar(sample_dataframe, tmp_path, extension):
+    """Test writing and reading a Parquet or Feather file, keeping float32."""
+    pytest.importorskip("pyarrow")
+    df = sample_dataframe.assign(C=pd.Series([0.5, None, 2.0], dtype="float32"))
+    file_path = tmp_path / f"test{extension}"
+    write_file(df, file_path)
+    pd.testing.assert_frame_equal(read_file(file_path), df)
+
+
+def test_find_table_looks_through_codecs_and_columnar_formats(tmp_path):
+    """Test that a table is found under its compressed or columnar name."""
+    assert find_table(tmp_path / "test.csv") == tmp_path / "test.csv"
+    (tmp_path / "test.parquet").touch()
+    assert find_table(tmp_path / "test.csv") == tmp_path / "test.parquet"
+    (tmp_path / "test.csv.gz").touch()
+    assert find_table(tmp_path / "test.csv") == tmp_path / "test.csv.gz"
+
+
+def _assay_tables(tmp_path, compression="none"):
+    frames = [
+        pd.DataFrame({"CID": range(5), "SMILES": list("CNOSP"), "x": 0.25}),
+        pd.DataFrame({"CID": range(5, 8), "x": [1.5, None, 3.0], "extra": "e"}),
+        pd.DataFrame({"SMILES": ["CC"], "CID": [8], "x": [2.0]}),
+    ]
+    paths = []
+    for i, frame in enumerate(frames):
+        paths.append(compressed_path(tmp_path / f"part_{i}.csv", compression))
+        write_file(frame, paths[-1])
+    return frames, paths
+
+
+@pytest.mark.parametrize("read_workers", [1, 2, 4])
+def test_merge_tables_streams_union_of_columns(tmp_path, read_workers):
+    """Test that a chunked merge reads back like pd.concat of the inputs."""
+    frames, paths = _assay_tables(tmp_path, "gzip")
+    output = tmp_path / "merged.csv.gz"
+    rows = merge_tables(paths, output, chunk_size=2, read_workers=read_workers)
+    assert rows == 9
+    merged = read_file(output)
+    assert list(merged.columns) == ["CID", "SMILES", "x", "extra"]
+    pd.testing.assert_frame_equal(merged, pd.concat(frames, ignore_index=True))
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".feather"])
+def test_merge_tables_reconciles_types_across_inputs(tmp_path, extension):
+    """Test a column first seen in a later file with strings, and int/float mixes."""
+    if extension != ".csv":
+        pytest.importorskip("pyarrow")
+    frames = [
+        pd.DataFrame({"CID": [1, 2, 3], "x": [1, 2, 3]}),
+        pd.DataFrame({"CID": [4, 5], "x": [0.5, 1.5], "note": ["a", None]}),
+        pd.DataFrame({"CID": [6], "note": ["b"]}),
+    ]
+    paths = [tmp_path / f"part_{i}.csv" for i in range(3)]
+    for frame, path in zip(frames, paths):
+        write_file(frame, path)
+    output = tmp_path / f"merged{extension}"
+    assert merge_tables(paths, output, chunk_size=2) == 6
+    merged = read_file(output)
+    assert merged["x"].tolist()[:5] == [1.0, 2.0, 3.0, 0.5, 1.5]
+    assert merged["note"].isna().tolist() == [True, True, True, False, True, False]
+    assert merged["note"].dropna().tolist() == ["a", "b"]
+    if extension == ".csv":
+        # One formatting per column, not per chunk
+        assert output.read_text().splitlines()[1] == "1,1.0,"
+
+
+def test_stream_tables_keeps_file_and_chunk_order(tmp_path):
+    """Test that read-ahead threads still yield chunks in input order."""
+    _, paths = _assay_tables(tmp_path)
+    serial = [(p, list(c["CID"])) for p, c in stream_tables(paths, chunk_size=2)]
+    threaded = [
+        (p, list(c["CID"]))
+        for p, c in stream_tables(paths, chunk_size=2, read_workers=3)
+    ]
+    assert threaded == serial
+    assert [cids for _, cids in serial] == [[0, 1], [2, 3], [4], [5, 6], [7], [8]]
+
+
+def test_table_writer_discards_partial_output_on_error(tmp_path):
+    """Test that a failed merge leaves neither the table nor a temporary file."""
+    with pytest.raises(RuntimeError):
+        with TableWriter(tmp_path / "merged.csv") as writer:
+            writer.write(pd.DataFrame({"A": [1]}))
+            raise RuntimeError("read failed")
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("extension", [".parquet", ".feather"])
+def test_merge_tables_streams_columnar_tables(tmp_path, extension):
+    """Test a chunked columnar merge keeping float32 columns."""
+    pytest.importorskip("pyarrow")
+    frames = [
+        pd.DataFrame({"CID": range(i, i + 3), "x": np.arange(3, dtype="float32")})
+        for i in (0, 3)
+    ]
+    paths = [tmp_path / f"part_{i}{extension}" for i in range(2)]
+    for frame, path in zip(frames, paths):
+        write_file(frame, path)
+    output = tmp_path / f"merged{extension}"
+    merge_tables(paths, output, chunk_size=2, read_workers=2, compression="zstd")
+    pd.testing.assert_frame_equal(
+        read_file(output), pd.concat(frames, ignore_index=True)
+    )
+
+
+def test_dataset_partitions_are_ordered_by_key(tmp_path):
+    """Test that partitions are listed numerically and hidden files skipped."""
+    for group, aid in [("b", 10), ("a", 2), ("b", 9)]:
+        part = partition_path(tmp_path, group=group, aid=aid)
+        part.mkdir(parents=True)
+        (part / "part-0.parquet").touch()
+    (part / ".part-0.parquet.123.tmp").touch()
+    (part / ".hidden.parquet").touch()
+    assert [keys for keys, _ in dataset_partitions(tmp_path)] == [
+        {"group": "a", "aid": "2"},
+        {"group": "b", "aid": "9"},
+        {"group": "b", "aid": "10"},
+    ]
+    with pytest.raises(ValueError):
+        partition_path(tmp_path, group="a/b")
+
+
+def test_read_partitioned_dataset_with_pushdown(tmp_path):
+    """Test reading selected columns and partitions of a hive dataset."""
+    pytest.importorskip("pyarrow")
+    for aid in (1, 2):
+        part = partition_path(tmp_path, group="tox", aid=aid)
+        part.mkdir(parents=True)
+        write_file(
+            pd.DataFrame({"CID": [aid, aid], "x": [0.5, 1.5]}), part / "p.parquet"
+        )
+    df = read_file(tmp_path, columns=["CID", "aid"], filters=[("aid", "=", 2)])
+    assert list(df["CID"]) == [2, 2]
+    assert list(df.columns) == ["CID", "aid"]
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from toxichempy.utils.publish import MANIFEST_NAME, Publisher, parallel_copy
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A source table outside the publish directory."""
+    path = tmp_path / "group" / "raw_descriptors_group.csv"
+    path.parent.mkdir()
+    path.write_bytes(b"PUBCHEM_CID,MolWt\n" + b"1,46.069\n" * 100)
+    path.chmod(0o640)
+    return path
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_copy_writes_identical_file(source, tmp_path, workers):
+    """Test that chunks copied at their offsets rebuild the file exactly."""
+    dest = tmp_path / "copy.csv"
+    parallel_copy(source, dest, workers=workers, chunk_size=7)
+    assert dest.read_bytes() == source.read_bytes()
+    assert dest.stat().st_mode == source.stat().st_mode
+
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink", "symlink", "auto"])
+def test_publisher_materializes_each_mode(source, tmp_path, mode):
+    """Test that each mode publishes the contents by the expected means."""
+    dest = tmp_path / "MlData" / "data_group.csv"
+    method = Publisher(tmp_path / "MlData", mode=mode).publish(source, dest)
+    assert dest.read_bytes() == source.read_bytes()
+    same_inode = os.stat(dest).st_ino == source.stat().st_ino
+    if mode == "copy":
+        assert method == "copy" and not same_inode
+    elif mode == "hardlink":
+        assert method == "hardlink" and same_inode
+    elif mode == "symlink":
+        assert method == "symlink" and dest.is_symlink()
+    else:
+        assert method in ("reflink", "hardlink")
+    assert [p.name for p in dest.parent.iterdir()] == ["data_group.csv"]
+
+
+def test_publisher_skips_unchanged_sources(source, tmp_path):
+    """Test skipping by stat and by checksum, and republishing on changes."""
+    publish_dir = tmp_path / "MlData"
+    dest = publish_dir / "data_group.csv"
+    publisher = Publisher(publish_dir)
+    assert publisher.publish(source, dest) == "copy"
+    publisher.save()
+    assert (publish_dir / MANIFEST_NAME).exists()
+
+    publisher = Publisher(publish_dir)
+    assert publisher.publish(source, dest) == "unchanged"
+    os.utime(source, ns=(0, source.stat().st_mtime_ns + 10**9))
+    assert publisher.publish(source, dest) == "unchanged"
+    source.write_bytes(source.read_bytes() + b"2,78.114\n")
+    assert publisher.publish(source, dest) == "copy"
+    assert dest.read_bytes() == source.read_bytes()
+    dest.unlink()
+    assert publisher.publish(source, dest) == "copy"
+    assert publisher.counts == {"unchanged": 2, "copy": 2}
+
+
+def test_publisher_rejects_unknown_mode(tmp_path):
+    """Test that an unknown publish mode raises ValueError."""
+    with pytest.raises(ValueError):
+        Publisher(tmp_path, mode="teleport")